@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Aluehaku
+========
+Spatiaalinen indeksi postinumeroalueille: missä postinumeroalueessa
+koordinaatti on, ja mitkä alueet osuvat suorakulmioon.
+
+- STR-pakattu R-puu (Sort-Tile-Recursive) featurejen rajaaville suorakulmioille
+- Ehdokkaat tarkistetaan tarkalla piste-polygoni-testillä
+- Eräkysely: koordinaattitaulukot sisään, postinumerot ja hintasarjat ulos;
+  puu käydään läpi kaikille pisteille kerralla taulukko-operaatioilla
+- Indeksi tallennetaan GeoJSON-tiedoston viereen (.npz), joten sen lataus
+  vie millisekunteja eikä GeoJSONia tarvitse jäsentää
+
+Käyttö:
+    python aluehaku.py --rakenna                # rakenna indeksi GeoJSONista
+    python aluehaku.py 24.9384 60.1699          # hae piste (lon lat)
+"""
+
+import os
+import sys
+import json
+import argparse
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometria import Edges, FlatPolygons
+from geometriavarasto import _file_hash, read_flat
+from hintakuutio import PriceCube
+
+GEOJSON_FILE = 'postinumerot_hinnat.geojson'
+INDEX_FILE = 'postinumerot_hinnat.indeksi.npz'
+
+# Solmun lasten enimmäismäärä
+NODE_CAPACITY = 16
+
+
+def index_file(geojson_path: str) -> str:
+    """Indeksitiedosto GeoJSON-tiedoston vieressä"""
+    return os.path.splitext(geojson_path)[0] + '.indeksi.npz'
+
+
+def _str_pack(boxes: np.ndarray, capacity: int) -> np.ndarray:
+    """
+    Sort-Tile-Recursive: järjestä suorakulmiot x-keskipisteen mukaan
+    pystysuikaleisiin ja suikaleet y-keskipisteen mukaan. Peräkkäiset
+    `capacity` alkiota muodostavat solmun. Palauttaa järjestyksen.
+    """
+    n = len(boxes)
+    if n <= capacity:
+        return np.arange(n)
+    leaves = -(-n // capacity)
+    slices = int(np.ceil(np.sqrt(leaves)))
+    per_slice = slices * capacity
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    by_x = np.argsort(cx, kind='stable')
+    order = []
+    for start in range(0, n, per_slice):
+        chunk = by_x[start:start + per_slice]
+        order.append(chunk[np.argsort(cy[chunk], kind='stable')])
+    return np.concatenate(order)
+
+
+class PostcodeIndex:
+    """
+    Postinumeroalueiden R-puu ja geometria.
+
+    Attributes:
+        flat: Geometria litteinä taulukoina (FlatPolygons)
+        bounds: Featurejen rajaavat suorakulmiot (F, 4)
+        entries: Lehtitason featureindeksit pakkausjärjestyksessä
+        levels: [(solmujen suorakulmiot (n, 4), lasten alku (n), lasten määrä (n))]
+                lehdistä juureen; tason 0 lapset ovat entries-taulukossa
+    """
+
+    def __init__(self, flat: FlatPolygons, bounds: np.ndarray, entries: np.ndarray,
+                 levels: List[Tuple[np.ndarray, np.ndarray, np.ndarray]], source_hash: str = ''):
+        self.flat = flat
+        self.bounds = bounds
+        self.entries = entries
+        self.levels = levels
+        self.source_hash = source_hash
+        self.postcodes = np.array(flat.keys, dtype=object)
+        self._edges = {}
+
+    @classmethod
+    def build(cls, flat: FlatPolygons, capacity: int = NODE_CAPACITY,
+              source_hash: str = '') -> 'PostcodeIndex':
+        """Rakenna STR-pakattu puu"""
+        bounds = flat.bounds()
+        valid = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+        entries = valid[_str_pack(bounds[valid], capacity)]
+
+        levels = []
+        boxes = bounds[entries]
+        while True:
+            # Solmut peräkkäisistä alkioista; seuraava taso pakataan uudelleen
+            starts = np.arange(0, len(boxes), capacity)
+            counts = np.minimum(capacity, len(boxes) - starts)
+            node_boxes = np.column_stack([
+                np.minimum.reduceat(boxes[:, 0], starts), np.minimum.reduceat(boxes[:, 1], starts),
+                np.maximum.reduceat(boxes[:, 2], starts), np.maximum.reduceat(boxes[:, 3], starts),
+            ]) if len(boxes) else np.empty((0, 4))
+            levels.append([node_boxes, starts, counts])
+            if len(node_boxes) <= capacity:
+                break
+            # Järjestä tämän tason solmut ja niiden lapsiviittaukset STR:llä
+            order = _str_pack(node_boxes, capacity)
+            levels[-1] = [node_boxes[order], starts[order], counts[order]]
+            boxes = levels[-1][0]
+        levels = [tuple(level) for level in levels]
+        return cls(flat, bounds, entries, levels, source_hash)
+
+    @classmethod
+    def from_geojson(cls, path: str = GEOJSON_FILE) -> 'PostcodeIndex':
+        """Rakenna GeoJSON-tiedostosta (geometria geometriavarastosta, jos mahdollista)"""
+        return cls.build(read_flat(path), source_hash=_file_hash(path))
+
+    # ------------------------------------------------------------------
+    # Tallennus
+    # ------------------------------------------------------------------
+
+    def save(self, path: str = INDEX_FILE):
+        arrays = {
+            'coords': self.flat.coords,
+            'ring_offsets': self.flat.ring_offsets,
+            'part_offsets': self.flat.part_offsets,
+            'feature_offsets': self.flat.feature_offsets,
+            'keys': np.array(self.flat.keys, dtype=str),
+            'bounds': self.bounds,
+            'entries': self.entries,
+            'source_hash': np.array(self.source_hash),
+        }
+        for k, (boxes, starts, counts) in enumerate(self.levels):
+            arrays[f'level{k}_boxes'] = boxes
+            arrays[f'level{k}_starts'] = starts
+            arrays[f'level{k}_counts'] = counts
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> 'PostcodeIndex':
+        with np.load(path) as data:
+            flat = FlatPolygons(data['coords'], data['ring_offsets'], data['part_offsets'],
+                                data['feature_offsets'], data['keys'].tolist())
+            levels = []
+            while f'level{len(levels)}_boxes' in data:
+                k = len(levels)
+                levels.append((data[f'level{k}_boxes'], data[f'level{k}_starts'], data[f'level{k}_counts']))
+            return cls(flat, data['bounds'], data['entries'], levels, str(data['source_hash']))
+
+    @classmethod
+    def open(cls, geojson_path: str = GEOJSON_FILE, index_path: Optional[str] = None) -> 'PostcodeIndex':
+        """Lataa tallennettu indeksi, tai rakenna ja tallenna se, jos GeoJSON on muuttunut"""
+        if index_path is None:
+            index_path = index_file(geojson_path)
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(geojson_path):
+            return cls.load(index_path)
+        index = cls.from_geojson(geojson_path)
+        index.save(index_path)
+        return index
+
+    # ------------------------------------------------------------------
+    # Haku
+    # ------------------------------------------------------------------
+
+    def _candidates(self, low: np.ndarray, high: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Kyselysuorakulmioiden [low, high] ja featurejen suorakulmioiden leikkaukset
+        puun kautta. Palauttaa (kyselyindeksi, featureindeksi) -parit.
+        """
+        n = len(low)
+        top_boxes = self.levels[-1][0]
+        query = np.repeat(np.arange(n), len(top_boxes))
+        node = np.tile(np.arange(len(top_boxes)), n)
+        for boxes, starts, counts in reversed(self.levels):
+            b = boxes[node]
+            hit = ((low[query, 0] <= b[:, 2]) & (high[query, 0] >= b[:, 0]) &
+                   (low[query, 1] <= b[:, 3]) & (high[query, 1] >= b[:, 1]))
+            query, node = query[hit], node[hit]
+            # Laajenna lapsiin
+            c = counts[node]
+            first = np.cumsum(c) - c
+            query = np.repeat(query, c)
+            node = np.repeat(starts[node], c) + (np.arange(c.sum()) - np.repeat(first, c))
+        feature = self.entries[node]
+        b = self.bounds[feature]
+        hit = ((low[query, 0] <= b[:, 2]) & (high[query, 0] >= b[:, 0]) &
+               (low[query, 1] <= b[:, 3]) & (high[query, 1] >= b[:, 1]))
+        return query[hit], feature[hit]
+
+    def _feature_edges(self, feature: int) -> Edges:
+        edges = self._edges.get(feature)
+        if edges is None:
+            edges = self._edges[feature] = Edges(self.flat.feature_rings(feature))
+        return edges
+
+    def locate(self, lon: Sequence[float], lat: Sequence[float]) -> np.ndarray:
+        """
+        Featureindeksit pisteille (-1, jos piste ei ole millään alueella).
+
+        Args:
+            lon, lat: Koordinaatit (WGS84) samanpituisina taulukkoina
+        """
+        points = np.column_stack([np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)])
+        result = np.full(len(points), -1, dtype=np.int64)
+        if not len(points) or not self.levels:
+            return result
+        query, feature = self._candidates(points, points)
+        # Tarkka testi featureittain: kaikki saman featuren ehdokaspisteet kerralla
+        order = np.argsort(feature, kind='stable')
+        query, feature = query[order], feature[order]
+        bounds = np.flatnonzero(np.r_[True, feature[1:] != feature[:-1], True])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            q = query[start:end]
+            q = q[result[q] < 0]
+            if len(q):
+                inside = self._feature_edges(int(feature[start])).contains(points[q])
+                result[q[inside]] = feature[start]
+        return result
+
+    def postcodes_at(self, lon: Sequence[float], lat: Sequence[float]) -> np.ndarray:
+        """Postinumerot pisteille ('' jos piste ei ole millään alueella)"""
+        index = self.locate(lon, lat)
+        result = np.full(len(index), '', dtype=object)
+        found = index >= 0
+        result[found] = self.postcodes[index[found]]
+        return result
+
+    def prices_at(self, lon: Sequence[float], lat: Sequence[float], cube: PriceCube,
+                  metric: str = 'keskihinta_aritm_nw',
+                  building_type: str = '1') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Postinumerot ja hintasarjat pisteille.
+
+        Returns:
+            (postinumerot (n), arvot muotoa (n, vuodet) järjestyksessä cube.years; NaN jos ei dataa)
+        """
+        postcodes = self.postcodes_at(lon, lat)
+        rows = np.array([cube.postcode_index.get(p, -1) for p in postcodes], dtype=np.int64)
+        series = cube.series(metric, building_type)
+        values = np.full((len(rows), len(cube.years)), np.nan)
+        found = rows >= 0
+        values[found] = series[rows[found]]
+        return postcodes, values
+
+    def intersecting(self, bbox: Sequence[float]) -> List[str]:
+        """
+        Postinumerot, joiden alue leikkaa suorakulmion (minx, miny, maxx, maxy).
+        Ehdokkaat tarkistetaan: jokin alueen piste suorakulmiossa, suorakulmion
+        kulma alueen sisällä tai alueen särmä leikkaa suorakulmion reunan.
+        """
+        low = np.array([bbox[:2]], dtype=float)
+        high = np.array([bbox[2:]], dtype=float)
+        _, features = self._candidates(low, high)
+        corners = np.array([[bbox[0], bbox[1]], [bbox[2], bbox[1]], [bbox[2], bbox[3]], [bbox[0], bbox[3]]],
+                           dtype=float)
+        result = []
+        for feature in np.sort(features):
+            rings = self.flat.feature_rings(int(feature))
+            coords = np.concatenate(rings)
+            inside = ((coords >= low[0]) & (coords <= high[0])).all(axis=1)
+            if (inside.any() or self._feature_edges(int(feature)).contains(corners).any() or
+                    _edges_cross_box(rings, low[0], high[0])):
+                result.append(self.postcodes[feature])
+        return result
+
+
+def _edges_cross_box(rings: List[np.ndarray], low: np.ndarray, high: np.ndarray) -> bool:
+    """Leikkaako jokin särmä suorakulmion (Liang–Barsky kaikille särmille kerralla)"""
+    a = np.concatenate([r[:-1] for r in rings])
+    d = np.concatenate([r[1:] for r in rings]) - a
+    t0 = np.zeros(len(a))
+    t1 = np.ones(len(a))
+    for k in range(2):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ta = (low[k] - a[:, k]) / d[:, k]
+            tb = (high[k] - a[:, k]) / d[:, k]
+        parallel = d[:, k] == 0
+        outside = parallel & ((a[:, k] < low[k]) | (a[:, k] > high[k]))
+        t0 = np.where(parallel, t0, np.maximum(t0, np.minimum(ta, tb)))
+        t1 = np.where(parallel, t1, np.minimum(t1, np.maximum(ta, tb)))
+        t1 = np.where(outside, -1.0, t1)
+    return bool((t0 <= t1).any())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Postinumeroalueen haku koordinaateilla")
+    parser.add_argument('koordinaatit', nargs='*', type=float, help="lon lat [lon lat ...]")
+    parser.add_argument('--geojson', default=GEOJSON_FILE)
+    parser.add_argument('--hinnat', default='asuntohinnat.json')
+    parser.add_argument('--rakenna', action='store_true', help="Rakenna indeksi uudelleen")
+    args = parser.parse_args()
+
+    index_path = index_file(args.geojson)
+    if args.rakenna:
+        index = PostcodeIndex.from_geojson(args.geojson)
+        index.save(index_path)
+        print(f"✓ Indeksi tallennettu: {index_path} ({len(index.flat)} aluetta, "
+              f"{len(index.levels)} tasoa)")
+    else:
+        index = PostcodeIndex.open(args.geojson, index_path)
+
+    if len(args.koordinaatit) % 2:
+        parser.error("anna koordinaatit pareina: lon lat")
+    if args.koordinaatit:
+        lon, lat = args.koordinaatit[0::2], args.koordinaatit[1::2]
+        with open(args.hinnat, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        cube = PriceCube.from_export(data['data'])
+        # Viimeisin hinta toteutuneilta vuosilta, ei ennusteesta
+        forecast_years = set(data['metadata'].get('forecast_years', []))
+        postcodes, values = index.prices_at(lon, lat, cube)
+        for x, y, postcode, series in zip(lon, lat, postcodes, values):
+            if not postcode:
+                print(f"{x:.5f} {y:.5f}: ei postinumeroaluetta")
+                continue
+            latest = [(year, v) for year, v in zip(cube.years, series)
+                      if not np.isnan(v) and year not in forecast_years]
+            price = f"{latest[-1][1]:.0f} €/m² ({latest[-1][0]})" if latest else "ei hintatietoa"
+            row = cube.postcode_index.get(postcode)
+            name = cube.names[row] if row is not None else postcode
+            print(f"{x:.5f} {y:.5f}: {name} - {price}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
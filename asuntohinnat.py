@@ -8,16 +8,27 @@ Hakee postinumeroalueittain vanhojen osakeasuntojen:
 - Eriteltynä talotyypin mukaan
 
 Tilastokeskuksen StatFin-rajapinnasta (taulukko: ashi_13mu)
-Vuodet: 2009-2025
+Vuodet: 2009 (FIRST_YEAR) alkaen taulukon viimeisimpään vuoteen asti
 """
 
+import os
 import requests
 import json
-import time
+import numpy as np
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import jsonstat
+import ennuste
+from hintakuutio import PriceCube
+from http_asiakas import HttpClient, RateLimiter, IncompleteBatchError
+from json_kirjoitin import write_json
+from postinumerot import PostcodeCatalog
+from valimuisti import StatFinCache
 warnings.filterwarnings('ignore')
 
-BASE_URL = "https://statfin.stat.fi/PxWeb/api/v1/fi/StatFin"
+# Osoitteen voi korvata esim. paikallisella testipalvelimella (toistopalvelin.py)
+BASE_URL = os.environ.get("STATFIN_BASE_URL", "https://statfin.stat.fi/PxWeb/api/v1/fi/StatFin")
 TABLE = "ashi/statfin_ashi_pxt_13mu.px"
 
 # Talotyypit
@@ -28,118 +39,361 @@ BUILDING_TYPES = {
     "5": "Rivitalot yhteensä"
 }
 
+# Haettavat mittarit
+METRICS = ["keskihinta_aritm_nw", "lkm_julk20"]
+
+# Ensimmäinen haettava vuosi; viimeinen on taulukon viimeisin vuosi
+FIRST_YEAR = 2009
+
+# Postinumeroita per kysely
+BATCH_SIZE = 300
+
+# Vastausmuoto: "json-stat2" (virtaava jäsennys tiheään taulukkoon) tai "json"
+RESPONSE_FORMAT = "json-stat2"
+
+# Virtaavan vastauksen palakoko (tavua)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Montako viimeisintä vuotta haetaan uudelleen taulukon päivittyessä (revisiot)
+REVISION_YEARS = 1
+
+# Ennustemalli (ks. ennuste.MODELS) ja ennustettavien vuosien määrä
+FORECAST_MODEL = "mean_diff"
+FORECAST_HORIZON = 1
+
+# Tiivis JSON-tuotos ilman sisennyksiä
+COMPACT_OUTPUT = False
+
+# Rinnakkaisten hakujen määrä
+MAX_WORKERS = 4
+
+
+def create_client(workers=MAX_WORKERS):
+    """
+    Luo StatFin-kyselyihin HTTP-asiakas kiintiörajoittimella.
+    Ympäristömuuttuja STATFIN_RATE_LIMIT=0 poistaa rajoittimen (paikalliset testipalvelimet).
+    """
+    limiter = None if os.environ.get("STATFIN_RATE_LIMIT") == "0" else RateLimiter()
+    return HttpClient(limiter=limiter, pool_size=max(1, workers))
+
 
-def get_metadata():
+def get_metadata(client=None):
     """Hae taulukon metatiedot"""
+    if client is None:
+        client = create_client()
     url = f"{BASE_URL}/{TABLE}"
-    response = requests.get(url, timeout=30)
+    response = client.get(url, timeout=30)
+    response.raise_for_status()
     return response.json()
 
 
-def fetch_prices(postcodes=None, years=None):
-    """Hae neliöhinnat ja kauppojen lukumäärät postinumeroittain"""
+def get_table_updated(client=None):
+    """Hae taulukon päivitysaikaleima (updated) taulukkolistauksesta"""
+    if client is None:
+        client = create_client()
+    folder, table_id = TABLE.rsplit('/', 1)
+    url = f"{BASE_URL}/{folder}"
+    response = client.get(url, timeout=30)
+    if response.status_code != 200:
+        return None
+    for item in response.json():
+        if item.get('id') == table_id:
+            return item.get('updated')
+    return None
+
+
+def load_metadata(client, cache=None):
+    """
+    Hae metatiedot ja taulukon aikaleima.
+    Jos välimuistissa on saman aikaleiman metatiedot, käytetään niitä.
+    """
+    updated = get_table_updated(client) if cache is not None else None
+    meta = cache.load_metadata(updated) if updated else None
+    if meta is None:
+        meta = get_metadata(client)
+        if updated:
+            cache.save_metadata(updated, meta)
+    else:
+        print(f"  Metatiedot välimuistista (päivitetty {updated})")
+    return meta, updated
+
+
+def fetch_prices(postcodes=None, years=None, workers=MAX_WORKERS, client=None, cache=None,
+                 strict=False):
+    """
+    Hae neliöhinnat ja kauppojen lukumäärät postinumeroittain
+
+    Erät haetaan rinnakkain `workers` säikeellä. Kyselytahtia rajoittaa
+    asiakkaan token bucket -rajoitin, joten haku etenee rajapinnan kiintiön
+    tahdissa. Jos `strict` on tosi, epäonnistunut erä keskeyttää haun.
+    """
+    if client is None:
+        client = create_client(workers)
+
     print("Haetaan metadataa...")
-    meta = get_metadata()
+    meta, updated = load_metadata(client, cache)
     
-    # Jos vuosia ei määritelty, hae kaikki 2009 lähtien
+    # Jos vuosia ei määritelty, hae kaikki FIRST_YEAR lähtien
     if years is None:
         all_years = meta['variables'][0]['values']  # Kaikki vuodet
-        years = [y for y in all_years if int(y) >= 2009]
+        years = [y for y in all_years if int(y) >= FIRST_YEAR]
     
     # Kaikki postinumerot
-    all_postcodes = [v for v in meta['variables'][1]['values'] if v != 'SSS']
+    catalog = PostcodeCatalog.from_metadata(meta)
+    all_postcodes = [v for v in meta['variables'][1]['values'] if v in catalog]
     
     if postcodes:
-        postcodes_to_fetch = [p for p in postcodes if p in all_postcodes]
+        postcodes_to_fetch = catalog.filter(postcodes)
     else:
         postcodes_to_fetch = all_postcodes
     
     print(f"Vuodet: {len(years)} ({min(years)}-{max(years)})")
     print(f"Postinumerot: {len(postcodes_to_fetch)}")
     
-    # Hae data erissä
     results = {}
-    batch_size = 300  # Pienempi erä koska haetaan enemmän dataa
+    fetch_batches(postcodes_to_fetch, years, results, workers, client, cache, updated, strict,
+                  meta=meta)
     
-    for i in range(0, len(postcodes_to_fetch), batch_size):
-        batch = postcodes_to_fetch[i:i+batch_size]
-        print(f"  Haetaan postinumerot {i+1}-{min(i+batch_size, len(postcodes_to_fetch))}...")
+    return results, meta, years
+
+
+def refresh_prices(filename="asuntohinnat.json", workers=MAX_WORKERS, client=None, cache=None,
+                   strict=False):
+    """
+    Päivitä olemassa oleva data hakemalla vain muuttuneet osat.
+
+    Jos taulukon aikaleima ei ole muuttunut edellisestä ajosta, mitään ei
+    haeta. Muuten haetaan uudet vuodet sekä REVISION_YEARS viimeisintä vuotta
+    (revisiot) kaikille postinumeroille, ja uusille postinumeroille kaikki
+    vuodet. Tulokset yhdistetään tiedoston `filename` aiempaan dataan.
+    Jos jokin erä epäonnistuu, tilaa ei tallenneta, joten seuraava ajo
+    hakee samat osat uudelleen.
+    """
+    if client is None:
+        client = create_client(workers)
+    if cache is None:
+        cache = StatFinCache()
+
+    print("Haetaan metadataa...")
+    meta, updated = load_metadata(client, cache)
+    
+    all_years = meta['variables'][0]['values']
+    years = [y for y in all_years if int(y) >= FIRST_YEAR]
+    catalog = PostcodeCatalog.from_metadata(meta)
+    all_postcodes = [v for v in meta['variables'][1]['values'] if v in catalog]
+    
+    state = cache.load_state()
+    results = load_existing_results(filename, years)
+    failed = []
+    
+    if updated is None or state is None or results is None:
+        print("Ei aiempaa dataa, haetaan kaikki vuodet ja postinumerot")
+        print(f"Vuodet: {len(years)} ({min(years)}-{max(years)})")
+        print(f"Postinumerot: {len(all_postcodes)}")
+        results = {}
+        failed += fetch_batches(all_postcodes, years, results, workers, client, cache, updated, strict,
+                                meta=meta)
+    elif state['updated'] == updated:
+        print(f"Lähdetaulukko ei ole muuttunut ({updated}), käytetään aiempaa dataa")
+    else:
+        previous_years = set(state['years'])
+        previous_postcodes = set(state['postcodes'])
         
-        # Hae sekä hinnat että kauppojen lukumäärät
-        query = {
-            "query": [
-                {"code": "Vuosi", "selection": {"filter": "item", "values": years}},
-                {"code": "Postinumero", "selection": {"filter": "item", "values": batch}},
-                {"code": "Talotyyppi", "selection": {"filter": "item", "values": list(BUILDING_TYPES.keys())}},
-                {"code": "Tiedot", "selection": {"filter": "item", "values": ["keskihinta_aritm_nw", "lkm_julk20"]}}
-            ],
-            "response": {"format": "json"}
-        }
+        # Uudet vuodet ja viimeisimmät (mahdollisesti revisioidut) vuodet
+        known_years = [y for y in years if y in previous_years]
+        revised = set(known_years[-REVISION_YEARS:]) if REVISION_YEARS else set()
+        refresh_years = [y for y in years if y not in previous_years or y in revised]
+        new_postcodes = [p for p in all_postcodes if p not in previous_postcodes]
         
-        url = f"{BASE_URL}/{TABLE}"
-        response = requests.post(url, json=query, timeout=90)
+        print(f"Lähdetaulukko päivitetty: {state['updated']} -> {updated}")
+        print(f"Päivitettävät vuodet: {', '.join(refresh_years) or '-'}")
+        print(f"Uudet postinumerot: {len(new_postcodes)}")
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Hae metriikkien indeksit columns-listasta
-            columns = data.get('columns', [])
-            metric_indices = {}
-            for idx, col in enumerate(columns):
-                if col['code'] in ['keskihinta_aritm_nw', 'lkm_julk20']:
-                    metric_indices[col['code']] = idx - 3  # Vähennä ensimmäiset 3 key-kenttää
-            
-            # Parse data
-            for item in data.get('data', []):
-                year = item['key'][0]
-                postcode = item['key'][1]
-                building_type = item['key'][2]
-                values_list = item['values']
-                
-                # Rakenne: results[postcode][year][building_type][metric]
-                if postcode not in results:
-                    results[postcode] = {}
-                if year not in results[postcode]:
-                    results[postcode][year] = {}
-                if building_type not in results[postcode][year]:
-                    results[postcode][year][building_type] = {}
-                
-                # Lisää hinnat ja lukumäärät
-                for metric, idx in metric_indices.items():
-                    value = values_list[idx]
-                    if value not in ['.', '..', '...', '']:
-                        try:
-                            results[postcode][year][building_type][metric] = float(value)
-                        except:
-                            pass
+        # Poista päivitettävät vuodet ja taulukosta poistuneet postinumerot
+        # ennen yhdistämistä (revisio voi myös poistaa arvoja)
+        for postcode in list(results):
+            if postcode not in catalog:
+                del results[postcode]
+                continue
+            for year in refresh_years:
+                results[postcode].pop(year, None)
         
-        time.sleep(0.5)
+        if refresh_years:
+            failed += fetch_batches(all_postcodes, refresh_years, results, workers, client,
+                                    cache, updated, strict, meta=meta)
+        
+        other_years = [y for y in years if y not in refresh_years]
+        if new_postcodes and other_years:
+            failed += fetch_batches(new_postcodes, other_years, results, workers, client,
+                                    cache, updated, strict, meta=meta)
+        
+        results = {p: d for p, d in results.items() if d}
+    
+    if updated and not failed:
+        cache.save_state(updated, years, all_postcodes)
+        cache.prune(updated)
     
     return results, meta, years
 
 
+def load_existing_results(filename, years):
+    """
+    Lue aiemmin viety data results-muotoon.
+    Ennustevuodet ja taulukosta puuttuvat vuodet jätetään pois.
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    valid_years = set(years)
+    results = {}
+    for postcode, info in existing.get('data', {}).items():
+        years_data = {y: d for y, d in info.get('data', {}).items() if y in valid_years}
+        if years_data:
+            results[postcode] = years_data
+    return results
+
+
+def fetch_batches(postcodes, years, results, workers=MAX_WORKERS, client=None,
+                  cache=None, updated=None, strict=False, meta=None):
+    """
+    Hae postinumerot erissä rinnakkain ja yhdistä tulokset results-rakenteeseen.
+
+    Palauttaa listan epäonnistuneista eristä. Jos `strict` on tosi,
+    epäonnistunut erä nostaa IncompleteBatchError-poikkeuksen.
+    """
+    if client is None:
+        client = create_client(workers)
+    
+    # Hae data erissä
+    batches = [postcodes[i:i+BATCH_SIZE] for i in range(0, len(postcodes), BATCH_SIZE)]
+    print(f"Eriä: {len(batches)} (rinnakkaisia hakuja: {workers})")
+    
+    def fetch(index):
+        start = index * BATCH_SIZE
+        batch = batches[index]
+        print(f"  Haetaan postinumerot {start+1}-{start+len(batch)}...")
+        return fetch_batch(batch, years, client, cache, updated, meta)
+    
+    # executor.map palauttaa tulokset erien järjestyksessä, joten
+    # results-sanakirjan järjestys on sama kuin peräkkäisessä haussa
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for batch, data in zip(batches, executor.map(fetch, range(len(batches)))):
+            if data is not None:
+                parse_batch(data, results)
+                continue
+            if strict:
+                raise IncompleteBatchError(
+                    f"Erän haku epäonnistui: postinumerot {batch[0]}-{batch[-1]} ({len(batch)} kpl)")
+            print(f"  ⚠ Erä epäonnistui, puuttuvat postinumerot {batch[0]}-{batch[-1]}")
+            failed.append(batch)
+    
+    return failed
+
+
+def fetch_batch(batch, years, client, cache=None, updated=None, meta=None):
+    """
+    Hae yhden postinumeroerän data. Palauttaa None jos haku epäonnistui.
+    Vastaukset tallennetaan välimuistiin taulukon aikaleimalla.
+
+    json-stat2-muodossa (RESPONSE_FORMAT) vastaus luetaan virtana suoraan
+    tiheään taulukkoon (jsonstat.DenseBatch). Muoto vaatii metatiedot.
+    """
+    response_format = RESPONSE_FORMAT if meta is not None else "json"
+    # Hae sekä hinnat että kauppojen lukumäärät
+    query = {
+        "query": [
+            {"code": "Vuosi", "selection": {"filter": "item", "values": years}},
+            {"code": "Postinumero", "selection": {"filter": "item", "values": batch}},
+            {"code": "Talotyyppi", "selection": {"filter": "item", "values": list(BUILDING_TYPES.keys())}},
+            {"code": "Tiedot", "selection": {"filter": "item", "values": METRICS}}
+        ],
+        "response": {"format": response_format}
+    }
+    
+    if cache is not None and updated:
+        data = cache.load_batch(updated, query)
+        if data is not None:
+            if data.get('format') == 'json-stat2':
+                return jsonstat.DenseBatch.from_dict(data)
+            return data
+    
+    url = f"{BASE_URL}/{TABLE}"
+    try:
+        response = client.post(url, json=query, timeout=90,
+                               stream=(response_format == "json-stat2"))
+        if response.status_code != 200:
+            return None
+        if response_format == "json-stat2":
+            data = jsonstat.parse_stream(response.iter_content(STREAM_CHUNK_SIZE), meta, query)
+        else:
+            data = response.json()
+    except (requests.RequestException, ValueError):
+        return None
+    
+    if cache is not None and updated:
+        cache.save_batch(updated, query, data.to_dict() if response_format == "json-stat2" else data)
+    return data
+
+
+def parse_batch(data, results):
+    """Lisää yhden erän vastaus results-rakenteeseen"""
+    if isinstance(data, jsonstat.DenseBatch):
+        data.merge_into(results)
+        return
+    
+    # Hae metriikkien indeksit columns-listasta
+    columns = data.get('columns', [])
+    metric_indices = {}
+    for idx, col in enumerate(columns):
+        if col['code'] in METRICS:
+            metric_indices[col['code']] = idx - 3  # Vähennä ensimmäiset 3 key-kenttää
+    
+    # Parse data
+    for item in data.get('data', []):
+        year = item['key'][0]
+        postcode = item['key'][1]
+        building_type = item['key'][2]
+        values_list = item['values']
+        
+        # Rakenne: results[postcode][year][building_type][metric]
+        if postcode not in results:
+            results[postcode] = {}
+        if year not in results[postcode]:
+            results[postcode][year] = {}
+        if building_type not in results[postcode][year]:
+            results[postcode][year][building_type] = {}
+        
+        # Lisää hinnat ja lukumäärät
+        for metric, idx in metric_indices.items():
+            value = values_list[idx]
+            if value not in ['.', '..', '...', '']:
+                try:
+                    results[postcode][year][building_type][metric] = float(value)
+                except:
+                    pass
+
+
 def get_postcode_name(postcode, meta):
-    """Hae postinumeron nimi"""
-    for v in meta['variables']:
-        if v['code'] == 'Postinumero':
-            for val, text in zip(v['values'], v.get('valueTexts', [])):
-                if val == postcode:
-                    # Extract city name
-                    if '(' in text:
-                        city = text.split('(')[-1].replace(')', '').strip()
-                    else:
-                        city = ''
-                    return text, city
-    return postcode, ''
+    """
+    Hae postinumeron nimi ja kaupunki.
+    Useita postinumeroita käsiteltäessä käytä suoraan PostcodeCatalogia,
+    jotta luettelo muodostetaan vain kerran.
+    """
+    return PostcodeCatalog.from_metadata(meta).lookup(postcode)
 
 
 def analyze_results(results, meta):
     """Analysoi tulokset - ei tarvita enää, data on jo oikeassa muodossa"""
     # Lisää postinumeroiden nimet
+    catalog = PostcodeCatalog.from_metadata(meta)
     output = {}
     
     for postcode, years_data in results.items():
-        name, city = get_postcode_name(postcode, meta)
+        name, city = catalog.lookup(postcode)
         
         output[postcode] = {
             'name': name,
@@ -149,72 +403,55 @@ def analyze_results(results, meta):
     
     return output
 
-def calculate_forecast(data, available_years, forecast_year='2026'):
+def calculate_forecast(data, available_years, model=FORECAST_MODEL, horizon=FORECAST_HORIZON):
     """
-    Laske ennuste seuraavalle vuodelle lineaarisella trendillä
-    Käyttää viimeisen 5 vuoden dataa
+    Laske ennusteet seuraaville vuosille (ks. ennuste.py)
+    Käyttää viimeisen 5 vuoden dataa. Kaikki sarjat sovitetaan kerralla.
+
+    Returns:
+        (data, ennustevuodet)
     """
-    print(f"\nLasketaan ennuste vuodelle {forecast_year}...")
+    cube = PriceCube.from_export(data, sorted(available_years))
+    result = ennuste.forecast(cube, model=model, horizon=horizon)
+    print(f"\nLasketaan ennuste vuosille {', '.join(result.years)} (malli: {model})...")
     
-    # Käytä viimeisiä 5 vuotta ennusteeseen
-    recent_years = sorted([y for y in available_years if int(y) >= 2021])[-5:]
+    # Lisää ennusteet dataan vain niille sarjoille, joille ennuste saatiin
     forecast_count = 0
+    has_forecast = ~np.isnan(result.values).all(axis=3)
+    for p, h, t in zip(*np.nonzero(has_forecast)):
+        values = result.values[p, h, t]
+        forecast_data = {}
+        for m, metric in enumerate(cube.metrics):
+            if not np.isnan(values[m]):
+                value = float(values[m])
+                forecast_data[metric] = int(value) if metric in ennuste.COUNT_METRICS else value
+        info = data[cube.postcodes[p]]
+        info['data'].setdefault(result.years[h], {})[cube.building_types[t]] = forecast_data
+        forecast_count += 1
     
-    for postcode, info in data.items():
-        years_data = info.get('data', {})
-        
-        # Käy läpi kaikki talotyypit
-        for building_type in ['1', '2', '3', '5']:
-            # Kerää historiallinen data
-            historical_prices = []
-            historical_transactions = []
-            
-            for year in recent_years:
-                if year in years_data and building_type in years_data[year]:
-                    year_data = years_data[year][building_type]
-                    if 'keskihinta_aritm_nw' in year_data and year_data['keskihinta_aritm_nw'] is not None:
-                        historical_prices.append((int(year), year_data['keskihinta_aritm_nw']))
-                    if 'lkm_julk20' in year_data and year_data['lkm_julk20'] is not None:
-                        historical_transactions.append((int(year), year_data['lkm_julk20']))
-            
-            # Laske ennuste jos tarpeeksi dataa (vähintään 3 vuotta)
-            forecast_data = {}
-            
-            # Ennuste hinnoille
-            if len(historical_prices) >= 3:
-                # Yksinkertainen lineaarinen trendi
-                years = [y[0] for y in historical_prices]
-                prices = [y[1] for y in historical_prices]
-                
-                # Laske keskimääräinen vuosimuutos
-                avg_change = sum(prices[i] - prices[i-1] for i in range(1, len(prices))) / (len(prices) - 1)
-                forecast_price = prices[-1] + avg_change
-                forecast_data['keskihinta_aritm_nw'] = max(0, forecast_price)  # Ei negatiivisia
-            
-            # Ennuste kaupoille
-            if len(historical_transactions) >= 3:
-                years = [y[0] for y in historical_transactions]
-                trans = [y[1] for y in historical_transactions]
-                
-                # Laske keskimääräinen vuosimuutos
-                avg_change = sum(trans[i] - trans[i-1] for i in range(1, len(trans))) / (len(trans) - 1)
-                forecast_trans = trans[-1] + avg_change
-                forecast_data['lkm_julk20'] = max(0, round(forecast_trans))  # Ei negatiivisia, pyöristä
-            
-            # Lisää ennuste dataan
-            if forecast_data:
-                if forecast_year not in info['data']:
-                    info['data'][forecast_year] = {}
-                info['data'][forecast_year][building_type] = forecast_data
-                forecast_count += 1
+    # Sarjakohtaiset mallitiedot (malli, havaintojen määrä, vuosimuutos)
+    for postcode, series_info in result.series_metadata(cube).items():
+        data[postcode]['forecast'] = series_info
     
     print(f"   Luotu {forecast_count} ennustetta")
-    return data
+    return data, result.years
 
-def export_to_json(data, available_years, filename="asuntohinnat.json"):
-    """Vie JSON:iin"""
+def export_to_json(data, available_years, filename="asuntohinnat.json", source_updated=None,
+                   forecast_years=None, forecast_model=FORECAST_MODEL, compact=COMPACT_OUTPUT):
+    """
+    Vie JSON:iin. Data kirjoitetaan postinumero kerrallaan (json_kirjoitin),
+    ja koko lasketaan kirjoitetuista tavuista.
+    """
     from datetime import datetime
     
+    forecast_years = sorted(forecast_years or [])
+    if forecast_years:
+        forecast_info = (f"Vuodet {', '.join(y + '*' for y in forecast_years)} ovat ennusteita, "
+                         f"jotka on laskettu viimeisen 5 vuoden trendin perusteella "
+                         f"(malli: {forecast_model})")
+    else:
+        forecast_info = ""
+    
     output = {
         "metadata": {
             "source": "Tilastokeskus (StatFin) - Vanhojen osakeasuntojen hinnat ja kaupat postinumeroalueittain",
@@ -225,98 +462,129 @@ def export_to_json(data, available_years, filename="asuntohinnat.json"):
                 "keskihinta_aritm_nw": "Neliöhinta (EUR/m²)",
                 "lkm_julk20": "Kauppojen lukumäärä (kpl)"
             },
-            "forecast_info": "Vuosi 2026* on ennuste, joka on laskettu viimeisen 5 vuoden lineaarisen trendin perusteella",
+            "forecast_info": forecast_info,
+            "forecast_years": forecast_years,
+            "forecast_model": forecast_model,
+            "source_updated": source_updated,
             "last_updated": datetime.now().isoformat()
         },
         "data": data
     }
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    written = write_json(filename, output, 'data', indent=2, compact=compact)
     
     print(f"\n✅ Data viety: {filename}")
-    file_size_mb = len(json.dumps(output)) / (1024 * 1024)
+    file_size_mb = written / (1024 * 1024)
     print(f"   Koko: {file_size_mb:.1f} MB")
     return output
 
 
-def print_summary(data, available_years):
+def print_summary(data, available_years, cube=None, forecast_years=()):
     """Tulosta yhteenveto"""
     print("\n" + "="*60)
     print("Y H T E E N V E T O")
     print("="*60)
     
-    # Laske tilastot viimeisimmälle vuodelle (kaikki rakennustyypit)
+    if cube is None:
+        cube = PriceCube.from_export(data, sorted(available_years))
+    
+    # Laske tilastot viimeisimmälle vuodelle (kerrostalo yksiöt)
     latest_year = max(available_years)
-    prices = []
-    transactions = []
-    
-    for postcode, info in data.items():
-        if latest_year in info['data']:
-            year_data = info['data'][latest_year]
-            if '1' in year_data:  # Kerrostalo yksiöt
-                if 'keskihinta_aritm_nw' in year_data['1']:
-                    prices.append(year_data['1']['keskihinta_aritm_nw'])
-                if 'lkm_julk20' in year_data['1']:
-                    transactions.append(year_data['1']['lkm_julk20'])
-    
-    forecast_note = "* (ennuste)" if latest_year == "2026" else ""
+    year = cube.year_index[latest_year]
+    all_prices = cube.series('keskihinta_aritm_nw', '1')[:, year]
+    all_transactions = cube.series('lkm_julk20', '1')[:, year]
+    has_price = ~np.isnan(all_prices)
+    prices = all_prices[has_price]
+    transactions = all_transactions[~np.isnan(all_transactions)]
+    
+    forecast_note = "* (ennuste)" if latest_year in forecast_years else ""
     print(f"\nVuosi {latest_year}{forecast_note} (kerrostalo yksiöt):")
     print(f"  Postinumeroalueita hintatiedolla: {len(prices)}")
-    if prices:
-        print(f"  Keskihinta: {sum(prices)/len(prices):.0f} EUR/m²")
-        print(f"  Min: {min(prices):.0f} EUR/m²")
-        print(f"  Max: {max(prices):.0f} EUR/m²")
-    if transactions:
-        print(f"  Kauppoja yhteensä: {sum(transactions):.0f} kpl")
-        print(f"  Keskimäärin per alue: {sum(transactions)/len(transactions):.0f} kpl")
+    if len(prices):
+        print(f"  Keskihinta: {prices.mean():.0f} EUR/m²")
+        print(f"  Min: {prices.min():.0f} EUR/m²")
+        print(f"  Max: {prices.max():.0f} EUR/m²")
+    if len(transactions):
+        print(f"  Kauppoja yhteensä: {transactions.sum():.0f} kpl")
+        print(f"  Keskimäärin per alue: {transactions.mean():.0f} kpl")
     
     # Top 5 kalleimmat
-    if prices:
-        top5_data = []
-        for postcode, info in data.items():
-            if latest_year in info['data'] and '1' in info['data'][latest_year]:
-                if 'keskihinta_aritm_nw' in info['data'][latest_year]['1']:
-                    top5_data.append((
-                        postcode,
-                        info['name'],
-                        info['data'][latest_year]['1']['keskihinta_aritm_nw']
-                    ))
-        
-        top5 = sorted(top5_data, key=lambda x: x[2], reverse=True)[:5]
+    if len(prices):
+        order = np.argsort(-np.where(has_price, all_prices, -np.inf), kind='stable')[:5]
         print(f"\n  Kalleimmat alueet:")
-        for postcode, name, price in top5:
-            print(f"    {postcode}: {name} - {price:.0f} EUR/m²")
+        for p in order:
+            if has_price[p]:
+                print(f"    {cube.postcodes[p]}: {cube.names[p]} - {all_prices[p]:.0f} EUR/m²")
     
     print(f"\nSaatavilla vuodet: {min(available_years)}-{max(available_years)} ({len(available_years)} vuotta)")
     print(f"Talotyypit: {len(BUILDING_TYPES)} ({', '.join(BUILDING_TYPES.values())})")
     print("="*60)
 
 
-def main():
-    print("="*60)
-    print("ASUNTOJEN HINNAT JA KAUPAT POSTINUMEROITTAIN")
-    print("Tilastokeskus (2009-2025)")
-    print("="*60)
+def exported_metadata(filename="asuntohinnat.json"):
+    """Aiemmin viedyn tiedoston metatiedot tai None"""
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f).get('metadata')
+    except (OSError, ValueError):
+        return None
+
+
+def update_prices(filename="asuntohinnat.json", force=False):
+    """
+    Päivitä hintadata ja vie se tiedostoon `filename`.
     
-    # Hae data (kaikki vuodet 2009 lähtien)
-    results, meta, available_years = fetch_prices()
+    Jos tiedosto on jo viety samasta lähdetaulukon versiosta samalla
+    ennustemallilla, sitä ei kirjoiteta uudelleen (force=True kirjoittaa
+    aina). Näin tiedoston sisältö ja tiiviste pysyvät samoina, eikä putki
+    (putki.py) aja jatkovaiheita turhaan.
+    
+    Returns:
+        (data, meta); data on None, jos tiedostoa ei kirjoitettu
+    """
+    # Hae data (kaikki vuodet FIRST_YEAR lähtien). Aiemmin haettu data päivitetään
+    # vain muuttuneilta osin; välimuisti on hakemistossa .cache/statfin
+    cache = StatFinCache()
+    client = create_client()
+    results, meta, available_years = refresh_prices(filename, client=client, cache=cache)
+    client.print_metrics()
+    client.close()
+    
+    state = cache.load_state()
+    previous = None if force or state is None else exported_metadata(filename)
+    if (previous is not None and previous.get('source_updated') == state['updated']
+            and previous.get('forecast_model') == FORECAST_MODEL):
+        print(f"\n✓ {filename} on ajan tasalla ({state['updated']}), ei kirjoiteta uudelleen")
+        return None, meta
     
     # Analysoi
     data = analyze_results(results, meta)
     
-    # Laske ennuste vuodelle 2026
-    data = calculate_forecast(data, available_years, forecast_year='2026')
+    # Laske ennuste seuraaville vuosille
+    data, forecast_years = calculate_forecast(data, available_years)
     
-    # Lisää ennustevuosi saatavillaoleviin vuosiin
-    forecast_years = available_years + ['2026']
+    # Lisää ennustevuodet saatavillaoleviin vuosiin
+    all_years = available_years + forecast_years
     
     # Vie
-    output = export_to_json(data, forecast_years, "asuntohinnat.json")
-    print_summary(data, forecast_years)
+    export_to_json(data, all_years, filename,
+                   source_updated=state['updated'] if state else None,
+                   forecast_years=forecast_years)
+    print_summary(data, all_years, forecast_years=forecast_years)
     
     return data, meta
 
 
+def main():
+    print("="*60)
+    print("ASUNTOJEN HINNAT JA KAUPAT POSTINUMEROITTAIN")
+    print(f"Tilastokeskus ({FIRST_YEAR} alkaen)")
+    print("="*60)
+    
+    return update_prices(force=True)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Ennustemallit
+=============
+Vektoroitu ennustemoottori hintakuutiolle. Kaikki aikasarjat
+(postinumero × talotyyppi × mittari) sovitetaan kerralla taulukko-operaatioilla.
+
+Mallit:
+- mean_diff: viimeinen arvo + keskimääräinen vuosimuutos (alkuperäinen menetelmä)
+- ols: pienimmän neliösumman lineaarinen trendi
+- theil_sen: Theil–Sen-trendi (parittaisten kulmakertoimien mediaani), kestää poikkeamia
+- damped: vaimennettu trendi, vuosimuutos kerrotaan joka vuosi kertoimella DAMPING
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from hintakuutio import PriceCube
+
+# Ennusteessa käytettävien viimeisimpien vuosien määrä
+WINDOW = 5
+
+# Vähimmäismäärä havaintoja ikkunassa, jotta ennuste lasketaan
+MIN_POINTS = 3
+
+# Vaimennetun trendin kerroin (0 < DAMPING <= 1)
+DAMPING = 0.8
+
+# Mittarit, joiden ennuste pyöristetään kokonaisluvuksi
+COUNT_METRICS = {'lkm_julk20'}
+
+
+def _mean_diff(t, y, valid, steps):
+    """Viimeinen arvo + (viimeinen - ensimmäinen) / (havaintoja - 1) per askel"""
+    n = valid.sum(axis=1)
+    first = _first_valid(y, valid)
+    last = _last_valid(y, valid)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (last - first) / (n - 1)
+    return last[:, None] + slope[:, None] * steps[None, :], slope
+
+
+def _ols(t, y, valid, steps):
+    """Lineaarinen PNS-trendi havaintovuosien suhteen"""
+    w = valid.astype(float)
+    n = w.sum(axis=1)
+    y0 = np.where(valid, y, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = (w * t).sum(axis=1) / n
+        y_mean = y0.sum(axis=1) / n
+        dt = (t[None, :] - t_mean[:, None]) * w
+        slope = (dt * (y0 - y_mean[:, None] * w)).sum(axis=1) / (dt * dt).sum(axis=1)
+    target = t[-1] + steps
+    intercept = y_mean - slope * t_mean
+    return intercept[:, None] + slope[:, None] * target[None, :], slope
+
+
+def _theil_sen(t, y, valid, steps):
+    """Theil–Sen: kulmakerroin on kaikkien havaintoparien kulmakertoimien mediaani"""
+    i, j = np.triu_indices(len(t), k=1)
+    pair_valid = valid[:, i] & valid[:, j]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slopes = np.where(pair_valid, (y[:, j] - y[:, i]) / (t[j] - t[i]), np.nan)
+    slope = _nanmedian(slopes)
+    intercept = _nanmedian(np.where(valid, y - slope[:, None] * t[None, :], np.nan))
+    target = t[-1] + steps
+    return intercept[:, None] + slope[:, None] * target[None, :], slope
+
+
+def _damped(t, y, valid, steps):
+    """Vaimennettu trendi: viimeinen arvo + slope * (φ + φ² + ... + φ^h)"""
+    _, slope = _mean_diff(t, y, valid, steps)
+    last = _last_valid(y, valid)
+    factor = np.cumsum(DAMPING ** steps)
+    return last[:, None] + slope[:, None] * factor[None, :], slope
+
+
+MODELS = {
+    'mean_diff': _mean_diff,
+    'ols': _ols,
+    'theil_sen': _theil_sen,
+    'damped': _damped,
+}
+
+
+def _first_valid(y, valid):
+    index = np.argmax(valid, axis=1)
+    return y[np.arange(len(y)), index]
+
+
+def _last_valid(y, valid):
+    index = valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    return y[np.arange(len(y)), index]
+
+
+def _nanmedian(a):
+    result = np.full(a.shape[0], np.nan)
+    rows = ~np.isnan(a).all(axis=1)
+    result[rows] = np.nanmedian(a[rows], axis=1)
+    return result
+
+
+class Forecast:
+    """
+    Ennusteen tulos.
+
+    Attributes:
+        years: Ennustevuodet
+        model: Käytetty malli
+        values: Ennusteet muotoa (P, H, T, M), NaN jos ei ennustetta
+        points: Havaintojen määrä ikkunassa muotoa (P, T, M)
+        slope: Mallin vuosimuutos muotoa (P, T, M)
+    """
+
+    def __init__(self, years, model, values, points, slope):
+        self.years = years
+        self.model = model
+        self.values = values
+        self.points = points
+        self.slope = slope
+
+    def series_metadata(self, cube: PriceCube) -> Dict[str, Dict]:
+        """Sarjakohtaiset tiedot vientiä varten: {postcode: {type: {metric: {...}}}}"""
+        output = {}
+        has_forecast = ~np.isnan(self.values).all(axis=1)
+        for p, t, m in zip(*np.nonzero(has_forecast)):
+            output.setdefault(cube.postcodes[p], {}).setdefault(cube.building_types[t], {})[
+                cube.metrics[m]] = {
+                    'model': self.model,
+                    'points': int(self.points[p, t, m]),
+                    'slope': round(float(self.slope[p, t, m]), 2),
+                }
+        return output
+
+
+def next_years(years: Sequence[str], horizon: int) -> List[str]:
+    """Viimeistä vuotta seuraavat `horizon` vuotta"""
+    last = max(int(y) for y in years)
+    return [str(last + h) for h in range(1, horizon + 1)]
+
+
+def forecast(cube: PriceCube, model: str = 'mean_diff', horizon: int = 1,
+             history_years: Sequence[str] = None, window: int = WINDOW,
+             min_points: int = MIN_POINTS) -> Forecast:
+    """
+    Laske ennusteet kaikille kuution sarjoille.
+
+    Args:
+        cube: Hintakuutio
+        model: Mallin nimi (ks. MODELS)
+        horizon: Montako vuotta eteenpäin ennustetaan
+        history_years: Havaintovuodet (oletuksena kaikki kuution vuodet)
+        window: Käytettävien viimeisimpien vuosien määrä
+        min_points: Vähimmäismäärä havaintoja ikkunassa
+    """
+    if model not in MODELS:
+        raise ValueError(f"Tuntematon ennustemalli: {model} (vaihtoehdot: {', '.join(MODELS)})")
+
+    if history_years is None:
+        history_years = cube.years
+    window_years = sorted(history_years, key=int)[-window:]
+    columns = [cube.year_index[y] for y in window_years]
+    t = np.array([int(y) for y in window_years], dtype=float)
+    steps = np.arange(1, horizon + 1, dtype=float)
+
+    # (P, W, T, M) -> (P*T*M, W)
+    window_values = cube.values[:, columns]
+    n_p, n_w, n_t, n_m = window_values.shape
+    y = window_values.transpose(0, 2, 3, 1).reshape(-1, n_w)
+    valid = ~np.isnan(y)
+    points = valid.sum(axis=1)
+
+    values = np.full((y.shape[0], horizon), np.nan)
+    slope = np.full(y.shape[0], np.nan)
+    rows = points >= min_points
+    if rows.any():
+        values[rows], slope[rows] = MODELS[model](t, y[rows], valid[rows], steps)
+
+    # Ei negatiivisia arvoja, lukumäärät kokonaisluvuiksi
+    values = np.maximum(values, 0)
+    values = values.reshape(n_p, n_t, n_m, horizon).transpose(0, 3, 1, 2)
+    for m, metric in enumerate(cube.metrics):
+        if metric in COUNT_METRICS:
+            values[..., m] = np.round(values[..., m])
+
+    return Forecast(next_years(history_years, horizon), model, values,
+                    points.reshape(n_p, n_t, n_m), slope.reshape(n_p, n_t, n_m))
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Geometria
+=========
+Postinumeroalueiden polygonit litteinä NumPy-taulukkoina ja niiden
+keskipisteet.
+
+- `FlatPolygons`: kaikkien featurejen koordinaatit yhdessä taulukossa sekä
+  renkaiden, polygonien ja featurejen alkuindeksit (kuten GeoArrow)
+- `centroids`: pinta-alalla painotettu keskipiste (Polygon ja MultiPolygon,
+  reiät vähennetään) kaikille featureille kerralla
+- `label_points`: taatusti alueen sisällä oleva nimiöpiste (pole of
+  inaccessibility, polylabel-algoritmi) suurimmalle osapolygonille
+
+Saaristoalueilla pinta-alakeskipiste voi osua mereen; nimiöpiste on aina maalla.
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Nimiöpisteen tarkkuus metreinä
+LABEL_PRECISION_M = 25.0
+
+# Metriä per aste (pituusaste skaalataan cos(leveysaste):lla)
+METERS_PER_DEGREE = 111320.0
+
+
+class FlatPolygons:
+    """
+    Polygonit litteinä taulukoina.
+
+    Attributes:
+        coords: Koordinaatit muotoa (N, 2), renkaat suljettuina (alku = loppu)
+        ring_offsets: Renkaan r pisteet coords[ring_offsets[r]:ring_offsets[r + 1]]
+        part_offsets: Polygonin p renkaat ring_offsets[part_offsets[p]:...] (ensimmäinen = ulkorengas)
+        feature_offsets: Featuren f polygonit part_offsets[feature_offsets[f]:...]
+        keys: Featurejen tunnisteet (esim. postinumerot)
+    """
+
+    def __init__(self, coords: np.ndarray, ring_offsets: np.ndarray, part_offsets: np.ndarray,
+                 feature_offsets: np.ndarray, keys: List[str]):
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.part_offsets = part_offsets
+        self.feature_offsets = feature_offsets
+        self.keys = keys
+
+    @classmethod
+    def from_features(cls, features: Iterable[Dict[str, Any]], key: str = 'postinumer') -> 'FlatPolygons':
+        """Kokoa taulukot yhdellä läpikäynnillä. Featuret ilman polygonigeometriaa ohitetaan."""
+        coords = []
+        ring_offsets = [0]
+        part_offsets = [0]
+        feature_offsets = [0]
+        keys = []
+        for feature in features:
+            geometry = feature.get('geometry')
+            if not geometry or geometry['type'] not in ('Polygon', 'MultiPolygon'):
+                continue
+            polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            for polygon in polygons:
+                for ring in polygon:
+                    coords.extend(ring)
+                    ring_offsets.append(len(coords))
+                part_offsets.append(len(ring_offsets) - 1)
+            feature_offsets.append(len(part_offsets) - 1)
+            keys.append(str(feature['properties'].get(key, '')))
+        array = np.array(coords, dtype=float).reshape(-1, 2) if coords else np.empty((0, 2))
+        return cls(array[:, :2], np.array(ring_offsets, dtype=np.int64),
+                   np.array(part_offsets, dtype=np.int64), np.array(feature_offsets, dtype=np.int64), keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def ring_count(self) -> int:
+        return len(self.ring_offsets) - 1
+
+    def ring_feature(self) -> np.ndarray:
+        """Jokaisen renkaan featureindeksi (R)"""
+        part_feature = np.repeat(np.arange(len(self)), np.diff(self.feature_offsets))
+        return np.repeat(part_feature, np.diff(self.part_offsets))
+
+    def ring_is_exterior(self) -> np.ndarray:
+        """Tosi polygonien ulkorenkaille (R)"""
+        exterior = np.zeros(self.ring_count, dtype=bool)
+        exterior[self.part_offsets[:-1][np.diff(self.part_offsets) > 0]] = True
+        return exterior
+
+    def part_rings(self, part: int) -> List[np.ndarray]:
+        """Polygonin renkaat"""
+        return [self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]]
+                for r in range(self.part_offsets[part], self.part_offsets[part + 1])]
+
+    def feature_rings(self, feature: int) -> List[np.ndarray]:
+        """Featuren kaikkien osapolygonien renkaat"""
+        first = self.part_offsets[self.feature_offsets[feature]]
+        last = self.part_offsets[self.feature_offsets[feature + 1]]
+        return [self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]] for r in range(first, last)]
+
+    def select(self, features: Iterable[int]) -> 'FlatPolygons':
+        """Featurejen osajoukko annetussa järjestyksessä (taulukot kootaan indeksoimalla)"""
+        features = np.asarray(list(features), dtype=np.int64)
+        parts = _ranges(self.feature_offsets[features], self.feature_offsets[features + 1])
+        rings = _ranges(self.part_offsets[parts], self.part_offsets[parts + 1])
+        points = _ranges(self.ring_offsets[rings], self.ring_offsets[rings + 1])
+
+        def offsets(starts, stops):
+            return np.concatenate([[0], np.cumsum(stops - starts)]).astype(np.int64)
+
+        return FlatPolygons(
+            self.coords[points],
+            offsets(self.ring_offsets[rings], self.ring_offsets[rings + 1]),
+            offsets(self.part_offsets[parts], self.part_offsets[parts + 1]),
+            offsets(self.feature_offsets[features], self.feature_offsets[features + 1]),
+            [self.keys[f] for f in features.tolist()],
+        )
+
+    def bounds(self) -> np.ndarray:
+        """Featurejen rajaavat suorakulmiot muotoa (F, 4): minx, miny, maxx, maxy"""
+        point_feature = np.repeat(self.ring_feature(), np.diff(self.ring_offsets))
+        result = np.full((len(self), 4), np.nan)
+        if len(point_feature):
+            starts = np.flatnonzero(np.r_[True, point_feature[1:] != point_feature[:-1]])
+            features = point_feature[starts]
+            result[features, 0:2] = np.minimum.reduceat(self.coords, starts, axis=0)
+            result[features, 2:4] = np.maximum.reduceat(self.coords, starts, axis=0)
+        return result
+
+
+def _ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Välien [start, stop) indeksit peräkkäin yhtenä taulukkona"""
+    counts = stops - starts
+    first = np.cumsum(counts) - counts
+    return np.repeat(starts - first, counts) + np.arange(counts.sum(), dtype=np.int64)
+
+
+def _ring_moments(flat: FlatPolygons) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Renkaiden etumerkitön pinta-ala ja keskipiste (R), maanmittarin kaavalla.
+    Laskenta tehdään renkaan ensimmäisen pisteen suhteen pyöristysvirheen välttämiseksi.
+    """
+    coords, offsets = flat.coords, flat.ring_offsets
+    lengths = np.diff(offsets)
+    ring_of_point = np.repeat(np.arange(flat.ring_count), lengths)
+    local = coords - coords[offsets[:-1]][ring_of_point]
+
+    # Särmät i -> i+1 saman renkaan sisällä (viimeinen piste ei aloita särmää)
+    starts = np.ones(len(coords), dtype=bool)
+    starts[offsets[1:] - 1] = False
+    i = np.flatnonzero(starts)
+    a, b = local[i], local[i + 1]
+    cross = a[:, 0] * b[:, 1] - b[:, 0] * a[:, 1]
+    ring = ring_of_point[i]
+
+    count = flat.ring_count
+    area2 = np.bincount(ring, cross, minlength=count)
+    cx = np.bincount(ring, (a[:, 0] + b[:, 0]) * cross, minlength=count)
+    cy = np.bincount(ring, (a[:, 1] + b[:, 1]) * cross, minlength=count)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centroid = np.column_stack([cx, cy]) / (3.0 * area2[:, None])
+    # Surkastunut rengas: pisteiden keskiarvo
+    degenerate = area2 == 0
+    if degenerate.any():
+        mean = np.column_stack([np.bincount(ring_of_point, local[:, k], minlength=count)
+                                for k in range(2)]) / np.maximum(lengths, 1)[:, None]
+        centroid[degenerate] = mean[degenerate]
+    if count:
+        centroid += coords[offsets[:-1]]
+    return np.abs(area2) / 2.0, centroid
+
+
+def centroids(flat: FlatPolygons) -> np.ndarray:
+    """
+    Pinta-alalla painotetut keskipisteet muotoa (F, 2) kaikille featureille.
+    Ulkorenkaat lasketaan positiivisina ja reiät negatiivisina riippumatta
+    renkaiden kiertosuunnasta. Lineaarinen, joten lasketaan suoraan asteissa.
+    """
+    area, centroid = _ring_moments(flat)
+    weight = np.where(flat.ring_is_exterior(), area, -area)
+    feature = flat.ring_feature()
+    total = np.bincount(feature, weight, minlength=len(flat))
+    result = np.column_stack([np.bincount(feature, weight * centroid[:, k], minlength=len(flat))
+                              for k in range(2)])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result /= total[:, None]
+    # Nollapinta-alaiset featuret: renkaiden keskipisteiden keskiarvo
+    empty = ~(total > 0)
+    if empty.any():
+        counts = np.maximum(np.bincount(feature, minlength=len(flat)), 1)
+        mean = np.column_stack([np.bincount(feature, centroid[:, k], minlength=len(flat))
+                                for k in range(2)]) / counts[:, None]
+        result[empty] = mean[empty]
+    return result
+
+
+def areas(flat: FlatPolygons) -> np.ndarray:
+    """Featurejen pinta-alat neliömetreinä (F), paikallinen tasoprojektio"""
+    area, centroid = _ring_moments(flat)
+    scale = METERS_PER_DEGREE ** 2 * np.cos(np.radians(centroid[:, 1]))
+    weight = np.where(flat.ring_is_exterior(), area, -area) * scale
+    return np.bincount(flat.ring_feature(), weight, minlength=len(flat))
+
+
+# Kerralla arvioitavien pisteiden enimmäismäärä (pisteet × särmät -taulukon koko)
+DISTANCE_CHUNK = 256
+
+
+class Edges:
+    """Polygonin särmät piste-polygoni- ja etäisyyslaskentaa varten (vakiot lasketaan kerran)"""
+
+    def __init__(self, rings: List[np.ndarray]):
+        a = np.concatenate([r[:-1] for r in rings])
+        b = np.concatenate([r[1:] for r in rings])
+        self.ax, self.ay = a[:, 0], a[:, 1]
+        self.by = b[:, 1]
+        self.dx, self.dy = b[:, 0] - self.ax, self.by - self.ay
+        length2 = self.dx * self.dx + self.dy * self.dy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.inv_length2 = np.where(length2 > 0, 1.0 / length2, 0.0)
+            self.inv_slope = np.where(self.dy != 0, self.dx / self.dy, 0.0)
+
+    def contains(self, points: np.ndarray) -> np.ndarray:
+        """
+        Pisteet polygonin sisällä (parillinen–pariton-sääntö). Toimii myös
+        kaikille featuren renkaille kerralla: reiät ja erilliset osat hoituvat samalla.
+        """
+        if len(points) > DISTANCE_CHUNK:
+            return np.concatenate([self.contains(points[i:i + DISTANCE_CHUNK])
+                                   for i in range(0, len(points), DISTANCE_CHUNK)])
+        px, py = points[:, 0:1], points[:, 1:2]
+        crosses = (self.ay > py) != (self.by > py)
+        return np.count_nonzero(crosses & (px - self.ax < (py - self.ay) * self.inv_slope), axis=1) % 2 == 1
+
+    def signed_distance(self, points: np.ndarray) -> np.ndarray:
+        """Pisteiden etäisyys polygonin reunaan (positiivinen sisällä, negatiivinen ulkona)"""
+        if len(points) > DISTANCE_CHUNK:
+            return np.concatenate([self.signed_distance(points[i:i + DISTANCE_CHUNK])
+                                   for i in range(0, len(points), DISTANCE_CHUNK)])
+        px, py = points[:, 0:1], points[:, 1:2]
+        rx, ry = px - self.ax, py - self.ay
+
+        # Parillinen–pariton-sääntö: vaakasäde oikealle
+        crosses = (self.ay > py) != (self.by > py)
+        inside = np.count_nonzero(crosses & (rx < ry * self.inv_slope), axis=1) % 2 == 1
+
+        t = np.clip((rx * self.dx + ry * self.dy) * self.inv_length2, 0.0, 1.0)
+        ex, ey = rx - t * self.dx, ry - t * self.dy
+        distance = np.sqrt((ex * ex + ey * ey).min(axis=1))
+        return np.where(inside, distance, -distance)
+
+
+def polylabel(rings: List[np.ndarray], precision: float,
+              guess: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Polygonin sisäpiste, joka on kauimpana reunasta (pole of inaccessibility).
+
+    Ruudukkohaku, jossa solu jaetaan neljään niin kauan kuin sen sisällä voi
+    olla parempi piste kuin paras löydetty (etäisyys + puolilävistäjä > paras
+    + tarkkuus). Kaikki saman kierroksen solut arvioidaan kerralla.
+
+    Args:
+        rings: Ulkorengas ja reiät metrisessä tasossa
+        precision: Tarkkuus samoissa yksiköissä
+        guess: Alkuarvaus (esim. keskipiste)
+    """
+    exterior = rings[0]
+    low, high = exterior.min(axis=0), exterior.max(axis=0)
+    size = high - low
+    cell = float(min(size))
+    if cell <= 0:
+        return (low + high) / 2.0
+
+    # Alkuarvaukset: keskipiste ja rajaavan suorakulmion keskikohta
+    candidates = [(low + high) / 2.0] + ([guess] if guess is not None else [])
+    candidates = np.array(candidates)
+    edges = Edges(rings)
+    scores = edges.signed_distance(candidates)
+    best = candidates[np.argmax(scores)]
+    best_score = float(scores.max())
+
+    xs = np.arange(low[0], high[0], cell) + cell / 2
+    ys = np.arange(low[1], high[1], cell) + cell / 2
+    centers = np.array(np.meshgrid(xs, ys)).reshape(2, -1).T
+    h = cell / 2
+    while len(centers):
+        distance = edges.signed_distance(centers)
+        k = int(np.argmax(distance))
+        if distance[k] > best_score:
+            best, best_score = centers[k], float(distance[k])
+        # Solut, joissa voi vielä olla parempi piste
+        promising = distance + h * math.sqrt(2) > best_score + precision
+        centers = centers[promising]
+        if h < precision / 2 or not len(centers):
+            break
+        h /= 2
+        offsets = np.array([[-h, -h], [h, -h], [-h, h], [h, h]])
+        centers = (centers[:, None, :] + offsets[None, :, :]).reshape(-1, 2)
+    return best
+
+
+def label_points(flat: FlatPolygons, precision_m: float = LABEL_PRECISION_M,
+                 centers: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Nimiöpisteet muotoa (F, 2): suurimman osapolygonin pole of inaccessibility.
+    Laskenta tehdään featurekohtaisessa metrisessä tasossa.
+
+    Args:
+        centers: Valmiiksi lasketut keskipisteet alkuarvauksiksi (oletuksena centroids())
+    """
+    if centers is None:
+        centers = centroids(flat)
+    area, _ = _ring_moments(flat)
+    result = np.full((len(flat), 2), np.nan)
+    for f in range(len(flat)):
+        parts = range(flat.feature_offsets[f], flat.feature_offsets[f + 1])
+        if not len(parts):
+            continue
+        largest = max(parts, key=lambda p: area[flat.part_offsets[p]])
+        rings = flat.part_rings(largest)
+        origin = rings[0][0]
+        scale = np.array([METERS_PER_DEGREE * math.cos(math.radians(origin[1])), METERS_PER_DEGREE])
+        local = [(ring - origin) * scale for ring in rings]
+        point = polylabel(local, precision_m, (centers[f] - origin) * scale)
+        result[f] = point / scale + origin
+    return result
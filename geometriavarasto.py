@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Geometriavarasto
+================
+Postinumeroalueiden geometria binäärimuodossa ajojen välillä.
+
+Postinumeroalueiden rajat muuttuvat korkeintaan kerran vuodessa, mutta
+hintadata päivittyy kuukausittain. Varasto pitää geometrian valmiina
+NumPy-taulukkoina (kuten geometria.FlatPolygons), joten:
+
+- Lataus voi ohittaa geometrian kokonaan, kun lähde ei ole muuttunut
+  (ks. lataa_postinumeroalueet.py, lähteen tunniste)
+- Jokaisella featurella on geometrian sisältötiiviste; uuden latauksen
+  jälkeen taulukot kirjoitetaan vain, jos jokin geometria oikeasti muuttui
+- Jatkovaiheet (yksinkertaistus, TopoJSON, vektoritiilet, aluehaku, kartta)
+  lukevat geometrian varastosta jäsentämättä GeoJSON-tiedostoa. Tämä
+  edellyttää, että GeoJSON on viimeksi kirjoitettu tästä varastosta
+  (vientikirjanpito tiivisteineen), muuten luetaan GeoJSON.
+
+Hakemiston rakenne (.cache/geometria/):
+    coords.npy, ring_offsets.npy, part_offsets.npy, feature_offsets.npy
+                      Geometria, luettavissa muistikuvauksena (mmap)
+    hashes.npy        Geometrian SHA-1 per feature (F, 20)
+    features.json     Lähteen tunniste, viimeisimmän täyden latauksen aika ja
+                      featurejen muut kentät (id, properties, tyyppi)
+    vienti.json       Viimeisin varastosta kirjoitettu GeoJSON ja sen featuret
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometria import FlatPolygons
+
+STORE_DIR = os.path.join('.cache', 'geometria')
+
+ARRAYS = ('coords', 'ring_offsets', 'part_offsets', 'feature_offsets', 'hashes')
+METADATA_FILE = 'features.json'
+EXPORT_FILE = 'vienti.json'
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data: Any):
+    """Kirjoita ensin väliaikaiseen tiedostoon, joten keskeytys ei jätä puolikasta tiedostoa"""
+    partial = path + '.osittainen'
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(partial, path)
+
+
+class GeometryStore:
+    """
+    Featurejen geometria litteinä taulukoina ja muut kentät JSON-muodossa.
+
+    Attributes:
+        flat: Geometria (FlatPolygons); avaimena normalisoitu postinumero
+        hashes: Geometrian SHA-1 per feature, muotoa (F, 20)
+        types: Geometrian tyyppi per feature ('Polygon', 'MultiPolygon' tai None)
+        members: Featurejen muut kentät alkuperäisessä järjestyksessä (polygonien geometry = None)
+        source: Lähteen tunniste, jolla varasto ladattiin
+        loaded: Viimeisimmän täyden latauksen aika (ISO 8601, '' jos ei tiedossa)
+    """
+
+    def __init__(self, flat: FlatPolygons, hashes: np.ndarray, types: List[Optional[str]],
+                 members: List[Dict[str, Any]], source: str = '', loaded: str = ''):
+        self.flat = flat
+        self.hashes = hashes
+        self.types = types
+        self.members = members
+        self.source = source
+        self.loaded = loaded
+        self.index = {key: i for i, key in enumerate(flat.keys)}
+
+    def __len__(self):
+        return len(self.types)
+
+    @classmethod
+    def from_features(cls, features: Iterable[Dict[str, Any]], key: str = 'postinumer',
+                      source: str = '') -> 'GeometryStore':
+        """
+        Kokoa varasto featureista (esim. virtana jäsennetyistä). Featuret ilman
+        polygonigeometriaa säilytetään ilman osapolygoneja.
+        """
+        coords = []
+        ring_offsets = [0]
+        part_offsets = [0]
+        feature_offsets = [0]
+        keys, types, members, hashes = [], [], [], []
+        for feature in features:
+            geometry = feature.get('geometry')
+            kind = geometry['type'] if geometry and geometry['type'] in ('Polygon', 'MultiPolygon') else None
+            polygons = [] if kind is None else (
+                [geometry['coordinates']] if kind == 'Polygon' else geometry['coordinates'])
+            first_point = len(coords)
+            first_ring = len(ring_offsets) - 1
+            for polygon in polygons:
+                for ring in polygon:
+                    coords.extend(ring)
+                    ring_offsets.append(len(coords))
+                part_offsets.append(len(ring_offsets) - 1)
+            feature_offsets.append(len(part_offsets) - 1)
+
+            # Tiiviste: tyyppi, rakenne (renkaiden pituudet, renkaat per osa) ja koordinaatit
+            digest = hashlib.sha1(str(kind).encode('ascii'))
+            digest.update(np.diff(ring_offsets[first_ring:]).astype(np.int64).tobytes())
+            digest.update(np.diff(part_offsets[-len(polygons) - 1:]).astype(np.int64).tobytes()
+                          if polygons else b'')
+            digest.update(np.array(coords[first_point:], dtype=float).reshape(-1, 2)[:, :2].tobytes())
+            hashes.append(np.frombuffer(digest.digest(), dtype=np.uint8))
+
+            keys.append(str(feature['properties'].get(key, '')))
+            types.append(kind)
+            # Polygonigeometria on taulukoissa; muu (harvinainen) geometria säilyy sellaisenaan
+            members.append(dict(feature, geometry=None if kind else geometry))
+
+        array = np.array(coords, dtype=float).reshape(-1, 2) if coords else np.empty((0, 2))
+        flat = FlatPolygons(array[:, :2], np.array(ring_offsets, dtype=np.int64),
+                            np.array(part_offsets, dtype=np.int64),
+                            np.array(feature_offsets, dtype=np.int64), keys)
+        hashes = np.array(hashes, dtype=np.uint8).reshape(-1, 20)
+        return cls(flat, hashes, types, members, source)
+
+    # ------------------------------------------------------------------
+    # Tallennus
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def exists(directory: str = STORE_DIR) -> bool:
+        return os.path.exists(os.path.join(directory, METADATA_FILE))
+
+    @classmethod
+    def open(cls, directory: str = STORE_DIR) -> 'GeometryStore':
+        """Avaa varasto; taulukot kuvataan muistiin (mmap), ei lueta kokonaan"""
+        with open(os.path.join(directory, METADATA_FILE), 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+        flat = FlatPolygons(arrays['coords'], arrays['ring_offsets'], arrays['part_offsets'],
+                            arrays['feature_offsets'], metadata['keys'])
+        return cls(flat, arrays['hashes'], metadata['types'], metadata['members'], metadata['source'],
+                   metadata.get('loaded', ''))
+
+    def _metadata(self) -> Dict[str, Any]:
+        return {'source': self.source, 'loaded': self.loaded, 'digest': self.digest(), 'keys': self.flat.keys,
+                'types': self.types, 'members': self.members}
+
+    def save(self, directory: str = STORE_DIR):
+        """
+        Kirjoita koko varasto. Uusi hakemisto kirjoitetaan viereen ja vaihdetaan
+        paikalleen vasta valmiina, joten keskeytys ei jätä sekavaa varastoa.
+        """
+        staging = directory + '.uusi'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name, array in zip(ARRAYS, (self.flat.coords, self.flat.ring_offsets, self.flat.part_offsets,
+                                        self.flat.feature_offsets, self.hashes)):
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+        _write_json(os.path.join(staging, METADATA_FILE), self._metadata())
+
+        retired = directory + '.vanha'
+        shutil.rmtree(retired, ignore_errors=True)
+        if os.path.exists(directory):
+            os.rename(directory, retired)
+        os.rename(staging, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def save_metadata(self, directory: str = STORE_DIR):
+        """Kirjoita vain featurejen kentät, lähteen tunniste ja latausaika (geometriataulukoihin ei kosketa)"""
+        _write_json(os.path.join(directory, METADATA_FILE), self._metadata())
+
+    def digest(self) -> str:
+        """Koko geometrian tiiviste (featurejen tiivisteistä järjestyksessä)"""
+        digest = hashlib.sha1(np.ascontiguousarray(self.hashes).tobytes())
+        digest.update('\n'.join(self.flat.keys).encode('utf-8'))
+        return digest.hexdigest()
+
+    def diff(self, previous: 'GeometryStore') -> Tuple[List[str], List[str], List[str]]:
+        """Uudet, muuttuneet ja poistuneet avaimet verrattuna aiempaan varastoon"""
+        added, changed = [], []
+        for i, key in enumerate(self.flat.keys):
+            j = previous.index.get(key)
+            if j is None:
+                added.append(key)
+            elif not np.array_equal(self.hashes[i], previous.hashes[j]):
+                changed.append(key)
+        removed = [key for key in previous.flat.keys if key not in self.index]
+        return added, changed, removed
+
+    # ------------------------------------------------------------------
+    # Luku
+    # ------------------------------------------------------------------
+
+    def geometry(self, feature: int) -> Optional[Dict[str, Any]]:
+        """Featuren geometria GeoJSON-muodossa"""
+        kind = self.types[feature]
+        if kind is None:
+            return self.members[feature].get('geometry')
+        flat = self.flat
+        polygons = []
+        for part in range(flat.feature_offsets[feature], flat.feature_offsets[feature + 1]):
+            polygons.append([flat.coords[flat.ring_offsets[r]:flat.ring_offsets[r + 1]].tolist()
+                             for r in range(flat.part_offsets[part], flat.part_offsets[part + 1])])
+        return {'type': kind, 'coordinates': polygons[0] if kind == 'Polygon' else polygons}
+
+    def feature(self, index: int, members: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """GeoJSON-feature; kentät (geometry = None -paikalla) oletuksena varastosta"""
+        members = self.members[index] if members is None else members
+        feature = dict(members, geometry=self.geometry(index))
+        feature['properties'] = dict(feature.get('properties') or {})
+        return feature
+
+    def features(self, keys: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Featuret varastojärjestyksessä, halutessa vain annetuille avaimille"""
+        keys = None if keys is None else set(keys)
+        for i, key in enumerate(self.flat.keys):
+            if keys is None or key in keys:
+                yield self.feature(i)
+
+    def select(self, keys: Sequence[str]) -> FlatPolygons:
+        """Geometria annetuille avaimille annetussa järjestyksessä"""
+        return self.flat.select(self.index[key] for key in keys)
+
+    # ------------------------------------------------------------------
+    # Vientikirjanpito
+    # ------------------------------------------------------------------
+
+    def record_export(self, path: str, geojson: Dict[str, Any], key: str = 'postinumer',
+                      directory: str = STORE_DIR) -> str:
+        """
+        Kirjaa varastosta kirjoitettu GeoJSON: tiedoston tiiviste, varaston
+        tiiviste sekä featurejen kentät ja varastoindeksit. Palauttaa tiedoston SHA-256:n.
+        """
+        file_hash = _file_hash(path)
+        _write_json(os.path.join(directory, EXPORT_FILE), {
+            'geojson': os.path.abspath(path),
+            'sha256': file_hash,
+            'store': self.digest(),
+            'collection': dict(geojson, features=None),
+            'index': [self.index[f['properties'][key]] for f in geojson['features']],
+            'members': [dict(f, geometry=None) for f in geojson['features']],
+        })
+        return file_hash
+
+
+def _exported(path: str, directory: str) -> Optional[Tuple[GeometryStore, Dict[str, Any]]]:
+    """Varasto ja vientikirjaus, jos GeoJSON on sama kuin viimeksi varastosta kirjoitettu"""
+    record_path = os.path.join(directory, EXPORT_FILE)
+    if not (os.path.exists(record_path) and GeometryStore.exists(directory) and os.path.exists(path)):
+        return None
+    with open(record_path, 'r', encoding='utf-8') as f:
+        record = json.load(f)
+    if record['geojson'] != os.path.abspath(path) or record['sha256'] != _file_hash(path):
+        return None
+    store = GeometryStore.open(directory)
+    if store.digest() != record['store']:
+        return None
+    return store, record
+
+
+def read_geojson(path: str, directory: str = STORE_DIR) -> Dict[str, Any]:
+    """
+    Lue GeoJSON: geometria varastosta, jos tiedosto on kirjoitettu siitä eikä
+    ole sen jälkeen muuttunut, muuten jäsentämällä tiedosto.
+    """
+    exported = _exported(path, directory)
+    if exported is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    store, record = exported
+    features = [store.feature(i, members) for i, members in zip(record['index'], record['members'])]
+    return dict(record['collection'], features=features)
+
+
+def read_flat(path: str, key: str = 'postinumer', directory: str = STORE_DIR) -> FlatPolygons:
+    """GeoJSON-tiedoston geometria litteinä taulukoina (varastosta, jos mahdollista)"""
+    exported = _exported(path, directory)
+    if exported is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            return FlatPolygons.from_features(json.load(f)['features'], key)
+    store, record = exported
+    index = [i for i in record['index'] if store.types[i] is not None]
+    return store.flat.select(index)
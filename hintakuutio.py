@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Hintakuutio
+===========
+Asuntohintadata tiheänä NumPy-taulukkona:
+postinumero × vuosi × talotyyppi × mittari.
+
+Puuttuvat arvot ovat NaN. Lisäksi `present`-maski (postinumero × vuosi ×
+talotyyppi) kertoo, onko solu olemassa JSON-rakenteessa (myös tyhjänä),
+jotta muunnos results[postcode][year][building_type][metric] -muotoon ja
+takaisin on häviötön.
+"""
+
+import warnings
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Oletusjärjestykset (samat kuin asuntohinnat.py:ssä)
+DEFAULT_BUILDING_TYPES = ['1', '2', '3', '5']
+DEFAULT_METRICS = ['keskihinta_aritm_nw', 'lkm_julk20']
+
+
+class PriceCube:
+    """
+    Tiheä hintakuutio akseliotsikoineen.
+
+    Attributes:
+        postcodes, years, building_types, metrics: Akselien otsikot
+        values: float64-taulukko muotoa (P, Y, T, M), puuttuva = NaN
+        present: bool-taulukko muotoa (P, Y, T)
+        names, cities: Postinumeroiden nimet ja kaupungit (P)
+    """
+
+    AXES = ('postcode', 'year', 'building_type', 'metric')
+
+    def __init__(self, postcodes: Sequence[str], years: Sequence[str],
+                 building_types: Sequence[str] = DEFAULT_BUILDING_TYPES,
+                 metrics: Sequence[str] = DEFAULT_METRICS,
+                 values: Optional[np.ndarray] = None,
+                 present: Optional[np.ndarray] = None,
+                 names: Optional[Sequence[str]] = None,
+                 cities: Optional[Sequence[str]] = None):
+        self.postcodes = list(postcodes)
+        self.years = list(years)
+        self.building_types = list(building_types)
+        self.metrics = list(metrics)
+        shape = (len(self.postcodes), len(self.years), len(self.building_types), len(self.metrics))
+        if values is None:
+            values = np.full(shape, np.nan)
+        if present is None:
+            present = ~np.isnan(values).all(axis=3)
+        if values.shape != shape or present.shape != shape[:3]:
+            raise ValueError(f"Taulukon muoto {values.shape} ei vastaa akseleita {shape}")
+        self.values = values
+        self.present = present
+        self.names = list(names) if names is not None else list(self.postcodes)
+        self.cities = list(cities) if cities is not None else [''] * len(self.postcodes)
+        self._build_indexes()
+
+    def _build_indexes(self):
+        self.postcode_index = {p: i for i, p in enumerate(self.postcodes)}
+        self.year_index = {y: i for i, y in enumerate(self.years)}
+        self.type_index = {t: i for i, t in enumerate(self.building_types)}
+        self.metric_index = {m: i for i, m in enumerate(self.metrics)}
+
+    # ------------------------------------------------------------------
+    # Muunnokset JSON-rakenteesta ja takaisin
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_results(cls, results: Mapping, years: Optional[Sequence[str]] = None,
+                     building_types: Sequence[str] = DEFAULT_BUILDING_TYPES,
+                     metrics: Sequence[str] = DEFAULT_METRICS,
+                     names: Optional[Mapping[str, str]] = None,
+                     cities: Optional[Mapping[str, str]] = None) -> 'PriceCube':
+        """Muodosta kuutio results[postcode][year][building_type][metric] -rakenteesta"""
+        postcodes = list(results)
+        if years is None:
+            years = sorted({y for years_data in results.values() for y in years_data})
+        cube = cls(postcodes, years, building_types, metrics,
+                   present=np.zeros((len(postcodes), len(years), len(building_types)), dtype=bool),
+                   names=[names.get(p, p) for p in postcodes] if names else None,
+                   cities=[cities.get(p, '') for p in postcodes] if cities else None)
+        year_index, type_index, metric_index = cube.year_index, cube.type_index, cube.metric_index
+        values, present = cube.values, cube.present
+        for p, years_data in enumerate(results.values()):
+            for year, types_data in years_data.items():
+                y = year_index.get(year)
+                if y is None:
+                    continue
+                for building_type, metrics_data in types_data.items():
+                    t = type_index.get(building_type)
+                    if t is None:
+                        continue
+                    present[p, y, t] = True
+                    for metric, value in metrics_data.items():
+                        m = metric_index.get(metric)
+                        if m is not None and value is not None:
+                            values[p, y, t, m] = value
+        return cube
+
+    @classmethod
+    def from_export(cls, data: Mapping, years: Optional[Sequence[str]] = None,
+                    building_types: Sequence[str] = DEFAULT_BUILDING_TYPES,
+                    metrics: Sequence[str] = DEFAULT_METRICS) -> 'PriceCube':
+        """Muodosta kuutio asuntohinnat.json-tiedoston data-osasta ({postcode: {name, city, data}})"""
+        results = {p: info.get('data', {}) for p, info in data.items()}
+        names = {p: info.get('name', p) for p, info in data.items()}
+        cities = {p: info.get('city', '') for p, info in data.items()}
+        return cls.from_results(results, years, building_types, metrics, names, cities)
+
+    def to_results(self) -> Dict:
+        """Muunna takaisin results[postcode][year][building_type][metric] -rakenteeseen"""
+        results = {}
+        for p, postcode in enumerate(self.postcodes):
+            years_data = {}
+            for y, t in zip(*np.nonzero(self.present[p])):
+                cell = self.values[p, y, t]
+                years_data.setdefault(self.years[y], {})[self.building_types[t]] = {
+                    metric: float(cell[m]) for m, metric in enumerate(self.metrics)
+                    if not np.isnan(cell[m])
+                }
+            if years_data:
+                results[postcode] = years_data
+        return results
+
+    def to_export(self) -> Dict:
+        """Muunna asuntohinnat.json-tiedoston data-osan muotoon"""
+        results = self.to_results()
+        return {
+            postcode: {'name': self.names[p], 'city': self.cities[p], 'data': results[postcode]}
+            for p, postcode in enumerate(self.postcodes) if postcode in results
+        }
+
+    # ------------------------------------------------------------------
+    # Haku ja viipalointi
+    # ------------------------------------------------------------------
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def mask(self) -> np.ndarray:
+        """Tosi niissä soluissa, joissa on arvo"""
+        return ~np.isnan(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.present.nbytes
+
+    def get(self, postcode: str, year: str, building_type: str, metric: str) -> Optional[float]:
+        """Yksittäinen arvo tai None"""
+        try:
+            value = self.values[self.postcode_index[postcode], self.year_index[year],
+                                self.type_index[building_type], self.metric_index[metric]]
+        except KeyError:
+            return None
+        return None if np.isnan(value) else float(value)
+
+    def series(self, metric: str, building_type: str) -> np.ndarray:
+        """Aikasarjat muotoa (P, Y) yhdelle mittarille ja talotyypille (näkymä)"""
+        return self.values[:, :, self.type_index[building_type], self.metric_index[metric]]
+
+    def year_slice(self, year: str, metric: str) -> np.ndarray:
+        """Vuoden arvot muotoa (P, T) yhdelle mittarille (näkymä)"""
+        return self.values[:, self.year_index[year], :, self.metric_index[metric]]
+
+    def select(self, postcodes: Optional[Iterable[str]] = None,
+               years: Optional[Iterable[str]] = None,
+               building_types: Optional[Iterable[str]] = None,
+               metrics: Optional[Iterable[str]] = None) -> 'PriceCube':
+        """Uusi kuutio valituista otsikoista (oletuksena kaikki)"""
+        def pick(labels, index, selected):
+            if selected is None:
+                return list(labels), slice(None)
+            selected = [s for s in selected if s in index]
+            return selected, [index[s] for s in selected]
+
+        postcodes, pi = pick(self.postcodes, self.postcode_index, postcodes)
+        years, yi = pick(self.years, self.year_index, years)
+        types, ti = pick(self.building_types, self.type_index, building_types)
+        metrics, mi = pick(self.metrics, self.metric_index, metrics)
+        values = self.values[pi][:, yi][:, :, ti][:, :, :, mi]
+        present = self.present[pi][:, yi][:, :, ti]
+        names = [self.names[self.postcode_index[p]] for p in postcodes]
+        cities = [self.cities[self.postcode_index[p]] for p in postcodes]
+        return PriceCube(postcodes, years, types, metrics, values.copy(), present.copy(),
+                         names, cities)
+
+    def add_years(self, years: Iterable[str]) -> 'PriceCube':
+        """Lisää (tyhjät) vuodet kuutioon paikallaan, esim. ennustetta varten"""
+        new_years = [y for y in years if y not in self.year_index]
+        if new_years:
+            p, _, t, m = self.values.shape
+            self.values = np.concatenate(
+                [self.values, np.full((p, len(new_years), t, m), np.nan)], axis=1)
+            self.present = np.concatenate(
+                [self.present, np.zeros((p, len(new_years), t), dtype=bool)], axis=1)
+            self.years.extend(new_years)
+            self._build_indexes()
+        return self
+
+    # ------------------------------------------------------------------
+    # Koosteet
+    # ------------------------------------------------------------------
+
+    def aggregate(self, metric: str, building_type: str, func: str = 'mean') -> np.ndarray:
+        """Koko maan kooste vuosittain (Y): 'mean', 'sum', 'min', 'max', 'median' tai 'count'"""
+        series = self.series(metric, building_type)
+        if func == 'count':
+            return (~np.isnan(series)).sum(axis=0)
+        reducer = {'mean': np.nanmean, 'sum': np.nansum, 'min': np.nanmin,
+                   'max': np.nanmax, 'median': np.nanmedian}[func]
+        # Täysin tyhjät vuodet tuottavat NaN:n ilman varoitusta
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return reducer(series, axis=0)
+
+    def summary(self, price_metric: str = 'keskihinta_aritm_nw',
+                count_metric: str = 'lkm_julk20') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Talotyyppien yhteenveto jokaiselle postinumerolle ja vuodelle kerralla.
+
+        Returns:
+            (price, transactions, coverage), kukin muotoa (P, Y):
+            - price: kauppamäärillä painotettu keskihinta talotyyppien yli;
+              jos yhdelläkään hinnalla ei ole kauppamäärää, painottamaton keskiarvo
+            - transactions: kauppojen yhteismäärä (0, jos ei tietoa)
+            - coverage: bittimaski talotyypeistä, joilla on hinta
+              (bitti t = building_types[t])
+        """
+        prices = self.values[..., self.metric_index[price_metric]]
+        counts = self.values[..., self.metric_index[count_metric]]
+        has_price = ~np.isnan(prices)
+        weights = np.where(has_price & (counts > 0), counts, 0.0)
+
+        weight_sum = weights.sum(axis=2)
+        weighted = np.where(weights > 0, prices, 0.0)
+        price_count = has_price.sum(axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            price = np.where(weight_sum > 0, (weighted * weights).sum(axis=2) / weight_sum,
+                             np.where(has_price, prices, 0.0).sum(axis=2) / price_count)
+        transactions = np.nansum(counts, axis=2)
+        coverage = (has_price * (1 << np.arange(len(self.building_types)))).sum(axis=2)
+        return price, transactions, coverage.astype(np.uint8 if len(self.building_types) <= 8 else np.int64)
+
+    def groupby(self, keys: Sequence[str], metric: str, building_type: str,
+                func: str = 'mean') -> Dict[str, np.ndarray]:
+        """
+        Ryhmittele postinumerot avaimen (esim. kaupunki) mukaan.
+
+        Args:
+            keys: Ryhmäavain jokaiselle postinumerolle (P), esim. self.cities
+            func: 'mean', 'sum' tai 'count'
+
+        Returns:
+            {avain: vuosittainen kooste (Y)}
+        """
+        groups, inverse = np.unique(np.asarray(keys), return_inverse=True)
+        series = self.series(metric, building_type)
+        valid = ~np.isnan(series)
+        n_groups, n_years = len(groups), series.shape[1]
+        sums = np.zeros((n_groups, n_years))
+        counts = np.zeros((n_groups, n_years))
+        np.add.at(sums, inverse, np.where(valid, series, 0.0))
+        np.add.at(counts, inverse, valid)
+        if func == 'sum':
+            result = sums
+        elif func == 'count':
+            result = counts
+        else:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result = sums / counts
+        return {str(g): result[i] for i, g in enumerate(groups)}
+
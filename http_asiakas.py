@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Yhteinen HTTP-asiakas datan hakuskripteille
+===========================================
+- Keep-alive-yhteydet (requests.Session + yhteyspooli)
+- Uudelleenyritykset eksponentiaalisella viiveellä ja satunnaisuudella
+  (429 ja 5xx -vastaukset sekä yhteysvirheet)
+- Token bucket -rajoitin rajapinnan kyselykiintiölle
+- Pyyntökohtaiset viive- ja yritysmittarit
+"""
+
+import time
+import random
+import threading
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Vastauskoodit, joiden jälkeen pyyntö yritetään uudelleen
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# PxWeb-rajapinnan kyselykiintiö: enintään 30 kyselyä 10 sekunnin aikana
+API_RATE_LIMIT = 30
+API_RATE_PERIOD = 10.0
+API_BURST = 10
+
+RequestMetric = namedtuple('RequestMetric', 'method url status latency attempts')
+
+
+class IncompleteBatchError(Exception):
+    """Erän haku epäonnistui kaikista uudelleenyrityksistä huolimatta"""
+
+
+class RateLimiter:
+    """
+    Token bucket -rajoitin rajapintakyselyille.
+
+    Säiliössä on enintään `burst` kyselyä ja se täyttyy tahdilla
+    (rate - burst) / period. Näin minkä tahansa `period` sekunnin ikkunan
+    aikana tehdään enintään `rate` kyselyä.
+    """
+
+    def __init__(self, rate=API_RATE_LIMIT, period=API_RATE_PERIOD, burst=API_BURST):
+        self.capacity = burst
+        self.fill_rate = (rate - burst) / period
+        self.tokens = float(burst)
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Odota kunnes kyselylle on vapaa vuoro"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.timestamp) * self.fill_rate)
+                self.timestamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    """
+    Yhteyksiä uudelleenkäyttävä HTTP-asiakas uudelleenyrityksillä.
+
+    Args:
+        limiter: RateLimiter tai None (ei rajoitusta)
+        retries: Uudelleenyritysten enimmäismäärä
+        backoff: Ensimmäisen uudelleenyrityksen viiveen yläraja sekunteina
+        max_backoff: Viiveen yläraja sekunteina
+        pool_size: Samanaikaisten yhteyksien määrä per palvelin
+    """
+
+    def __init__(self, limiter=None, retries=5, backoff=0.5, max_backoff=30.0, pool_size=10):
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.metrics = []
+        self._metrics_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _delay(self, attempt, response=None):
+        """Eksponentiaalinen viive täydellä satunnaisuudella (full jitter)"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(self.max_backoff, float(retry_after))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method, url, **kwargs):
+        """
+        Tee pyyntö ja yritä uudelleen 429/5xx-vastauksilla ja yhteysvirheillä.
+
+        Palauttaa viimeisen vastauksen. Jos viimeinenkin yritys päättyy
+        yhteysvirheeseen, virhe nostetaan.
+        """
+        kwargs.setdefault('timeout', 30)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    self._record(method, url, None, start, attempt + 1)
+                    raise
+                time.sleep(self._delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                delay = self._delay(attempt, response)
+                # Vapauta yhteys pooliin ennen odotusta (stream=True ei lue runkoa)
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self._record(method, url, response.status_code, start, attempt + 1)
+            return response
+
+    def _record(self, method, url, status, start, attempts):
+        metric = RequestMetric(method, url, status, time.perf_counter() - start, attempts)
+        with self._metrics_lock:
+            self.metrics.append(metric)
+
+    def print_metrics(self):
+        """Tulosta yhteenveto pyyntöjen viiveistä"""
+        if not self.metrics:
+            return
+        latencies = sorted(m.latency for m in self.metrics)
+        retried = sum(1 for m in self.metrics if m.attempts > 1)
+        failed = sum(1 for m in self.metrics if m.status is None or m.status >= 400)
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"  HTTP-pyyntöjä: {len(self.metrics)} "
+              f"(uudelleenyritettyjä {retried}, epäonnistuneita {failed})")
+        print(f"  Viive: mediaani {p50:.2f} s, p95 {p95:.2f} s, max {latencies[-1]:.2f} s, "
+              f"yhteensä {sum(latencies):.1f} s")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Virtaava JSON-kirjoitin
+=======================
+Kirjoittaa JSON-dokumentin tiedostoon osa kerrallaan: yksi suuri jäsen
+(esim. asuntohinnat.json:n `data` tai GeoJSON:n `features`) kirjoitetaan
+alkio kerrallaan, eikä koko dokumenttia muodosteta muistiin merkkijonona.
+Tiedoston koko lasketaan kirjoitetuista tavuista.
+
+Tuotos on sama kuin json.dump()-funktiolla samoilla asetuksilla.
+"""
+
+import json
+from typing import Any, Dict, Mapping
+
+# Tiedoston kirjoituspuskurin koko
+BUFFER_SIZE = 1024 * 1024
+
+
+class ByteCountingSink:
+    """Tiedostokohde, joka laskee kirjoitetut tavut"""
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes = 0
+
+    def write(self, text: str):
+        data = text.encode('utf-8')
+        self.f.write(data)
+        self.bytes += len(data)
+
+
+def write_json(path: str, document: Dict[str, Any], stream_key: str, indent: int = None,
+               compact: bool = False, ensure_ascii: bool = False) -> int:
+    """
+    Kirjoita dokumentti tiedostoon niin, että `document[stream_key]` kirjoitetaan
+    alkio kerrallaan. Jäsen voi olla sanakirja, lista tai generaattori.
+
+    Args:
+        path: Kohdetiedosto
+        document: Kirjoitettava dokumentti (sanakirja)
+        stream_key: Jäsen, joka kirjoitetaan alkio kerrallaan
+        indent: Sisennys (None = ei rivinvaihtoja)
+        compact: Tiivis muoto ilman sisennystä ja välilyöntejä
+        ensure_ascii: Kuten json.dump()
+
+    Returns:
+        Kirjoitettujen tavujen määrä
+    """
+    if compact:
+        indent = None
+        separators = (',', ':')
+    elif indent is not None:
+        separators = (',', ': ')
+    else:
+        separators = (', ', ': ')
+    item_sep, key_sep = separators
+
+    def newline(level):
+        return '' if indent is None else '\n' + ' ' * (indent * level)
+
+    def dumps(value, level):
+        text = json.dumps(value, indent=indent, separators=separators, ensure_ascii=ensure_ascii)
+        if indent is not None and level:
+            # Merkkijonojen rivinvaihdot on jo koodattu (\n), joten rivinvaihdot
+            # ovat vain sisennyksiä
+            text = text.replace('\n', newline(level))
+        return text
+
+    def write_member(sink, value, level):
+        if isinstance(value, Mapping):
+            items = ((dumps(k, level + 1) + key_sep, v) for k, v in value.items())
+            brackets = '{}'
+        else:
+            items = (('', v) for v in value)
+            brackets = '[]'
+        sink.write(brackets[0])
+        empty = True
+        for prefix, item in items:
+            if not empty:
+                sink.write(item_sep)
+            sink.write(newline(level + 1) + prefix + dumps(item, level + 1))
+            empty = False
+        if not empty:
+            sink.write(newline(level))
+        sink.write(brackets[1])
+
+    with open(path, 'wb', buffering=BUFFER_SIZE) as f:
+        sink = ByteCountingSink(f)
+        sink.write('{')
+        for i, (key, value) in enumerate(document.items()):
+            if i:
+                sink.write(item_sep)
+            sink.write(newline(1) + dumps(key, 1) + key_sep)
+            if key == stream_key:
+                write_member(sink, value, 1)
+            else:
+                sink.write(dumps(value, 1))
+        if document:
+            sink.write(newline(0))
+        sink.write('}')
+    return sink.bytes
+
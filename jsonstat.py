@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+PxWeb json-stat2 -vastausten virtaava jäsennin
+==============================================
+json-stat2-muodossa arvot ovat yhtenä `value`-listana rivijärjestyksessä
+(viimeinen dimensio vaihtuu nopeimmin), eikä jokaisen solun avaimia toisteta.
+Dimensioiden järjestys ja luokkien indeksit saadaan taulukon metatiedoista,
+joten arvot voidaan lukea vastauksesta paloittain suoraan tiheään
+vuosi × postinumero × talotyyppi × mittari -taulukkoon ilman, että koko
+vastausta jäsennetään Python-olioiksi.
+"""
+
+import re
+import math
+import codecs
+from array import array
+
+# Alku "value": [ (sallii välilyönnit)
+VALUE_START = re.compile(r'"value"\s*:\s*\[')
+
+NAN = float('nan')
+
+
+class DenseBatch:
+    """
+    Yhden kyselyn arvot tiheänä taulukkona.
+
+    Attributes:
+        dims: Dimensioiden luokat järjestyksessä [vuodet, postinumerot, talotyypit, mittarit]
+        values: array('d'), puuttuvat arvot NaN
+    """
+
+    def __init__(self, dims, values=None):
+        self.dims = [list(d) for d in dims]
+        self.shape = tuple(len(d) for d in self.dims)
+        size = math.prod(self.shape)
+        if values is None:
+            values = array('d', [NAN]) * size
+        elif len(values) != size:
+            raise ValueError(f"Arvoja {len(values)}, odotettiin {size} (muoto {self.shape})")
+        self.values = values
+
+    @classmethod
+    def from_query(cls, meta, query):
+        """
+        Muodosta taulukon muoto metatiedoista ja kyselystä.
+        PxWeb palauttaa dimensiot ja luokat taulukon (metatietojen) järjestyksessä.
+        """
+        selections = {q['code']: set(q['selection']['values']) for q in query['query']}
+        dims = []
+        for variable in meta['variables']:
+            if variable['code'] in selections:
+                selected = selections[variable['code']]
+                dims.append([v for v in variable['values'] if v in selected])
+        return cls(dims)
+
+    def get(self, *codes):
+        """Hae yksittäinen arvo luokkakoodeilla (vuosi, postinumero, talotyyppi, mittari)"""
+        index = 0
+        for dim, code in zip(self.dims, codes):
+            index = index * len(dim) + dim.index(code)
+        return self.values[index]
+
+    def merge_into(self, results):
+        """Lisää arvot results[postcode][year][building_type][metric] -rakenteeseen"""
+        years, postcodes, building_types, metrics = self.dims
+        n_types = len(building_types)
+        n_metrics = len(metrics)
+        values = self.values
+        index = 0
+        for year in years:
+            for postcode in postcodes:
+                for building_type in building_types:
+                    cell = None
+                    for m in range(n_metrics):
+                        value = values[index + m]
+                        if value == value:  # ei NaN
+                            if cell is None:
+                                cell = results.setdefault(postcode, {}).setdefault(year, {}) \
+                                              .setdefault(building_type, {})
+                            cell[metrics[m]] = value
+                    if cell is None:
+                        # Alkuperäinen json-jäsennin luo tyhjän solun myös puuttuville arvoille
+                        results.setdefault(postcode, {}).setdefault(year, {}).setdefault(building_type, {})
+                    index += n_metrics
+        return results
+
+    def to_dict(self):
+        """Välimuistiin tallennettava muoto (NaN -> None)"""
+        return {
+            'format': 'json-stat2',
+            'dims': self.dims,
+            'values': [v if v == v else None for v in self.values]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        values = array('d', (NAN if v is None else v for v in data['values']))
+        return cls(data['dims'], values)
+
+
+def iter_values(chunks):
+    """
+    Lue json-stat2-vastauksen `value`-listan arvot paloista (bytes).
+    Palauttaa generaattorin liukuluvuista, puuttuva arvo (null) on NaN.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+
+    # Etsi listan alku. Puskurista säilytetään häntä, koska avain voi
+    # katketa kahden palan rajalle.
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        match = VALUE_START.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        buffer = buffer[-16:]
+    else:
+        raise ValueError("json-stat2-vastauksesta puuttuu value-lista")
+
+    pending = buffer
+    for chunk in _decoded(chunks, decoder):
+        pending += chunk
+        end = pending.find(']')
+        tokens = (pending if end < 0 else pending[:end]).split(',')
+        if end < 0:
+            # Viimeinen arvo voi jatkua seuraavassa palassa
+            pending = tokens.pop()
+        for token in tokens:
+            token = token.strip()
+            if token == 'null':
+                yield NAN
+            elif token:
+                yield float(token)
+        if end >= 0:
+            return
+    raise ValueError("json-stat2-vastauksen value-lista katkesi")
+
+
+def _decoded(chunks, decoder):
+    # Ensimmäinen pala on tyhjä, jotta puskuriin jäänyt alku käsitellään
+    yield ''
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def parse_stream(chunks, meta, query):
+    """
+    Jäsennä json-stat2-vastaus paloittain tiheäksi DenseBatch-taulukoksi.
+
+    Args:
+        chunks: Vastauksen rungon palat (esim. response.iter_content())
+        meta: Taulukon metatiedot (dimensioiden järjestys ja luokat)
+        query: Lähetetty kysely (valitut luokat)
+    """
+    batch = DenseBatch.from_query(meta, query)
+    values = array('d', iter_values(chunks))
+    if len(values) != len(batch.values):
+        raise ValueError(f"json-stat2-vastauksessa {len(values)} arvoa, "
+                         f"odotettiin {len(batch.values)}")
+    batch.values = values
+    return batch
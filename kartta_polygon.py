@@ -7,56 +7,80 @@ Asuntojen hintakartta - Polygon-versio
 - Vuosimuutokset
 """
 
+import os
+import sys
 import json
+import hashlib
+import argparse
+from typing import Optional
 
-print("Ladataan dataa...")
+import numpy as np
 
-# Lataa asuntohintadata
-with open('asuntohinnat.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
+from geometriavarasto import read_geojson
+from hintakuutio import PriceCube
+from postinumerot import PostcodeCatalog
+from yksinkertaistus import MANIFEST_FILE as LOD_MANIFEST_FILE, grid_decimals
+import kvantisointi
+import luokittelu
+import tilastot
+import topojson_muunnin
 
-# Lataa GeoJSON
-with open('postinumerot_hinnat.geojson', 'r', encoding='utf-8') as f:
-    geojson_data = json.load(f)
+# Geometrian upotusmuoto: 'topojson' (yhteiset rajat kerran, kvantisoidut
+# koordinaatit, puretaan selaimessa topojson-clientillä) tai 'geojson'
+GEOMETRY_FORMAT = 'topojson'
 
-# Hae metatiedot
-available_years = sorted(data['metadata']['years'])
-building_types = data['metadata']['building_types']
-latest_year = available_years[-1]
+# Upotettavan geometrian koordinaattiresoluutio metreinä (0 = ei kvantisointia)
+COORDINATE_RESOLUTION_M = kvantisointi.RESOLUTION_M
 
-print(f"  Vuodet: {len(available_years)} ({min(available_years)}-{max(available_years)})")
-print(f"  Talotyypit: {len(building_types)}")
-print(f"  Postinumeroalueita: {len(geojson_data['features'])}")
+# Väriluokkien menetelmä: 'jenks', 'quantile' tai 'equal_interval' (ks. luokittelu.py)
+CLASS_METHOD = 'jenks'
 
-# Lisää hintadata GeoJSON-featureisiin
-print("Yhdistetään dataa...")
-for feature in geojson_data['features']:
-    postcode = feature['properties']['postinumer']
-    feature['properties']['data'] = {}
+# Erillisten tiedostojen alihakemisto sivun vieressä
+ASSET_SUBDIR = 'data'
+
+# Geometrian mukana kulkevat ominaisuudet (hinnat ovat vuosittaisissa sarakkeissa)
+FEATURE_PROPERTIES = ('postinumer', 'name', 'city')
+
+def column(values: np.ndarray) -> list:
+    """Sarake JSON-listaksi: NaN -> null, kokonaisluvut ilman desimaaleja"""
+    return [None if v != v else (int(v) if v.is_integer() else v) for v in values.tolist()]
+
+
+def class_codes(values: np.ndarray, breaks) -> str:
+    """Featurejen luokat merkkijonona (ks. luokittelu.class_codes); ilman rajoja kaikki puuttuvia"""
+    if breaks is None:
+        return '-' * len(values)
+    values = np.where(values > 0, values, np.nan)
+    return luokittelu.class_codes(luokittelu.classify(values, np.array(breaks, dtype=float)))
+
+
+def write_asset(asset_dir: str, name: str, content: str) -> str:
+    """
+    Kirjoita tiedosto data-hakemistoon. Nimeen lisätään sisällön tiiviste,
+    joten selain voi välimuistittaa tiedostot pysyvästi.
     
-    # Lisää data jos postinumero löytyy
-    if postcode in data['data']:
-        feature['properties']['data'] = data['data'][postcode]['data']
-        # data-rakenne: {year: {building_type: {keskihinta_aritm_nw, lkm_julk20}}}
-
-# Luo JavaScript-muuttujat
-years_json = json.dumps(available_years)
-building_types_json = json.dumps(building_types)
-geojson_json = json.dumps(geojson_data)
-
-# Laske oletustilastot (viimeisin vuosi, kerrostalo yksiöt, hinnat)
-default_prices = []
-for feature in geojson_data['features']:
-    if latest_year in feature['properties'].get('data', {}):
-        if '1' in feature['properties']['data'][latest_year]:
-            if 'keskihinta_aritm_nw' in feature['properties']['data'][latest_year]['1']:
-                default_prices.append(feature['properties']['data'][latest_year]['1']['keskihinta_aritm_nw'])
-
-avg_price = int(sum(default_prices) / len(default_prices)) if default_prices else 0
-max_price = int(max(default_prices)) if default_prices else 0
-min_price = int(min(default_prices)) if default_prices else 0
-
-html = f'''<!DOCTYPE html>
+    Returns:
+        Polku sivun suhteen
+    """
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha1(content.encode('utf-8')).hexdigest()[:10]
+    filename = f"{stem}.{digest}{ext}"
+    with open(os.path.join(asset_dir, ASSET_SUBDIR, filename), 'w', encoding='utf-8') as f:
+        f.write(content)
+    return f"{ASSET_SUBDIR}/{filename}"
+
+
+def slim_features(features):
+    """Featuret pelkillä geometriaa seuraavilla ominaisuuksilla"""
+    return [dict(f, properties={k: f['properties'].get(k) for k in FEATURE_PROPERTIES}) for f in features]
+
+
+def render_html(latest_year, available_years, forecast_years, feature_count,
+                avg_price, max_price, min_price, geometry_script, geojson_json,
+                year_data_json, stats_json, class_breaks_json, assets_json,
+                years_json, building_types_json, object_name_json) -> str:
+    """Kartan HTML-sivu valmiista JavaScript-muuttujista"""
+    return f'''<!DOCTYPE html>
 <html lang="fi">
 <head>
     <meta charset="UTF-8">
@@ -217,19 +241,19 @@ html = f'''<!DOCTYPE html>
         <div class="control-group" id="year-selector-single">
             <label for="year-select">Vuosi:</label>
             <select id="year-select" onchange="updateMap()">
-                {chr(10).join(f'                <option value="{year}" {"selected" if year == latest_year else ""}>{year}{"*" if year == "2026" else ""}</option>' for year in available_years)}
+                {chr(10).join(f'                <option value="{year}" {"selected" if year == latest_year else ""}>{year}{"*" if year in forecast_years else ""}</option>' for year in available_years)}
             </select>
         </div>
         
         <div class="control-group" id="year-selector-range" style="display:none;">
             <label for="year-from">Alku:</label>
             <select id="year-from" onchange="updateMap()">
-                {chr(10).join(f'                <option value="{year}">{year}{"*" if year == "2026" else ""}</option>' for year in available_years)}
+                {chr(10).join(f'                <option value="{year}">{year}{"*" if year in forecast_years else ""}</option>' for year in available_years)}
             </select>
             
             <label for="year-to">Loppu:</label>
             <select id="year-to" onchange="updateMap()">
-                {chr(10).join(f'                <option value="{year}" {"selected" if year == latest_year else ""}>{year}{"*" if year == "2026" else ""}</option>' for year in available_years)}
+                {chr(10).join(f'                <option value="{year}" {"selected" if year == latest_year else ""}>{year}{"*" if year in forecast_years else ""}</option>' for year in available_years)}
             </select>
         </div>
     </div>
@@ -237,7 +261,7 @@ html = f'''<!DOCTYPE html>
     <div id="stats">
         <div class="stat-box">
             <div class="label">Postinumeroalueita</div>
-            <div class="value">{len(geojson_data['features'])}</div>
+            <div class="value">{feature_count}</div>
         </div>
         <div class="stat-box">
             <div class="label" id="stat-label">Keskihinta {latest_year}</div>
@@ -269,6 +293,7 @@ html = f'''<!DOCTYPE html>
     <div id="map"></div>
     
     <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+    {geometry_script}
     <script>
         var map = L.map('map').setView([60.1699, 24.9384], 8);
         
@@ -276,182 +301,255 @@ html = f'''<!DOCTYPE html>
             attribution: '© OpenStreetMap contributors'
         }}).addTo(map);
         
-        // GeoJSON data
+        // Geometria ja vuosittaiset sarakkeet: upotettuina tai erillisinä
+        // tiedostoina (assets), jotka haetaan vasta kun niitä tarvitaan
         var geojsonData = {geojson_json};
+        var yearData = {year_data_json};
+        var stats = {stats_json};
+        var classBreaks = {class_breaks_json};
+        var assets = {assets_json};
         var availableYears = {years_json};
         var buildingTypes = {building_types_json};
         var geoJsonLayer;
         var currentLegend;
+        var geometryLevel = null;
+        var renderToken = 0;
+        var pendingYears = {{}};
+        var pendingLevels = {{}};
+        var pendingTables = null;
+        var pendingChanges = {{}};
         
-        // Värit hinnoille  
-        function getColorPrice(price) {{
-            if (price > 8000) return '#8B0000';
-            else if (price > 6000) return '#e74c3c';
-            else if (price > 5000) return '#f39c12';
-            else if (price > 4000) return '#f1c40f';
-            else if (price > 3000) return '#9acd32';
-            else if (price > 2000) return '#27ae60';
-            else return '#2ecc71';
-        }}
-        
-        // Värit kauppojen lukumäärille
-        function getColorTransactions(count) {{
-            if (count > 100) return '#2ecc71';
-            else if (count > 50) return '#27ae60';
-            else if (count > 30) return '#9acd32';
-            else if (count > 20) return '#f1c40f';
-            else if (count > 10) return '#f39c12';
-            else if (count > 5) return '#e74c3c';
-            else return '#8B0000';
-        }}
-        
-        // Värit muutosprosentille
-        function getColorChange(change) {{
-            if (change > 15) return '#2ecc71';
-            else if (change > 10) return '#27ae60';
-            else if (change > 5) return '#9acd32';
-            else if (change > 0) return '#f1c40f';
-            else if (change > -5) return '#f39c12';
-            else if (change > -10) return '#e74c3c';
-            else return '#8B0000';
+        // Featuren indeksi vuosisarakkeisiin
+        function indexFeatures(data) {{
+            data.features.forEach(function(feature, i) {{ feature.properties.i = i; }});
+            return data;
         }}
+        if (geojsonData) indexFeatures(geojsonData);
         
-        // Hae arvo datasta
-        function getValue(feature, year, buildingType, metric) {{
-            var data = feature.properties.data;
-            if (!data || !data[year] || !data[year][buildingType]) return null;
-            return data[year][buildingType][metric] || null;
+        function fetchJson(file) {{
+            return fetch(file).then(function(response) {{
+                if (!response.ok) throw new Error(file + ': HTTP ' + response.status);
+                return response.json();
+            }});
         }}
         
-        // Päivitä kartta
-        function updateMap() {{
-            var mode = document.querySelector('input[name="mode"]:checked').value;
-            var buildingType = document.getElementById('building-type-select').value;
-            var metric = document.getElementById('metric-select').value;
-            
-            // Näytä/piilota vuosivalitsimet
-            if (mode === 'absolute') {{
-                document.getElementById('year-selector-single').style.display = 'flex';
-                document.getElementById('year-selector-range').style.display = 'none';
-            }} else {{
-                document.getElementById('year-selector-single').style.display = 'none';
-                document.getElementById('year-selector-range').style.display = 'flex';
+        // Vuoden sarakkeet (kukin vuosi haetaan kerran)
+        function loadYear(year) {{
+            if (yearData[year]) return Promise.resolve(yearData[year]);
+            if (!pendingYears[year]) {{
+                pendingYears[year] = fetchJson(assets.years[year]).then(function(data) {{
+                    yearData[year] = data;
+                    return data;
+                }});
             }}
-            
-            // Poista vanha layer
-            if (geoJsonLayer) map.removeLayer(geoJsonLayer);
-            if (currentLegend) map.removeControl(currentLegend);
-            
-            // Luo uusi layer
-            if (mode === 'absolute') {{
-                createAbsoluteMap(buildingType, metric);
-            }} else {{
-                createChangeMap(buildingType, metric);
+            return pendingYears[year];
+        }}
+        
+        // Tilasto- ja luokkataulukot (erillisinä tiedostoina haetaan kerran);
+        // muutostaulukot ovat lähtövuosittain omissa tiedostoissaan
+        function loadTables() {{
+            if (stats && classBreaks) return Promise.resolve();
+            if (!pendingTables) {{
+                pendingTables = Promise.all([fetchJson(assets.stats), fetchJson(assets.classes)]).then(function(results) {{
+                    stats = results[0];
+                    classBreaks = results[1];
+                    stats.changes = [];
+                    classBreaks.changes = [];
+                }});
             }}
-            
-            updateStats();
+            return pendingTables;
         }}
         
-        // Luo absoluuttinen kartta
-        function createAbsoluteMap(buildingType, metric) {{
-            var selectedYear = document.getElementById('year-select').value;
-            var isPrice = (metric === 'keskihinta_aritm_nw');
-            
-            geoJsonLayer = L.geoJSON(geojsonData, {{
-                smoothFactor: 0,  // Ei geometrian yksinkertaistusta, tarkemmat rajat
-                style: function(feature) {{
-                    var value = getValue(feature, selectedYear, buildingType, metric);
-                    var color = value ? (isPrice ? getColorPrice(value) : getColorTransactions(value)) : '#ccc';
-                    return {{
-                        fillColor: color,
-                        fillOpacity: 0.7,
-                        color: '#fff',
-                        weight: 1,
-                        opacity: 1
-                    }};
-                }},
-                onEachFeature: function(feature, layer) {{
-                    var props = feature.properties;
-                    var value = getValue(feature, selectedYear, buildingType, metric);
-                    
-                    if (value) {{
-                        var metricLabel = isPrice ? 'EUR/m²' : 'kpl';
-                        var popupContent = '<div class="popup-content">' +
-                            '<h3>' + props.postinumer + '</h3>' +
-                            '<div class="price">' + value.toLocaleString() + ' ' + metricLabel + '</div>' +
-                            '<div class="details">' + props.name + '</div>' +
-                            '<div class="details">' + selectedYear + ' | ' + buildingTypes[buildingType] + '</div>' +
-                            '</div>';
-                        layer.bindPopup(popupContent);
-                    }}
-                    
-                    layer.on('mouseover', function(e) {{
-                        this.setStyle({{ fillOpacity: 0.9, weight: 2 }});
-                    }});
-                    layer.on('mouseout', function(e) {{
-                        geoJsonLayer.resetStyle(this);
+        // Lähtövuoden muutostaulukot (vain muutostilassa, kukin vuosi haetaan kerran)
+        function loadChanges(yearFrom) {{
+            return loadTables().then(function() {{
+                var y = stats.years.indexOf(yearFrom);
+                if (stats.changes[y]) return;
+                if (!pendingChanges[yearFrom]) {{
+                    pendingChanges[yearFrom] = fetchJson(assets.changes[yearFrom]).then(function(data) {{
+                        stats.changes[y] = data.stats;
+                        classBreaks.changes[y] = data.classes;
                     }});
                 }}
-            }}).addTo(map);
-            
-            // Legenda
-            createLegend(metric);
+                return pendingChanges[yearFrom];
+            }});
+        }}
+        
+        // Zoomaustasoa vastaava tarkkuustaso (tarkin, jonka min_zoom <= zoom)
+        function levelForZoom(zoom) {{
+            var level = 0;
+            assets.levels.forEach(function(item, i) {{ if (item.min_zoom <= zoom) level = i; }});
+            return level;
+        }}
+        
+        // Geometria nykyiselle zoomaustasolle
+        function loadGeometry(level) {{
+            if (!assets) return Promise.resolve(geojsonData);
+            if (!pendingLevels[level]) {{
+                pendingLevels[level] = fetchJson(assets.levels[level].file).then(function(topology) {{
+                    return indexFeatures(topojson.feature(topology, {object_name_json}));
+                }});
+            }}
+            return pendingLevels[level];
+        }}
+        
+        // Väriasteikot pienimmästä luokasta suurimpaan
+        var palettes = {{
+            'keskihinta_aritm_nw': ['#2ecc71', '#27ae60', '#9acd32', '#f1c40f', '#f39c12', '#e74c3c', '#8B0000'],
+            'lkm_julk20': ['#8B0000', '#e74c3c', '#f39c12', '#f1c40f', '#9acd32', '#27ae60', '#2ecc71'],
+            'change': ['#8B0000', '#e74c3c', '#f39c12', '#f1c40f', '#9acd32', '#27ae60', '#2ecc71']
+        }};
+        
+        // Luokan väri: asteikko venytetään valinnan luokkamäärälle
+        function classColor(palette, index, classCount) {{
+            if (classCount < 2) return palette[Math.floor(palette.length / 2)];
+            return palette[Math.round(index * (palette.length - 1) / (classCount - 1))];
+        }}
+        
+        // Arvon luokka ylärajoista (sama sääntö kuin luokittelu.classify)
+        function classOf(breaks, value) {{
+            var index = 0;
+            while (index < breaks.length - 2 && value > breaks[index + 1]) index++;
+            return index;
+        }}
+        
+        // Valinnan luokkarajat (laskettu valmiiksi, ks. luokittelu.py)
+        function breaksFor(selection) {{
+            var t = classBreaks.building_types.indexOf(selection.buildingType);
+            var m = classBreaks.metrics.indexOf(selection.metric);
+            var years = classBreaks.years;
+            return selection.mode === 'absolute'
+                ? classBreaks.levels[years.indexOf(selection.year)][t][m]
+                : classBreaks.changes[years.indexOf(selection.yearFrom)][years.indexOf(selection.yearTo)][t][m];
+        }}
+        
+        // Valinnan sarake (arvo per feature, featurejen järjestyksessä)
+        function getColumn(year, buildingType, metric) {{
+            var data = yearData[year];
+            if (!data || !data.values[buildingType]) return null;
+            return data.values[buildingType][metric];
+        }}
+        
+        // Hae arvo datasta
+        function getValue(feature, year, buildingType, metric) {{
+            var column = getColumn(year, buildingType, metric);
+            return column ? column[feature.properties.i] || null : null;
         }}
         
-        // Luo muutoskartta
-        function createChangeMap(buildingType, metric) {{
-            var yearFrom = document.getElementById('year-from').value;
-            var yearTo = document.getElementById('year-to').value;
+        // Kaikkien talotyyppien vuosiyhteenveto (laskettu valmiiksi aineiston yhdistämisessä)
+        function getSummary(feature, year) {{
+            var summary = yearData[year] && yearData[year].summary;
+            var i = feature.properties.i;
+            if (!summary || summary.price[i] === null) return null;
+            return {{ price: summary.price[i], transactions: summary.transactions[i] }};
+        }}
+        
+        // Nykyiset valinnat
+        function currentSelection() {{
+            return {{
+                mode: document.querySelector('input[name="mode"]:checked').value,
+                buildingType: document.getElementById('building-type-select').value,
+                metric: document.getElementById('metric-select').value,
+                year: document.getElementById('year-select').value,
+                yearFrom: document.getElementById('year-from').value,
+                yearTo: document.getElementById('year-to').value,
+                query: document.getElementById('search').value.toLowerCase()
+            }};
+        }}
+        var selection = currentSelection();
+        
+        function matchesSearch(props, query) {{
+            return query === '' || props.postinumer.toLowerCase().includes(query) ||
+                (props.name || '').toLowerCase().includes(query);
+        }}
+        
+        // Tyylifunktio valinnalle: sarakkeet haetaan kerran, featurea kohden vain indeksi
+        function styleFor(selection) {{
+            var breaks = breaksFor(selection);
+            var classCount = breaks ? breaks.length - 1 : 0;
+            var palette = selection.mode === 'absolute' ? palettes[selection.metric] : palettes.change;
+            var data = yearData[selection.year];
+            var codes = data && data.classes[selection.buildingType] ? data.classes[selection.buildingType][selection.metric] : null;
+            var columnFrom = getColumn(selection.yearFrom, selection.buildingType, selection.metric);
+            var columnTo = getColumn(selection.yearTo, selection.buildingType, selection.metric);
             
-            geoJsonLayer = L.geoJSON(geojsonData, {{
-                smoothFactor: 0,  // Ei geometrian yksinkertaistusta, tarkemmat rajat
-                style: function(feature) {{
-                    var valueFrom = getValue(feature, yearFrom, buildingType, metric);
-                    var valueTo = getValue(feature, yearTo, buildingType, metric);
-                    
+            return function(feature) {{
+                var i = feature.properties.i;
+                var style = {{ fillColor: '#ccc', fillOpacity: 0.7, color: '#fff', weight: 1, opacity: 1 }};
+                
+                if (selection.mode === 'absolute') {{
+                    // Featuren luokka valmiina merkkinä ('-' = ei arvoa)
+                    var index = codes ? codes.charCodeAt(i) - 48 : -1;
+                    if (index >= 0) style.fillColor = classColor(palette, index, classCount);
+                }} else {{
+                    var valueFrom = columnFrom && columnFrom[i];
+                    var valueTo = columnTo && columnTo[i];
                     if (valueFrom && valueTo && valueFrom > 0) {{
                         var change = ((valueTo - valueFrom) / valueFrom) * 100;
-                        return {{
-                            fillColor: getColorChange(change),
-                            fillOpacity: 0.7,
-                            color: '#fff',
-                            weight: 1,
-                            opacity: 1
-                        }};
+                        style.fillColor = classColor(palette, classOf(breaks, change), classCount);
                     }} else {{
-                        return {{
-                            fillColor: '#ccc',
-                            fillOpacity: 0.3,
-                            color: '#fff',
-                            weight: 1,
-                            opacity: 1
-                        }};
+                        style.fillOpacity = 0.3;
                     }}
-                }},
+                }}
+                
+                // Haku himmentää muut alueet
+                if (!matchesSearch(feature.properties, selection.query)) {{
+                    style.opacity = 0.1;
+                    style.fillOpacity = 0.1;
+                }}
+                return style;
+            }};
+        }}
+        
+        // Popupin sisältö muodostetaan vasta avattaessa nykyisestä valinnasta
+        function popupContent(feature) {{
+            var props = feature.properties;
+            var isPrice = (selection.metric === 'keskihinta_aritm_nw');
+            var metricLabel = isPrice ? 'EUR/m²' : 'kpl';
+            var buildingType = selection.buildingType;
+            var html = '<div class="popup-content"><h3>' + props.postinumer + '</h3>';
+            
+            if (selection.mode === 'absolute') {{
+                var value = getValue(feature, selection.year, buildingType, selection.metric);
+                if (!value) return html + '<div class="details">' + props.name + '</div>' +
+                    '<div class="details">' + selection.year + ': ei tietoja</div></div>';
+                var summary = getSummary(feature, selection.year);
+                return html +
+                    '<div class="price">' + value.toLocaleString() + ' ' + metricLabel + '</div>' +
+                    '<div class="details">' + props.name + '</div>' +
+                    '<div class="details">' + selection.year + ' | ' + buildingTypes[buildingType] + '</div>' +
+                    (summary ? '<div class="details">Kaikki talotyypit: ' +
+                        Math.round(summary.price).toLocaleString() + ' EUR/m², ' +
+                        summary.transactions + ' kauppaa</div>' : '') +
+                    '</div>';
+            }}
+            
+            var yearFrom = selection.yearFrom, yearTo = selection.yearTo;
+            var valueFrom = getValue(feature, yearFrom, buildingType, selection.metric);
+            var valueTo = getValue(feature, yearTo, buildingType, selection.metric);
+            if (!(valueFrom && valueTo && valueFrom > 0)) return html + '<div class="details">' + props.name + '</div>' +
+                '<div class="details">' + yearFrom + '-' + yearTo + ': ei tietoja</div></div>';
+            var change = ((valueTo - valueFrom) / valueFrom) * 100;
+            var absChange = valueTo - valueFrom;
+            var changeSign = change >= 0 ? '+' : '';
+            return html +
+                '<div class="price">' + changeSign + change.toFixed(1) + ' %</div>' +
+                '<div class="details">' + props.name + '</div>' +
+                '<div class="details">' + yearFrom + ': ' + valueFrom.toLocaleString() + ' ' + metricLabel + '<br>' +
+                yearTo + ': ' + valueTo.toLocaleString() + ' ' + metricLabel + '<br>' +
+                'Muutos: ' + changeSign + absChange.toLocaleString() + ' ' + metricLabel + '</div>' +
+                '<div class="details">' + buildingTypes[buildingType] + '</div>' +
+                '</div>';
+        }}
+        
+        // Luo polygonit (vain kerran geometriaa kohden; valintojen muutokset vain värittävät)
+        function createLayer(data) {{
+            if (geoJsonLayer) map.removeLayer(geoJsonLayer);
+            geoJsonLayer = L.geoJSON(data, {{
+                smoothFactor: 0,  // Ei geometrian yksinkertaistusta, tarkemmat rajat
+                style: styleFor(selection),
                 onEachFeature: function(feature, layer) {{
-                    var props = feature.properties;
-                    var valueFrom = getValue(feature, yearFrom, buildingType, metric);
-                    var valueTo = getValue(feature, yearTo, buildingType, metric);
-                    
-                    if (valueFrom && valueTo && valueFrom > 0) {{
-                        var change = ((valueTo - valueFrom) / valueFrom) * 100;
-                        var absChange = valueTo - valueFrom;
-                        var changeSign = change >= 0 ? '+' : '';
-                        var isPrice = (metric === 'keskihinta_aritm_nw');
-                        var metricLabel = isPrice ? 'EUR/m²' : 'kpl';
-                        
-                        var popupContent = '<div class="popup-content">' +
-                            '<h3>' + props.postinumer + '</h3>' +
-                            '<div class="price">' + changeSign + change.toFixed(1) + ' %</div>' +
-                            '<div class="details">' + props.name + '</div>' +
-                            '<div class="details">' + yearFrom + ': ' + valueFrom.toLocaleString() + ' ' + metricLabel + '<br>' +
-                            yearTo + ': ' + valueTo.toLocaleString() + ' ' + metricLabel + '<br>' +
-                            'Muutos: ' + changeSign + absChange.toLocaleString() + ' ' + metricLabel + '</div>' +
-                            '<div class="details">' + buildingTypes[buildingType] + '</div>' +
-                            '</div>';
-                        layer.bindPopup(popupContent);
-                    }}
-                    
+                    layer.bindPopup(function() {{ return popupContent(feature); }});
                     layer.on('mouseover', function(e) {{
                         this.setStyle({{ fillOpacity: 0.9, weight: 2 }});
                     }});
@@ -460,131 +558,131 @@ html = f'''<!DOCTYPE html>
                     }});
                 }}
             }}).addTo(map);
-            
-            // Legenda muutoksille
-            createChangeLegend();
         }}
         
-        // Luo legenda
-        function createLegend(metric) {{
-            currentLegend = L.control({{position: 'bottomright'}});
-            currentLegend.onAdd = function(map) {{
-                var div = L.DomUtil.create('div', 'legend');
+        // Väritä olemassa olevat polygonit nykyisen valinnan mukaan
+        function restyleLayer() {{
+            geoJsonLayer.options.style = styleFor(selection);
+            geoJsonLayer.setStyle(geoJsonLayer.options.style);
+            geoJsonLayer.eachLayer(function(layer) {{
+                if (layer.isPopupOpen()) layer.getPopup().update();
+            }});
+        }}
+        
+        // Päivitä kartta
+        function updateMap() {{
+            var next = currentSelection();
+            
+            // Näytä/piilota vuosivalitsimet
+            if (next.mode === 'absolute') {{
+                document.getElementById('year-selector-single').style.display = 'flex';
+                document.getElementById('year-selector-range').style.display = 'none';
+            }} else {{
+                document.getElementById('year-selector-single').style.display = 'none';
+                document.getElementById('year-selector-range').style.display = 'flex';
+            }}
+            
+            // Odota geometria ja valittujen vuosien data (haetaan tarvittaessa)
+            var years = next.mode === 'absolute' ? [next.year] : [next.yearFrom, next.yearTo];
+            var level = assets ? levelForZoom(map.getZoom()) : null;
+            var token = ++renderToken;
+            var tables = next.mode === 'absolute' ? loadTables() : loadChanges(next.yearFrom);
+            Promise.all([loadGeometry(level), tables].concat(years.map(loadYear))).then(function(results) {{
+                if (token !== renderToken) return;  // uudempi päivitys on jo käynnissä
+                selection = next;
                 
-                if (metric === 'keskihinta_aritm_nw') {{
-                    div.innerHTML = '<h4>Hinta €/m²</h4>';
-                    var grades = [0, 2000, 3000, 4000, 5000, 6000, 8000];
-                    var labels = ['< 2000', '2000-3000', '3000-4000', '4000-5000', '5000-6000', '6000-8000', '> 8000'];
-                    for (var i = 0; i < grades.length; i++) {{
-                        div.innerHTML += '<div class="legend-item"><div class="legend-color" style="background:' + 
-                            getColorPrice(grades[i] + 1) + '"></div>' + labels[i] + '</div>';
-                    }}
+                // Polygonit luodaan uudelleen vain, jos geometria vaihtui (tarkkuustaso)
+                if (!geoJsonLayer || results[0] !== geojsonData || level !== geometryLevel) {{
+                    geojsonData = results[0];
+                    geometryLevel = level;
+                    createLayer(geojsonData);
                 }} else {{
-                    div.innerHTML = '<h4>Kauppoja (kpl)</h4>';
-                    var grades = [0, 5, 10, 20, 30, 50, 100];
-                    var labels = ['< 5', '5-10', '10-20', '20-30', '30-50', '50-100', '> 100'];
-                    for (var i = grades.length - 1; i >= 0; i--) {{
-                        div.innerHTML += '<div class="legend-item"><div class="legend-color" style="background:' + 
-                            getColorTransactions(grades[i] + 1) + '"></div>' + labels[i] + '</div>';
-                    }}
+                    restyleLayer();
                 }}
-                return div;
-            }};
-            currentLegend.addTo(map);
+                
+                // Legenda
+                if (currentLegend) map.removeControl(currentLegend);
+                createLegend();
+                
+                updateStats();
+            }}).catch(function(error) {{
+                console.error('Datan lataus epäonnistui:', error);
+            }});
         }}
         
-        // Luo legenda muutoksille
-        function createChangeLegend() {{
+        // Vaihda tarkkuustasoa zoomattaessa
+        map.on('zoomend', function() {{
+            if (assets && levelForZoom(map.getZoom()) !== geometryLevel) updateMap();
+        }});
+        
+        // Luo legenda valinnan luokkarajoista
+        function createLegend() {{
+            var isChange = selection.mode !== 'absolute';
+            var breaks = breaksFor(selection);
+            var palette = isChange ? palettes.change : palettes[selection.metric];
+            var title = isChange ? 'Muutos-%' : (selection.metric === 'keskihinta_aritm_nw' ? 'Hinta €/m²' : 'Kauppoja (kpl)');
+            var format = function(value) {{
+                return isChange ? value.toFixed(1) + '%' : value.toLocaleString();
+            }};
+            
             currentLegend = L.control({{position: 'bottomright'}});
             currentLegend.onAdd = function(map) {{
                 var div = L.DomUtil.create('div', 'legend');
-                div.innerHTML = '<h4>Muutos-%</h4>';
-                var grades = [15, 10, 5, 0, -5, -10];
-                var labels = ['> 15%', '10% - 15%', '5% - 10%', '0% - 5%', '-5% - 0%', '-10% - -5%', '< -10%'];
-                for (var i = 0; i < grades.length; i++) {{
+                div.innerHTML = '<h4>' + title + '</h4>';
+                if (!breaks) {{
+                    div.innerHTML += '<div class="legend-item">Ei tietoja</div>';
+                    return div;
+                }}
+                for (var i = breaks.length - 2; i >= 0; i--) {{
                     div.innerHTML += '<div class="legend-item"><div class="legend-color" style="background:' + 
-                        getColorChange(grades[i] + 1) + '"></div>' + labels[i] + '</div>';
+                        classColor(palette, i, breaks.length - 1) + '"></div>' +
+                        format(breaks[i]) + ' – ' + format(breaks[i + 1]) + '</div>';
                 }}
-                div.innerHTML += '<div class="legend-item"><div class="legend-color" style="background:' + 
-                    getColorChange(-15) + '"></div>' + labels[6] + '</div>';
                 return div;
             }};
             currentLegend.addTo(map);
         }}
         
+        // Valinnan tunnusluvut valmiiksi lasketusta tilastotaulukosta
+        function statsFor(selection) {{
+            var t = stats.building_types.indexOf(selection.buildingType);
+            var m = stats.metrics.indexOf(selection.metric);
+            var row = selection.mode === 'absolute'
+                ? stats.levels[stats.years.indexOf(selection.year)][t][m]
+                : stats.changes[stats.years.indexOf(selection.yearFrom)][stats.years.indexOf(selection.yearTo)][t][m];
+            var result = {{}};
+            stats.fields.forEach(function(field, k) {{ result[field] = row[k]; }});
+            return result;
+        }}
+        
         // Päivitä tilastot
         function updateStats() {{
-            var mode = document.querySelector('input[name="mode"]:checked').value;
-            var buildingType = document.getElementById('building-type-select').value;
-            var metric = document.getElementById('metric-select').value;
-            var isPrice = (metric === 'keskihinta_aritm_nw');
+            var isPrice = (selection.metric === 'keskihinta_aritm_nw');
             var metricLabel = isPrice ? 'EUR/m²' : 'kpl';
+            var result = statsFor(selection);
+            if (!result.count) return;
             
-            if (mode === 'absolute') {{
-                var selectedYear = document.getElementById('year-select').value;
-                var values = [];
-                
-                geojsonData.features.forEach(function(feature) {{
-                    var value = getValue(feature, selectedYear, buildingType, metric);
-                    if (value) values.push(value);
-                }});
-                
-                if (values.length > 0) {{
-                    var avg = Math.round(values.reduce((a,b) => a + b, 0) / values.length);
-                    var max = Math.max(...values);
-                    var min = Math.min(...values);
-                    
-                    document.getElementById('stat-label').textContent = (isPrice ? 'Keskihinta ' : 'Keskiarvo ') + selectedYear;
-                    document.getElementById('stat-value').textContent = avg.toLocaleString() + ' ' + metricLabel;
-                    document.getElementById('stat-max-label').textContent = isPrice ? 'Kallein' : 'Suurin';
-                    document.getElementById('stat-max').textContent = max.toLocaleString() + ' ' + metricLabel;
-                    document.getElementById('stat-min-label').textContent = isPrice ? 'Halvin' : 'Pienin';
-                    document.getElementById('stat-min').textContent = min.toLocaleString() + ' ' + metricLabel;
-                }}
+            if (selection.mode === 'absolute') {{
+                document.getElementById('stat-label').textContent = (isPrice ? 'Keskihinta ' : 'Keskiarvo ') + selection.year;
+                document.getElementById('stat-value').textContent = Math.round(result.mean).toLocaleString() + ' ' + metricLabel;
+                document.getElementById('stat-max-label').textContent = isPrice ? 'Kallein' : 'Suurin';
+                document.getElementById('stat-max').textContent = result.max.toLocaleString() + ' ' + metricLabel;
+                document.getElementById('stat-min-label').textContent = isPrice ? 'Halvin' : 'Pienin';
+                document.getElementById('stat-min').textContent = result.min.toLocaleString() + ' ' + metricLabel;
             }} else {{
-                var yearFrom = document.getElementById('year-from').value;
-                var yearTo = document.getElementById('year-to').value;
-                var changes = [];
-                
-                geojsonData.features.forEach(function(feature) {{
-                    var valueFrom = getValue(feature, yearFrom, buildingType, metric);
-                    var valueTo = getValue(feature, yearTo, buildingType, metric);
-                    if (valueFrom && valueTo && valueFrom > 0) {{
-                        var change = ((valueTo - valueFrom) / valueFrom) * 100;
-                        changes.push(change);
-                    }}
-                }});
-                
-                if (changes.length > 0) {{
-                    var avg = changes.reduce((a,b) => a + b, 0) / changes.length;
-                    var max = Math.max(...changes);
-                    var min = Math.min(...changes);
-                    
-                    document.getElementById('stat-label').textContent = 'Keskimuutos ' + yearFrom + '-' + yearTo;
-                    document.getElementById('stat-value').textContent = (avg >= 0 ? '+' : '') + avg.toFixed(1) + ' %';
-                    document.getElementById('stat-max-label').textContent = 'Suurin nousu';
-                    document.getElementById('stat-max').textContent = '+' + max.toFixed(1) + ' %';
-                    document.getElementById('stat-min-label').textContent = 'Suurin lasku';
-                    document.getElementById('stat-min').textContent = min.toFixed(1) + ' %';
-                }}
+                document.getElementById('stat-label').textContent = 'Keskimuutos ' + selection.yearFrom + '-' + selection.yearTo;
+                document.getElementById('stat-value').textContent = (result.mean >= 0 ? '+' : '') + result.mean.toFixed(1) + ' %';
+                document.getElementById('stat-max-label').textContent = 'Suurin nousu';
+                document.getElementById('stat-max').textContent = '+' + result.max.toFixed(1) + ' %';
+                document.getElementById('stat-min-label').textContent = 'Suurin lasku';
+                document.getElementById('stat-min').textContent = result.min.toFixed(1) + ' %';
             }}
         }}
         
-        // Hakutoiminto
+        // Hakutoiminto (himmentää muut alueet, polygoneja ei luoda uudelleen)
         function filterMap() {{
-            var query = document.getElementById('search').value.toLowerCase();
-            
-            geoJsonLayer.eachLayer(function(layer) {{
-                var props = layer.feature.properties;
-                var postcode = props.postinumer.toLowerCase();
-                var name = props.name.toLowerCase();
-                
-                if (query === '' || postcode.includes(query) || name.includes(query)) {{
-                    layer.setStyle({{opacity: 1, fillOpacity: 0.7}});
-                }} else {{
-                    layer.setStyle({{opacity: 0.1, fillOpacity: 0.1}});
-                }}
-            }});
+            selection.query = document.getElementById('search').value.toLowerCase();
+            if (geoJsonLayer) restyleLayer();
         }}
         
         // Alusta kartta
@@ -594,15 +692,207 @@ html = f'''<!DOCTYPE html>
 </html>
 '''
 
-# Tallenna HTML
-with open('kartta.html', 'w', encoding='utf-8') as f:
-    f.write(html)
-
-print(f"\n✅ Kartta luotu: kartta.html")
-print(f"   Postinumeroalueita: {len(geojson_data['features'])}")
-print(f"   Saatavilla vuodet: {', '.join(available_years)}")
-print(f"   Ominaisuudet:")
-print(f"   - Polygon-pohjaiset alueet")
-print(f"   - Talotyypit: {', '.join(building_types.values())}")
-print(f"   - Mittarit: Neliöhinnat ja kauppojen lukumäärät")
-print(f"   - Absoluuttiset arvot ja vuosimuutokset")
+
+def build_map(asset_dir: Optional[str] = None) -> str:
+    """
+    Luo kartta asuntohinnat.json- ja postinumerot_hinnat.geojson-tiedostoista.
+
+    Args:
+        asset_dir: Hakemisto erillisille tiedostoille; None = yksi tiedosto kartta.html
+
+    Returns:
+        Kirjoitetun HTML-tiedoston polku
+    """
+    print("Ladataan dataa...")
+
+    # Lataa asuntohintadata
+    with open('asuntohinnat.json', 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    # Lataa GeoJSON (geometria geometriavarastosta, jos GeoJSON on kirjoitettu siitä)
+    geojson_data = read_geojson('postinumerot_hinnat.geojson')
+
+    # Hae metatiedot
+    available_years = sorted(data['metadata']['years'])
+    building_types = data['metadata']['building_types']
+    latest_year = available_years[-1]
+    # Ennustevuodet merkitään tähdellä (vanhoissa tiedostoissa ennuste on aina 2026)
+    forecast_years = set(data['metadata'].get('forecast_years', ['2026']))
+
+    print(f"  Vuodet: {len(available_years)} ({min(available_years)}-{max(available_years)})")
+    print(f"  Talotyypit: {len(building_types)}")
+    print(f"  Postinumeroalueita: {len(geojson_data['features'])}")
+
+    # Nimet ja kaupungit featureihin
+    catalog = PostcodeCatalog.from_export(data['data'])
+    for feature in geojson_data['features']:
+        postcode = feature['properties']['postinumer']
+        if postcode in catalog:
+            name, city = catalog.lookup(postcode)
+            feature['properties'].setdefault('name', name)
+            feature['properties'].setdefault('city', city)
+
+    cube = PriceCube.from_export(data['data'], available_years)
+    rows = np.array([cube.postcode_index.get(f['properties']['postinumer'], -1)
+                     for f in geojson_data['features']], dtype=np.int64)
+    found = rows >= 0
+
+    # Väriluokkien rajat jokaiselle valinnalle ja vuosiparille kartan alueista
+    print(f"Lasketaan luokkarajat ({CLASS_METHOD})...")
+    class_breaks = luokittelu.class_table(cube, rows[found], CLASS_METHOD)
+    class_breaks_text = json.dumps(class_breaks, separators=(',', ':'))
+
+    # Hintadata vuosittain sarakkeina featurejen järjestyksessä:
+    # year_data[vuosi] = {'values': {talotyyppi: {mittari: [arvo per feature]}},
+    #                     'classes': {talotyyppi: {mittari: 'luokka per feature'}},
+    #                     'summary': {'price': [...], 'transactions': [...]}}
+    print("Muodostetaan vuosittaiset sarakkeet...")
+    summary_years = geojson_data.get('summary', {}).get('years', [])
+    summaries = [f['properties'].get('summary') for f in geojson_data['features']]
+    year_data = {}
+    for year in available_years:
+        y = cube.year_index[year]
+        cells = np.where(found[:, None, None], cube.values[rows, y], np.nan)
+        types = [building_type for building_type in building_types if building_type in cube.type_index]
+        entry = {
+            'values': {building_type: {metric: column(cells[:, cube.type_index[building_type], m])
+                                       for m, metric in enumerate(cube.metrics)}
+                       for building_type in types},
+            'classes': {building_type: {metric: class_codes(cells[:, cube.type_index[building_type], m],
+                                                            class_breaks['levels'][y][cube.type_index[building_type]][m])
+                                        for m, metric in enumerate(cube.metrics)}
+                        for building_type in types},
+        }
+        if year in summary_years:
+            s = summary_years.index(year)
+            entry['summary'] = {field: [summary[field][s] if summary else None for summary in summaries]
+                                for field in ('price', 'transactions')}
+        year_data[year] = entry
+
+    # Tarkkuustasot erillisiin tiedostoihin (yksinkertaistus.py), jos featuret ovat samassa järjestyksessä
+    levels = []
+    if asset_dir and os.path.exists(LOD_MANIFEST_FILE):
+        with open(LOD_MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            lod_manifest = json.load(f)
+        postcodes = [f['properties']['postinumer'] for f in geojson_data['features']]
+        for item in lod_manifest['levels']:
+            with open(item['file'], 'r', encoding='utf-8') as f:
+                level_features = json.load(f)['features']
+            if [f['properties'].get('postinumer') for f in level_features] != postcodes:
+                print(f"⚠ {item['file']} ei vastaa aineistoa (aja yksinkertaistus.py), tasoja ei käytetä")
+                levels = []
+                break
+            for feature, base in zip(level_features, geojson_data['features']):
+                feature['properties'] = base['properties']
+            levels.append((item['min_zoom'], item.get('resolution_m', 0), level_features))
+
+    # Kvantisoi koordinaatit (yhteiset rajat pysyvät naapureille samoina); tasot on kvantisoitu jo
+    grid_step = None
+    if COORDINATE_RESOLUTION_M > 0 and not levels:
+        geojson_data['features'], report = kvantisointi.quantize(geojson_data['features'], COORDINATE_RESOLUTION_M)
+        kvantisointi.print_report(report)
+        grid_step = 10.0 ** -report['decimals']
+    if not levels:
+        levels = [(0, COORDINATE_RESOLUTION_M, geojson_data['features'])]
+
+    # Tilastopaneelin luvut jokaiselle valinnalle ja vuosiparille kartan alueista
+    print("Lasketaan tilastotaulukko...")
+    stats = tilastot.stats_table(cube, rows[found])
+    stats_text = json.dumps(stats, separators=(',', ':'))
+
+    # Luo JavaScript-muuttujat
+    years_json = json.dumps(available_years)
+    building_types_json = json.dumps(building_types)
+    object_name_json = json.dumps(topojson_muunnin.OBJECT_NAME)
+    geometry_script = ''
+    if asset_dir:
+        os.makedirs(os.path.join(asset_dir, ASSET_SUBDIR), exist_ok=True)
+        # Tasojen taulukot haetaan heti; vuosiparien muutostaulukot (suurin osa
+        # taulukoista) lähtövuosittain vasta muutostilassa
+        assets = {'levels': [], 'years': {}, 'changes': {},
+                  'stats': write_asset(asset_dir, 'tilastot.json', json.dumps(
+                      dict(stats, changes=None), separators=(',', ':'))),
+                  'classes': write_asset(asset_dir, 'luokat.json', json.dumps(
+                      dict(class_breaks, changes=None), separators=(',', ':')))}
+        for y, year in enumerate(stats['years']):
+            assets['changes'][year] = write_asset(asset_dir, f"muutokset_{year}.json", json.dumps(
+                {'stats': stats['changes'][y], 'classes': class_breaks['changes'][y]}, separators=(',', ':')))
+        for level, (min_zoom, resolution, features) in enumerate(levels):
+            step = 10.0 ** -grid_decimals(resolution) if resolution > 0 else None
+            topology = topojson_muunnin.encode(slim_features(features), step=step)
+            assets['levels'].append({'min_zoom': min_zoom, 'file': write_asset(asset_dir, 
+                f"alueet_lod{level}.topojson", json.dumps(topology, separators=(',', ':')))})
+        for year, entry in year_data.items():
+            assets['years'][year] = write_asset(asset_dir, f"vuosi_{year}.json", json.dumps(entry, separators=(',', ':')))
+    
+        # Poista edellisten ajojen vanhentuneet tiedostot
+        written_assets = {os.path.basename(path) for path in
+                          [assets['stats'], assets['classes']] + [level['file'] for level in assets['levels']]
+                          + list(assets['years'].values()) + list(assets['changes'].values())}
+        for filename in os.listdir(os.path.join(asset_dir, ASSET_SUBDIR)):
+            if filename not in written_assets:
+                os.remove(os.path.join(asset_dir, ASSET_SUBDIR, filename))
+    
+        geometry_script = '<script src="https://unpkg.com/topojson-client@3"></script>'
+        geojson_json = 'null'
+        year_data_json = '{}'
+        stats_json = 'null'
+        class_breaks_json = 'null'
+        assets_json = json.dumps(assets)
+    else:
+        features = slim_features(geojson_data['features'])
+        if GEOMETRY_FORMAT == 'topojson':
+            topology = topojson_muunnin.encode(features, step=grid_step)
+            geometry_script = '<script src="https://unpkg.com/topojson-client@3"></script>'
+            geojson_json = f"topojson.feature({json.dumps(topology, separators=(',', ':'))}, {object_name_json})"
+        else:
+            geojson_json = json.dumps({'type': 'FeatureCollection', 'features': features})
+        year_data_json = json.dumps(year_data, separators=(',', ':'))
+        stats_json = stats_text
+        class_breaks_json = class_breaks_text
+        assets_json = 'null'
+
+    # Oletustilastot (viimeisin vuosi, kerrostalo yksiöt, hinnat) tilastotaulukosta
+    default_stats = dict(zip(stats['fields'], stats['levels'][cube.year_index[latest_year]]
+                             [cube.type_index['1']][cube.metric_index['keskihinta_aritm_nw']]))
+    avg_price = int(default_stats['mean'] or 0)
+    max_price = int(default_stats['max'] or 0)
+    min_price = int(default_stats['min'] or 0)
+
+    html = render_html(latest_year, available_years, forecast_years, len(geojson_data['features']),
+                       avg_price, max_price, min_price, geometry_script, geojson_json,
+                       year_data_json, stats_json, class_breaks_json, assets_json,
+                       years_json, building_types_json, object_name_json)
+
+    # Tallenna HTML
+    html_file = os.path.join(asset_dir, 'index.html') if asset_dir else 'kartta.html'
+    with open(html_file, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+    print(f"\n✅ Kartta luotu: {html_file}")
+    if asset_dir:
+        print(f"   Erilliset tiedostot: {len(written_assets)} ({len(levels)} tarkkuustasoa, "
+              f"{len(year_data)} vuotta) hakemistossa {os.path.join(asset_dir, ASSET_SUBDIR)}")
+    print(f"   Postinumeroalueita: {len(geojson_data['features'])}")
+    print(f"   Saatavilla vuodet: {', '.join(available_years)}")
+    print(f"   Ominaisuudet:")
+    print(f"   - Polygon-pohjaiset alueet")
+    print(f"   - Talotyypit: {', '.join(building_types.values())}")
+    print(f"   - Mittarit: Neliöhinnat ja kauppojen lukumäärät")
+    print(f"   - Absoluuttiset arvot ja vuosimuutokset")
+    return html_file
+
+
+def main(argv=None):
+    """Pääohjelma"""
+    parser = argparse.ArgumentParser(description="Luo asuntojen hintakartta")
+    parser.add_argument('--erilliset', metavar='HAKEMISTO',
+                        help="Kirjoita sivu (index.html) sekä geometria ja vuosien data erillisinä "
+                             "tiedostoina hakemistoon; sivu hakee ne tarvittaessa. "
+                             "Ilman tätä kaikki upotetaan tiedostoon kartta.html.")
+    args = parser.parse_args(argv)
+    build_map(args.erilliset)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
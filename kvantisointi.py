@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Koordinaattien kvantisointi
+===========================
+WFS palauttaa koordinaatit 8 desimaalilla (millimetrin tarkkuus), mikä on
+moninkertaisesti enemmän kuin koropleettikartta millään zoomaustasolla
+tarvitsee. Jokainen ylimääräinen numero toistuu satojen tuhansien
+pisteiden verran GeoJSONissa ja kartan HTML:ssä.
+
+Kvantisointi:
+- Pyöristää koordinaatit maastoresoluutiota vastaavaan desimaaliruudukkoon
+  (esim. 1 m -> 5 desimaalia, 10 m -> 4 desimaalia)
+- Poistaa peräkkäiset samat pisteet ja surkastuneet renkaat
+- Pyöristää yhteiset kaaret (ks. topologia.py), joten naapurialueiden
+  yhteinen raja on pyöristyksen jälkeenkin täsmälleen sama molemmille
+
+Kartta (kartta_polygon.py) ja tarkkuustasot (yksinkertaistus.py) käyttävät
+kvantisointia automaattisesti; lähteen tarkka geometria säilyy ennallaan.
+
+Käyttö:
+    python kvantisointi.py                      # raportti oletusresoluutiolla
+    python kvantisointi.py --resoluutio 10 --kohde alueet_10m.geojson
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+from geometria import METERS_PER_DEGREE
+from geometriavarasto import read_geojson
+from json_kirjoitin import write_json
+from topologia import Topology
+from yksinkertaistus import Simplifier, grid_decimals
+
+# Oletusresoluutio metreinä
+RESOLUTION_M = 1.0
+
+SOURCE_FILE = 'postinumerot_hinnat.geojson'
+
+
+def _geometry_stats(features: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+    """Pisteet, renkaat ja geometrian koko tiiviinä JSONina"""
+    vertices = rings = size = 0
+    for feature in features:
+        geometry = feature.get('geometry')
+        if not geometry:
+            continue
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        for polygon in polygons:
+            rings += len(polygon)
+            vertices += sum(len(ring) for ring in polygon)
+        size += len(json.dumps(geometry['coordinates'], separators=(',', ':')))
+    return vertices, rings, size
+
+
+def quantize(features: List[Dict[str, Any]], resolution_m: float = RESOLUTION_M,
+             topology: Optional[Topology] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Kvantisoi featurejen koordinaatit.
+
+    Args:
+        features: GeoJSON-featuret
+        resolution_m: Maastoresoluutio metreinä
+        topology: Valmiiksi muodostettu topologia (muuten muodostetaan featureista)
+
+    Returns:
+        (kvantisoidut featuret, raportti: resoluutio, desimaalit, pisteet,
+         renkaat ja geometrian tavut ennen ja jälkeen)
+    """
+    if topology is None:
+        topology = Topology.from_features(features)
+    decimals = grid_decimals(resolution_m)
+    quantized, _ = Simplifier(topology).level(0.0, decimals)
+
+    before = _geometry_stats(topology.features)
+    after = _geometry_stats(quantized)
+    report = {
+        'resolution_m': resolution_m,
+        'decimals': decimals,
+        'grid_m': METERS_PER_DEGREE * 10.0 ** -decimals,
+        'vertices': (before[0], after[0]),
+        'rings': (before[1], after[1]),
+        'bytes': (before[2], after[2]),
+    }
+    return quantized, report
+
+
+def print_report(report: Dict[str, Any]):
+    """Tulosta kvantisoinnin säästöt"""
+    vertices, rings, size = report['vertices'], report['rings'], report['bytes']
+    print(f"✓ Koordinaatit kvantisoitu: resoluutio {report['resolution_m']:g} m -> "
+          f"{report['decimals']} desimaalia (ruudukko ≈ {report['grid_m']:.2g} m)")
+    print(f"  Pisteet: {vertices[0]} -> {vertices[1]} "
+          f"(-{vertices[0] - vertices[1]}), renkaat: {rings[0]} -> {rings[1]} (-{rings[0] - rings[1]})")
+    if size[0]:
+        print(f"  Geometria: {size[0] / (1024 * 1024):.2f} MB -> {size[1] / (1024 * 1024):.2f} MB "
+              f"({1 - size[1] / size[0]:.1%} pienempi)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kvantisoi postinumeroalueiden koordinaatit")
+    parser.add_argument('--lahde', default=SOURCE_FILE, help="GeoJSON-lähdetiedosto")
+    parser.add_argument('--resoluutio', type=float, default=RESOLUTION_M, help="Maastoresoluutio metreinä")
+    parser.add_argument('--kohde', help="Kvantisoitu GeoJSON (ilman tätä vain raportti)")
+    args = parser.parse_args()
+
+    print(f"Luetaan {args.lahde}...")
+    geojson = read_geojson(args.lahde)
+    features, report = quantize(geojson['features'], args.resoluutio)
+    print_report(report)
+
+    if args.kohde:
+        written = write_json(args.kohde, dict(geojson, features=features), 'features', compact=True)
+        print(f"✓ Tallennettu {args.kohde} ({written / (1024 * 1024):.2f} MB)")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
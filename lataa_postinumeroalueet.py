@@ -5,10 +5,25 @@ Lataa postinumeroalueet Tilastokeskuksen WFS-rajapinnasta ja yhdistää asuntohi
 Lähde: Tilastokeskus geo.stat.fi - postialue:pno_tilasto
 """
 
+import os
+import re
 import sys
 import json
+import shutil
+import hashlib
 import requests
-from typing import Dict, Any
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+from aluehaku import PostcodeIndex, index_file
+from hintakuutio import PriceCube
+from http_asiakas import HttpClient, IncompleteBatchError
+from geometria import FlatPolygons, centroids, label_points
+from geometriavarasto import STORE_DIR, GeometryStore
+from json_kirjoitin import write_json
+from postinumerot import PostcodeCatalog
 
 # Aseta UTF-8 enkoodaus tulostuksille
 if sys.platform == 'win32':
@@ -17,70 +32,380 @@ if sys.platform == 'win32':
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
 # Tilastokeskuksen WFS-rajapinnan osoite (tarkemmat postinumeroalueet)
-WFS_URL = "https://geo.stat.fi/geoserver/postialue/wfs"
+# Osoitteen voi korvata esim. paikallisella testipalvelimella (toistopalvelin.py)
+WFS_URL = os.environ.get("WFS_URL", "https://geo.stat.fi/geoserver/postialue/wfs")
+
+# Tiivis GeoJSON-tuotos ilman välilyöntejä
+COMPACT_OUTPUT = False
+
+# Virtaavan latauksen välitiedosto ja palakoko
+WFS_CACHE_DIR = os.path.join('.cache', 'wfs')
+STITCHED_FILE = os.path.join(WFS_CACHE_DIR, 'pno_tilasto.geojson')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Sivutettu lataus (WFS 2.0 startIndex/count): sivun koko ja rinnakkaiset pyynnöt
+PAGE_SIZE = 250
+MAX_WORKERS = 4
+
+# Sivutus vaatii pysyvän järjestyksen, muuten sivut voivat mennä päällekkäin
+SORT_BY = 'postinumeroalue'
+
+# Alku "features": [ (sallii välilyönnit)
+FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+
+# Lähteen tunnisteen kentät: kevyt kysely ilman geometriaa kertoo, onko
+# aineisto (alueet, tilastovuosi ja pinta-alat) muuttunut edellisestä
+# latauksesta. Pinta-ala muuttuu, kun rajoja korjataan saman vuoden sisällä.
+PROBE_PROPERTIES = 'postinumeroalue,vuosi,pinta_ala'
+
+# Geometria ladataan ja verrataan varastoon vähintään näin usein, vaikka
+# lähteen tunniste ei muuttuisi (tunniste ei havaitse kaikkia rajamuutoksia)
+MAX_STORE_AGE = timedelta(days=30)
+
+# resultType=hits -vastauksen osumamäärä (XML-attribuutti tai JSON-kenttä)
+NUMBER_MATCHED = re.compile(r'numberMatched\s*=\s*"(\d+)"|"numberMatched"\s*:\s*(\d+)')
 
-def lataa_postinumeroalueet_paitulista() -> Dict[str, Any]:
+WFS_PARAMS = {
+    'service': 'WFS',
+    'version': '2.0.0',
+    'request': 'GetFeature',
+    'typeNames': 'postialue:pno_tilasto',  # Tarkat postinumeroalueet
+    'outputFormat': 'application/json',
+    'srsName': 'EPSG:4326',  # WGS84 koordinaatit (lat/lon)
+    # GeoServer format_options: estä geometrian yksinkertaistaminen
+    'format_options': 'coordinate_precision:8;decimation:NONE'
+}
+
+
+def normalisoi_postinumero(feature: Dict[str, Any]) -> str:
+    """
+    Normalisoi postinumerokentän nimi (eri WFS:t voivat käyttää eri nimiä).
+    Asettaa properties['postinumer'] ja palauttaa postinumeron ('' jos ei löydy).
     """
-    Lataa postinumeroalueet Tilastokeskuksen WFS-rajapinnasta.
+    props = feature['properties']
+    # Etsi postinumero eri mahdollisista kentistä
+    postcode = (props.get('postinumer') or       # Paavo (vanha)
+               props.get('postinumeroalue') or   # Tilastokeskus pno_tilasto (UUSI!)
+               props.get('posno') or             # Vaihtoehtoinen
+               props.get('posti_alue') or        # Toinen vaihtoehto
+               props.get('postcode') or          # Englanniksi
+               props.get('zipcode'))             # Vielä yksi
+    
+    if postcode:
+        props['postinumer'] = str(postcode)  # Varmista että on string
+        return props['postinumer']
+    return ''
+
+
+def laske_pisteet(geometry: Dict[str, Any]) -> int:
+    """Geometrian koordinaattipisteiden määrä"""
+    if geometry['type'] == 'Polygon':
+        return sum(len(ring) for ring in geometry['coordinates'])
+    elif geometry['type'] == 'MultiPolygon':
+        return sum(len(ring) for polygon in geometry['coordinates'] for ring in polygon)
+    return 0
+
+
+def hae_osumien_maara(client: HttpClient) -> int:
+    """Postinumeroalueiden kokonaismäärä (resultType=hits, numberMatched)"""
+    params = dict(WFS_PARAMS, resultType='hits')
+    response = client.get(WFS_URL, params=params, timeout=60)
+    response.raise_for_status()
+    match = NUMBER_MATCHED.search(response.text)
+    if not match:
+        raise ValueError("WFS-vastauksesta puuttuu numberMatched")
+    return int(match.group(1) or match.group(2))
+
+
+def sivuhakemisto(number_matched: int, page_size: int) -> str:
+    """
+    Sivuvälimuistin hakemisto. Avain riippuu kyselystä, osumamäärästä ja
+    sivun koosta, joten keskeytetty lataus jatkuu vain samalle datalle.
+    """
+    key = json.dumps([WFS_URL, WFS_PARAMS, SORT_BY, number_matched, page_size], sort_keys=True)
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(WFS_CACHE_DIR, 'sivut', digest)
+
+
+def hae_sivu(client: HttpClient, directory: str, index: int, page_size: int) -> int:
+    """
+    Lataa yksi sivu virtana tiedostoon. Valmis sivu nimetään lopulliseksi vasta
+    kokonaan kirjoitettuna, joten olemassa oleva sivutiedosto on aina ehjä.
     
     Returns:
-        GeoJSON FeatureCollection postinumeroalueista
+        Ladattujen tavujen määrä (0 jos sivu löytyi välimuistista)
     """
-    print("Haetaan postinumeroalueita Tilastokeskuksen rajapinnasta...")
+    path = os.path.join(directory, f"sivu_{index:05d}.geojson")
+    if os.path.exists(path):
+        return 0
+    
+    params = dict(WFS_PARAMS, sortBy=SORT_BY, startIndex=index * page_size, count=page_size)
+    response = client.get(WFS_URL, params=params, timeout=120, stream=True)
+    try:
+        response.raise_for_status()
+        size = 0
+        partial = path + '.osittainen'
+        with open(partial, 'wb') as f:
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+    finally:
+        response.close()
+    os.replace(partial, path)
+    return size
+
+
+def lataa_postinumeroalueet_sivuittain(client: Optional[HttpClient] = None,
+                                       postinumerot: Optional[Set[str]] = None,
+                                       page_size: int = PAGE_SIZE,
+                                       workers: int = MAX_WORKERS) -> Iterator[Dict[str, Any]]:
+    """
+    Lataa postinumeroalueet sivuittain rinnakkain (WFS 2.0 startIndex/count).
+    
+    Sivut tallennetaan välimuistiin, joten keskeytynyt lataus jatkuu
+    ajamalla uudelleen: jo ladattuja sivuja ei haeta uudestaan. Kun kaikki
+    sivut on ladattu, ne yhdistetään sivujärjestyksessä yhdeksi
+    FeatureCollectioniksi ja featuret jäsennetään siitä virtana.
+    
+    Args:
+        client: Jaettu HTTP-asiakas (oletuksena luodaan uusi)
+        postinumerot: Jos annettu, palautetaan vain näiden postinumeroiden alueet
+        page_size: Featureja per sivu
+        workers: Rinnakkaisten pyyntöjen määrä
+    
+    Returns:
+        Generaattori normalisoiduista (ja suodatetuista) featureista
+    
+    Raises:
+        IncompleteBatchError: Jos jonkin sivun lataus epäonnistui
+    """
+    print("Haetaan postinumeroalueita Tilastokeskuksen rajapinnasta (sivuittain)...")
     print("  Pyydetään tarkkoja geometrioita (ei yksinkertaistusta)...")
     
-    params = {
-        'service': 'WFS',
-        'version': '2.0.0',
-        'request': 'GetFeature',
-        'typeNames': 'postialue:pno_tilasto',  # Tarkat postinumeroalueet
-        'outputFormat': 'application/json',
-        'srsName': 'EPSG:4326',  # WGS84 koordinaatit (lat/lon)
-        # GeoServer format_options: estä geometrian yksinkertaistaminen
-        'format_options': 'coordinate_precision:8;decimation:NONE'
-    }
+    if client is None:
+        client = HttpClient()
+    
+    number_matched = hae_osumien_maara(client)
+    page_count = -(-number_matched // page_size)
+    directory = sivuhakemisto(number_matched, page_size)
+    os.makedirs(directory, exist_ok=True)
+    
+    # Poista vanhentuneet, eri datalle keskeytyneet lataukset
+    parent = os.path.dirname(directory)
+    for name in os.listdir(parent):
+        if os.path.join(parent, name) != directory:
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+    
+    print(f"  {number_matched} aluetta, {page_count} sivua à {page_size}")
+    
+    size = 0
+    cached = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(hae_sivu, client, directory, index, page_size): index
+                   for index in range(page_count)}
+        for future in as_completed(futures):
+            try:
+                written = future.result()
+            except (requests.exceptions.RequestException, OSError) as e:
+                print(f"✗ Sivun {futures[future]} lataus epäonnistui: {e}")
+                failed.append(futures[future])
+                continue
+            size += written
+            cached += written == 0
+    
+    if failed:
+        print(f"✗ {len(failed)}/{page_count} sivua epäonnistui, ladatut sivut säilytetään "
+              f"hakemistossa {directory}; aja uudelleen jatkaaksesi")
+        raise IncompleteBatchError(f"Sivut {sorted(failed)} epäonnistuivat")
+    
+    print(f"✓ Ladattiin {page_count - cached} sivua ({size / (1024 * 1024):.1f} MB), "
+          f"{cached} välimuistista")
     
+    # Yhdistä sivut sivujärjestyksessä yhdeksi FeatureCollectioniksi
+    path = STITCHED_FILE
+    pages = [os.path.join(directory, f"sivu_{index:05d}.geojson") for index in range(page_count)]
+    stitched = yhdista_sivut(pages, path, number_matched)
+    if stitched != number_matched:
+        print(f"⚠ Sivuilla {stitched} aluetta, odotettiin {number_matched} "
+              f"(data muuttui latauksen aikana?)")
+    shutil.rmtree(directory, ignore_errors=True)
+    
+    return lue_featuret(path, postinumerot)
+
+
+def hae_lahteen_tunniste(client: HttpClient) -> Optional[str]:
+    """
+    Lähteen tunniste ilman geometriaa (propertyName): tiiviste alueiden
+    postinumeroista, tilastovuodesta ja pinta-aloista. Aluerajat julkaistaan
+    tilastovuosittain, ja vuoden sisäiset korjaukset näkyvät pinta-aloissa.
+    Pinta-alaan vaikuttamattomat korjaukset havaitaan vasta täydessä
+    latauksessa (ks. MAX_STORE_AGE).
+    
+    Returns:
+        Tunniste tai None, jos kysely epäonnistui (geometria ladataan silloin aina)
+    """
+    params = dict(WFS_PARAMS, propertyName=PROBE_PROPERTIES, sortBy=SORT_BY)
     try:
-        response = requests.get(WFS_URL, params=params, timeout=120)  # Pidempi timeout tarkoille geometrioille
+        response = client.get(WFS_URL, params=params, timeout=120)
         response.raise_for_status()
+        properties = [feature.get('properties') for feature in response.json()['features']]
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+        print(f"⚠ Lähteen tunnisteen haku epäonnistui ({e}), geometria ladataan")
+        return None
+    key = json.dumps([WFS_URL, WFS_PARAMS['typeNames'], properties], sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _varaston_ika(store: GeometryStore) -> Optional[timedelta]:
+    """Aika varaston viimeisimmästä täydestä latauksesta (None, jos ei tiedossa)"""
+    try:
+        return datetime.now() - datetime.fromisoformat(store.loaded)
+    except ValueError:
+        return None
+
+
+def paivita_geometriavarasto(client: HttpClient, directory: str = STORE_DIR,
+                             force: bool = False) -> GeometryStore:
+    """
+    Päivitä geometriavarasto (ks. geometriavarasto.py).
+    
+    Jos lähteen tunniste on sama kuin varastossa ja edellisestä täydestä
+    latauksesta on alle MAX_STORE_AGE, geometriaa ei ladata lainkaan.
+    Muuten alueet ladataan sivuittain ja niiden geometrian tiivisteitä verrataan
+    varastoon: taulukot kirjoitetaan uudelleen vain, jos jokin geometria muuttui.
+    
+    Args:
+        client: HTTP-asiakas
+        directory: Varaston hakemisto
+        force: Lataa geometria aina tunnisteesta ja varaston iästä riippumatta
+    
+    Returns:
+        Ajantasainen varasto (kaikki lähteen alueet)
+    """
+    source = hae_lahteen_tunniste(client)
+    previous = GeometryStore.open(directory) if GeometryStore.exists(directory) else None
+    if not force and previous is not None and source is not None and previous.source == source:
+        age = _varaston_ika(previous)
+        if age is not None and age < MAX_STORE_AGE:
+            print(f"✓ Postinumeroalueet ennallaan, geometria luetaan varastosta {directory} "
+                  f"({len(previous)} aluetta, ladattu {age.days} pv sitten)")
+            return previous
+        reason = "latausaika ei tiedossa" if age is None else f"yli {MAX_STORE_AGE.days} pv vanha"
+        print(f"Geometriavarasto ({reason}) ladataan ja verrataan lähteeseen")
+    
+    loaded = datetime.now().isoformat(timespec='seconds')
+    store = GeometryStore.from_features(lataa_postinumeroalueet_sivuittain(client), source=source or '')
+    store.loaded = loaded
+    os.remove(STITCHED_FILE)
+    
+    if previous is None:
+        store.save(directory)
+        print(f"✓ Geometriavarasto luotu: {directory}")
+        return store
+    
+    added, changed, removed = store.diff(previous)
+    if added or changed or removed or store.flat.keys != previous.flat.keys:
+        store.save(directory)
+        print(f"✓ Geometria päivitetty: {len(added)} uutta, {len(changed)} muuttunutta, "
+              f"{len(removed)} poistunutta aluetta")
+    else:
+        store.save_metadata(directory)
+        print("✓ Geometria ennallaan, geometriataulukoihin ei kosketa")
+    return store
+
+
+def yhdista_sivut(pages: List[str], path: str, number_matched: int) -> int:
+    """Kirjoita sivujen featuret järjestyksessä yhteen tiedostoon, palauttaa featurejen määrän"""
+    count = 0
+    
+    def features():
+        nonlocal count
+        for page in pages:
+            for feature in _iter_features(page):
+                count += 1
+                yield feature
+    
+    write_json(path, {'type': 'FeatureCollection', 'numberMatched': number_matched,
+                      'features': features()}, 'features', compact=True)
+    return count
+
+
+def lue_featuret(path: str, postinumerot: Optional[Set[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Jäsennä GeoJSON-tiedoston featuret yksi kerrallaan.
+    Postinumero normalisoidaan ja suodatus tehdään jokaiselle featurelle heti.
+    """
+    feature_count = 0
+    kept_count = 0
+    total_coords = 0
+    
+    for feature in _iter_features(path):
+        feature_count += 1
+        total_coords += laske_pisteet(feature['geometry'])
+        postinumero = normalisoi_postinumero(feature)
+        if postinumerot is not None and postinumero not in postinumerot:
+            continue
+        kept_count += 1
+        yield feature
+    
+    avg_coords = total_coords / feature_count if feature_count > 0 else 0
+    print(f"✓ Jäsennettiin {feature_count} postinumeroaluetta, säilytettiin {kept_count}")
+    print(f"  Keskimäärin {avg_coords:.0f} koordinaattipistettä per alue")
+
+
+def _iter_features(path: str) -> Iterator[Dict[str, Any]]:
+    """Lue features-listan alkiot tiedostosta paloittain json.JSONDecoder.raw_decode:lla"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        # Etsi listan alku; puskurista säilytetään häntä palojen rajaa varten
+        buffer = ''
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError(f"{path}: features-listaa ei löytynyt")
+            buffer += chunk
+            match = FEATURES_START.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            buffer = buffer[-32:]
         
-        geojson_data = response.json()
-        
-        # Laske geometrien keskimääräinen pisteiden määrä
-        total_coords = 0
-        feature_count = len(geojson_data['features'])
-        
-        for feature in geojson_data['features']:
-            if feature['geometry']['type'] == 'Polygon':
-                total_coords += sum(len(ring) for ring in feature['geometry']['coordinates'])
-            elif feature['geometry']['type'] == 'MultiPolygon':
-                for polygon in feature['geometry']['coordinates']:
-                    total_coords += sum(len(ring) for ring in polygon)
-        
-        avg_coords = total_coords / feature_count if feature_count > 0 else 0
-        
-        print(f"✓ Haettiin {feature_count} postinumeroaluetta")
-        print(f"  Keskimäärin {avg_coords:.0f} koordinaattipistettä per alue")
-        
-        # Normalisoi postinumerokentän nimi (eri WFS:t voivat käyttää eri nimiä)
-        for feature in geojson_data['features']:
-            props = feature['properties']
-            # Etsi postinumero eri mahdollisista kentistä
-            postcode = (props.get('postinumer') or       # Paavo (vanha)
-                       props.get('postinumeroalue') or   # Tilastokeskus pno_tilasto (UUSI!)
-                       props.get('posno') or             # Vaihtoehtoinen
-                       props.get('posti_alue') or        # Toinen vaihtoehto
-                       props.get('postcode') or          # Englanniksi
-                       props.get('zipcode'))             # Vielä yksi
+        pos = 0
+        eof = False
+        while True:
+            # Ohita välilyönnit ja pilkut alkioiden välissä
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
             
-            if postcode:
-                props['postinumer'] = str(postcode)  # Varmista että on string
-        
-        return geojson_data
-        
-    except requests.exceptions.RequestException as e:
-        print(f"✗ Virhe ladattaessa dataa: {e}")
-        raise
+            if pos >= len(buffer):
+                raise ValueError(f"{path}: features-lista katkesi")
+            if buffer[pos] == ']':
+                return
+            
+            try:
+                feature, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Feature jatkuu seuraavassa palassa
+                if eof:
+                    raise
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield feature
+
+
+def lue_hintapostinumerot(asuntohinta_tiedosto: str = 'asuntohinnat.json') -> Set[str]:
+    """Postinumerot, joille on asuntohintadataa"""
+    with open(asuntohinta_tiedosto, 'r', encoding='utf-8') as f:
+        return set(json.load(f)['data'])
 
 
 def yhdista_asuntohintadata(geojson_data: Dict[str, Any], 
@@ -89,8 +414,14 @@ def yhdista_asuntohintadata(geojson_data: Dict[str, Any],
     Yhdistää asuntohintadatan GeoJSON-featureihin.
     Säilyttää vain ne postinumeroalueet, joilla on hintatietoa.
     
+    Jokaiselle alueelle lisätään kaikkien vuosien yhteenveto sarakkeina
+    (properties.summary: price, transactions, coverage), laskettuna kerralla
+    koko hintakuutiolle (PriceCube.summary). Sarakkeiden vuodet, niistä
+    ennustevuodet ja talotyyppien bittijärjestys ovat FeatureCollectionin
+    summary-kentässä.
+    
     Args:
-        geojson_data: GeoJSON FeatureCollection
+        geojson_data: GeoJSON FeatureCollection (features voi olla myös generaattori)
         asuntohinta_tiedosto: Polku asuntohinta JSON-tiedostoon
         
     Returns:
@@ -103,12 +434,19 @@ def yhdista_asuntohintadata(geojson_data: Dict[str, Any],
     
     # Uusi datarakenne: data[postcode][data][year][building_type][metric]
     available_postcodes = asuntohinta_data['data']
+    catalog = PostcodeCatalog.from_export(available_postcodes)
     available_years = sorted(asuntohinta_data['metadata']['years'])
-    latest_year = available_years[-1]
+    forecast_years = sorted(asuntohinta_data['metadata'].get('forecast_years', []))
+    latest_year = [year for year in available_years if year not in forecast_years][-1]
     
     print(f"✓ Käytetään vuoden {latest_year} asuntohintoja")
     print(f"  Hintatietoa {len(available_postcodes)} postinumeroalueelta")
     
+    # Vuosittaiset yhteenvedot kaikille postinumeroille yhdellä laskulla
+    cube = PriceCube.from_export(available_postcodes, available_years)
+    prices, transactions, coverage = cube.summary()
+    prices = np.round(prices, 1)
+    
     # Suodata ja rikasta featuret
     filtered_features = []
     matched_count = 0
@@ -117,30 +455,19 @@ def yhdista_asuntohintadata(geojson_data: Dict[str, Any],
         postinumero = feature['properties'].get('postinumer', '')
         
         # Tarkista onko tälle postinumerolle asuntohintadataa
-        if postinumero in available_postcodes:
-            postcode_data = available_postcodes[postinumero]
-            
+        if postinumero in catalog:
             # Lisää nimi ja kaupunki
-            feature['properties']['name'] = postcode_data.get('name', postinumero)
-            feature['properties']['city'] = postcode_data.get('city', '')
+            name, city = catalog.lookup(postinumero)
+            feature['properties']['name'] = name
+            feature['properties']['city'] = city
             
-            # Laske keskihinta kaikista talotyyppien hinnoista viimeisimmälle vuodelle
-            # (voidaan käyttää myös kartalla, vaikka kartta itse lataa kaikki vuodet)
-            if latest_year in postcode_data.get('data', {}):
-                year_data = postcode_data['data'][latest_year]
-                prices = []
-                for building_type in ['1', '2', '3', '5']:  # Kaikki talotyypit
-                    if building_type in year_data:
-                        price = year_data[building_type].get('keskihinta_aritm_nw')
-                        if price is not None:
-                            prices.append(price)
-                
-                if prices:
-                    feature['properties']['avg_price'] = sum(prices) / len(prices)
-                else:
-                    feature['properties']['avg_price'] = None
-            else:
-                feature['properties']['avg_price'] = None
+            # Vuosittaiset yhteenvedot sarakkeina (vuodet FeatureCollectionin summary-kentässä)
+            row = cube.postcode_index[postinumero]
+            feature['properties']['summary'] = {
+                'price': [None if np.isnan(v) else v for v in prices[row].tolist()],
+                'transactions': transactions[row].astype(int).tolist(),
+                'coverage': coverage[row].tolist(),
+            }
             
             filtered_features.append(feature)
             matched_count += 1
@@ -150,129 +477,108 @@ def yhdista_asuntohintadata(geojson_data: Dict[str, Any],
     # Luo uusi FeatureCollection
     result = {
         'type': 'FeatureCollection',
-        'features': filtered_features
-    }
-    
-    return result
-    
-    print(f"✓ Yhdistettiin {matched_count} aluetta asuntohintadataan")
-    
-    # Luo uusi FeatureCollection
-    result = {
-        'type': 'FeatureCollection',
+        'summary': {
+            'years': cube.years,
+            'forecast_years': forecast_years,
+            'building_types': cube.building_types,
+            'fields': {
+                'price': 'Kauppamäärillä painotettu keskihinta talotyyppien yli (€/m²)',
+                'transactions': 'Kauppojen määrä yhteensä',
+                'coverage': 'Bittimaski talotyypeistä, joilla on hinta (bitti i = building_types[i])',
+            },
+        },
         'features': filtered_features
     }
     
     return result
 
 
-def laske_keskipisteet(geojson_data: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+def laske_keskipisteet(flat: FlatPolygons) -> Dict[str, Dict[str, float]]:
     """
-    Laskee karkeasti keskipisteet postinumeroalueille bbox:n perusteella.
+    Laskee postinumeroalueiden keskipisteet geometriasta yhdellä läpikäynnillä.
+    
+    - lat/lon: pinta-alalla painotettu keskipiste (kaikki osapolygonit, reiät vähennetty)
+    - label_lat/label_lon: nimiöpiste, joka on aina alueen sisällä
+      (suurimman osapolygonin pole of inaccessibility; saaristossa ei osu mereen)
     
     Args:
-        geojson_data: GeoJSON FeatureCollection
+        flat: Alueiden geometria (avaimena postinumero)
         
     Returns:
-        Dictionary: {postinumero: {lat: x, lon: y}}
+        Dictionary: {postinumero: {lat, lon, label_lat, label_lon}}
     """
     print("\nLasketaan keskipisteitä postinumeroalueille...")
     
-    koordinaatit = {}
+    centers = centroids(flat)
+    labels = label_points(flat, centers=centers)
     
-    for feature in geojson_data['features']:
-        postinumero = feature['properties'].get('postinumer', '')
-        
-        if not postinumero:
-            continue
-            
-        # Hae Paavo-datan EUREF-FIN koordinaatit (jos saatavilla)
-        if 'euref_x' in feature['properties'] and 'euref_y' in feature['properties']:
-            # Nämä ovat ETRS-TM35FIN (EPSG:3067) koordinaatteja
-            # Käytetään suoraan, koska kartta käyttää samaa projektioita
-            # HUOM: Leaflet tarvitsee WGS84, mutta koska käytämme geometrioita, 
-            # nämä keskipisteet ovat vain viitteellisiä
-            koordinaatit[postinumero] = {
-                'x': feature['properties']['euref_x'],
-                'y': feature['properties']['euref_y']
-            }
-        else:
-            # Vaihtoehtoinen tapa: laske geometrian keskipiste
-            # (yksinkertainen bbox-keskipiste)
-            geom = feature.get('geometry')
-            if geom and geom['type'] in ['Polygon', 'MultiPolygon']:
-                # Tämä on yksinkertaistettu - oikeasti pitäisi laskea todellinen centroid
-                # Nyt käytetään vain ensimmäisen koordinaatin likimääräistä keskikohtaa
-                coords = geom['coordinates']
-                if geom['type'] == 'Polygon':
-                    all_coords = coords[0]
-                else:  # MultiPolygon
-                    all_coords = coords[0][0]
-                
-                # Laske bbox
-                lons = [c[0] for c in all_coords]
-                lats = [c[1] for c in all_coords]
-                
-                koordinaatit[postinumero] = {
-                    'lon': sum(lons) / len(lons),
-                    'lat': sum(lats) / len(lats)
-                }
+    koordinaatit = {}
+    for postinumero, (lon, lat), (label_lon, label_lat) in zip(flat.keys, centers.tolist(), labels.tolist()):
+        koordinaatit[postinumero] = {
+            'lat': lat,
+            'lon': lon,
+            'label_lat': label_lat,
+            'label_lon': label_lon,
+        }
     
     print(f"✓ Laskettiin keskipisteet {len(koordinaatit)} alueelle")
     return koordinaatit
 
 
-def main():
-    """Pääohjelma"""
+def paivita_geometria(force: bool = False) -> GeometryStore:
+    """
+    Putken geometriavaihe: päivitä geometriavarasto Tilastokeskuksen WFS:stä.
+    
+    Ei riipu hintadatasta, joten sen voi ajaa rinnakkain hintojen haun kanssa.
+    
+    Args:
+        force: Lataa geometria, vaikka lähteen tunniste olisi ennallaan
+    """
     print("=" * 60)
     print("Postinumeroalueiden lataus Tilastokeskuksesta")
     print("=" * 60)
     
-    # 1. Lataa postinumeroalueet Tilastokeskuksen WFS:stä
-    geojson_data = lataa_postinumeroalueet_paitulista()
+    # Alueet ladataan sivuittain rinnakkain vain, jos lähde on muuttunut edellisestä ajosta
+    with HttpClient() as client:
+        store = paivita_geometriavarasto(client, force=force)
+        client.print_metrics()
+    return store
+
+
+def muodosta_aineisto(store: Optional[GeometryStore] = None):
+    """
+    Putken yhdistämisvaihe: yhdistä varaston geometria ja asuntohinnat.json,
+    ja kirjoita GeoJSON, keskipisteet ja aluehakuindeksi.
+    
+    Args:
+        store: Geometriavarasto (oletus: luetaan levyltä, ks. paivita_geometria)
+    """
+    if store is None:
+        store = GeometryStore.open(STORE_DIR)
+    
+    # 1. Alueet, joilla ei ole hintatietoa, suodatetaan pois varastosta luettaessa
+    hintapostinumerot = lue_hintapostinumerot('asuntohinnat.json')
+    features = store.features(hintapostinumerot)
     
     # 2. Yhdistä asuntohintadata
-    enriched_geojson = yhdista_asuntohintadata(geojson_data)
+    enriched_geojson = yhdista_asuntohintadata({'type': 'FeatureCollection', 'features': features})
     
     # 3. Tallenna GeoJSON
     output_file = 'postinumerot_hinnat.geojson'
     print(f"\nTallennetaan tiedostoon {output_file}...")
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(enriched_geojson, f, ensure_ascii=False)
-    
-    file_size_mb = len(json.dumps(enriched_geojson)) / (1024 * 1024)
+    # Featuret kirjoitetaan yksi kerrallaan, koko saadaan kirjoitetuista tavuista
+    written = write_json(output_file, enriched_geojson, 'features', compact=COMPACT_OUTPUT)
+    file_size_mb = written / (1024 * 1024)
     print(f"✓ GeoJSON tallennettu ({file_size_mb:.1f} MB)")
     
-    # 4. Laske ja tallenna keskipisteet
-    koordinaatit = laske_keskipisteet(enriched_geojson)
-    
-    # Muunna EUREF-FIN koordinaatit WGS84:ksi keskipisteille
-    # (Yksinkertaistettu - oikeasti tarvittaisiin projektion muunnos)
-    wgs84_coords = {}
-    for pnro, coords in koordinaatit.items():
-        if 'x' in coords and 'y' in coords:
-            # Karkea muunnos ETRS-TM35FIN -> WGS84
-            # Oikea muunnos vaatisi pyproj-kirjaston
-            # Nyt käytetään suoraan geometrian koordinaatteja
-            for feature in enriched_geojson['features']:
-                if feature['properties']['postinumer'] == pnro:
-                    geom = feature['geometry']
-                    if geom['type'] == 'Polygon':
-                        coords_list = geom['coordinates'][0]
-                    else:  # MultiPolygon
-                        coords_list = geom['coordinates'][0][0]
-                    
-                    lons = [c[0] for c in coords_list]
-                    lats = [c[1] for c in coords_list]
-                    
-                    wgs84_coords[pnro] = {
-                        'lat': sum(lats) / len(lats),
-                        'lon': sum(lons) / len(lons)
-                    }
-                    break
-        else:
-            wgs84_coords[pnro] = coords
+    # Jatkovaiheet lukevat tämän GeoJSONin geometrian varastosta
+    geojson_hash = store.record_export(output_file, enriched_geojson)
+    flat = store.select([f['properties']['postinumer'] for f in enriched_geojson['features']
+                         if f['geometry'] and f['geometry']['type'] in ('Polygon', 'MultiPolygon')])
+    
+    # 4. Laske ja tallenna keskipisteet (WGS84, suoraan geometriasta)
+    wgs84_coords = laske_keskipisteet(flat)
     
     coord_file = 'postinumerokoordinaatit.json'
     print(f"Tallennetaan koordinaatit tiedostoon {coord_file}...")
@@ -282,11 +588,31 @@ def main():
     
     print(f"✓ Koordinaatit tallennettu")
     
+    # 5. Spatiaalinen indeksi koordinaattihakuja varten (ks. aluehaku.py)
+    index = PostcodeIndex.build(flat, source_hash=geojson_hash)
+    index.save(index_file(output_file))
+    print(f"✓ Aluehakuindeksi tallennettu: {index_file(output_file)}")
+    
     # Yhteenveto
     print("\n" + "=" * 60)
     print("VALMIS!")
     print("=" * 60)
     print(f"Postinumeroalueita yhteensä: {len(enriched_geojson['features'])}")
+    
+    # Koko maan luvut viimeisimmältä toteutuneelta vuodelta (ei ennusteelta)
+    # alueiden valmiista yhteenvedoista
+    summaries = [f['properties']['summary'] for f in enriched_geojson['features']]
+    summary_years = enriched_geojson['summary']['years']
+    observed = [i for i, year in enumerate(summary_years)
+                if year not in enriched_geojson['summary']['forecast_years']]
+    if summaries and observed:
+        latest = observed[-1]
+        prices = np.array([s['price'][latest] for s in summaries], dtype=float)
+        counts = np.array([s['transactions'][latest] for s in summaries], dtype=float)
+        weighted = ~np.isnan(prices) & (counts > 0)
+        if weighted.any():
+            print(f"Kaupat {summary_years[latest]}: {int(counts.sum())} kpl, "
+                  f"painotettu keskihinta {np.average(prices[weighted], weights=counts[weighted]):.0f} €/m²")
     print(f"GeoJSON-tiedosto: {output_file}")
     print(f"Koordinaattitiedosto: {coord_file}")
     print("\nDatalähteet:")
@@ -295,5 +621,10 @@ def main():
     print("=" * 60)
 
 
+def main():
+    """Pääohjelma"""
+    muodosta_aineisto(paivita_geometria())
+
+
 if __name__ == '__main__':
     main()
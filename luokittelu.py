@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Luokittelu
+==========
+Kartan väriluokkien rajat aineistosta kiinteiden kynnysten sijaan:
+
+- quantile: yhtä monta aluetta jokaisessa luokassa
+- equal_interval: yhtä leveät luokat minimistä maksimiin
+- jenks: luonnolliset rajat (Fisher-Jenks), jotka minimoivat luokkien
+  sisäisen neliösumman dynaamisella ohjelmoinnilla
+
+Rajat ovat luokkien ylärajoja (k + 1 arvoa: minimi, k - 1 sisärajaa,
+maksimi); arvo kuuluu ensimmäiseen luokkaan, jonka yläraja on vähintään
+arvo. Samat sisärajat yhdistetään, joten tasaisessa aineistossa luokkia
+voi olla vähemmän kuin pyydettiin.
+
+Jenks lasketaan painotetuista pisteistä: erilaiset arvot kertoimineen,
+tai kun niitä on yli MAX_POINTS, lajitellut arvot yhtä suurina
+peräkkäisinä ryhminä. DP on tällöin korkeintaan MAX_POINTS² -kokoinen
+taulukko-operaatio luokkaa kohden, joten satojen valintojen luokittelu
+vie sekunteja. Rajat osuvat aina todellisiin arvoihin.
+
+Käyttö:
+    python luokittelu.py                                 # menetelmien vertailu (GVF)
+    python luokittelu.py --talotyyppi 5 --mittari lkm_julk20 --luokkia 5
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from hintakuutio import PriceCube
+from tilastot import change_values, level_values
+
+METHODS = ('quantile', 'equal_interval', 'jenks')
+
+# Luokkien oletusmäärä (kartan väriasteikot ovat 7-portaisia)
+CLASS_COUNT = 7
+
+# Jenksin painotettujen pisteiden enimmäismäärä
+MAX_POINTS = 256
+
+# Luokkien enimmäismäärä: luokka koodataan yhdeksi merkiksi '0' + luokka
+# (ks. class_codes), ja merkit pysyvät välillä '0'..'z'
+MAX_CLASSES = 75
+
+
+def quantile_breaks(values: np.ndarray, k: int) -> np.ndarray:
+    """Kvantiilirajat (lajitellut arvot ilman NaN:eja)"""
+    return np.quantile(values, np.linspace(0, 1, k + 1))
+
+
+def equal_interval_breaks(values: np.ndarray, k: int) -> np.ndarray:
+    """Tasavälit minimistä maksimiin"""
+    return np.linspace(values[0], values[-1], k + 1)
+
+
+def _weighted_points(values: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Lajitellut arvot painotetuiksi pisteiksi.
+
+    Returns:
+        (pisteet, painot, ryhmien maksimit)
+    """
+    unique, counts = np.unique(values, return_counts=True)
+    if len(unique) <= max_points:
+        return unique, counts.astype(float), unique
+    bounds = np.linspace(0, len(values), max_points + 1).round().astype(np.int64)
+    starts, stops = bounds[:-1], bounds[1:]
+    sums = np.add.reduceat(values, starts)
+    weights = (stops - starts).astype(float)
+    return sums / weights, weights, values[stops - 1]
+
+
+def jenks_breaks(values: np.ndarray, k: int, max_points: int = MAX_POINTS) -> np.ndarray:
+    """
+    Fisher-Jenks-luonnolliset rajat.
+
+    DP: cost[c][i] = pienin neliösumma, kun i ensimmäistä pistettä jaetaan
+    c luokkaan; cost[c][i] = min_j cost[c-1][j] + SSD(j..i). SSD lasketaan
+    painojen, summien ja neliösummien kumulatiivisista summista, ja koko
+    j × i -taulukko käsitellään kerralla.
+    """
+    points, weights, maxima = _weighted_points(values, max_points)
+    n = len(points)
+    k = min(k, n)
+
+    w = np.concatenate([[0.0], np.cumsum(weights)])
+    s = np.concatenate([[0.0], np.cumsum(weights * points)])
+    q = np.concatenate([[0.0], np.cumsum(weights * points * points)])
+    j, i = np.arange(n + 1)[:, None], np.arange(n + 1)[None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ssd = (q[i] - q[j]) - (s[i] - s[j]) ** 2 / (w[i] - w[j])
+    ssd[j >= i] = np.inf
+
+    cost = ssd[0]
+    choices = []
+    for _ in range(1, k):
+        total = cost[:, None] + ssd
+        choice = np.argmin(total, axis=0)
+        cost = total[choice, np.arange(n + 1)]
+        choices.append(choice)
+
+    # Luokkien alkukohdat lopusta alkuun
+    boundaries = []
+    end = n
+    for choice in reversed(choices):
+        end = choice[end]
+        boundaries.append(end)
+    uppers = [maxima[b - 1] for b in reversed(boundaries)]
+    return np.array([values[0]] + uppers + [values[-1]])
+
+
+BREAKS = {
+    'quantile': quantile_breaks,
+    'equal_interval': equal_interval_breaks,
+    'jenks': jenks_breaks,
+}
+
+
+def breaks(values: np.ndarray, method: str = 'jenks', k: int = CLASS_COUNT) -> Optional[np.ndarray]:
+    """
+    Luokkarajat arvoille (NaN:t ohitetaan).
+
+    Returns:
+        Nousevat rajat (minimi, sisärajat, maksimi) tai None, jos arvoja ei ole
+    """
+    values = np.sort(values[~np.isnan(values)])
+    if len(values) == 0:
+        return None
+    result = BREAKS[method](values, k)
+    inner = np.unique(result[1:-1])
+    inner = inner[(inner > values[0]) & (inner < values[-1])]
+    return np.concatenate([[values[0]], inner, [values[-1]]])
+
+
+def classify(values: np.ndarray, class_breaks: np.ndarray) -> np.ndarray:
+    """Luokkaindeksit (0..k-1); NaN -> -1"""
+    classes = np.searchsorted(class_breaks[1:-1], values, side='left')
+    return np.where(np.isnan(values), -1, classes)
+
+
+def gvf(values: np.ndarray, class_breaks: np.ndarray) -> float:
+    """Goodness of variance fit: 1 - luokkien sisäinen neliösumma / kokonaisneliösumma"""
+    values = values[~np.isnan(values)]
+    total = ((values - values.mean()) ** 2).sum()
+    if total == 0:
+        return 1.0
+    classes = classify(values, class_breaks)
+    sums = np.bincount(classes, weights=values)
+    counts = np.bincount(classes)
+    means = sums[classes] / counts[classes]
+    return 1.0 - ((values - means) ** 2).sum() / total
+
+
+def _rounded(class_breaks: Optional[np.ndarray], decimals: int) -> Optional[list]:
+    if class_breaks is None:
+        return None
+    return [int(v) if v == round(v) else v for v in np.round(class_breaks, decimals).tolist()]
+
+
+def class_table(cube: PriceCube, rows: Optional[Sequence[int]] = None,
+                method: str = 'jenks', k: int = CLASS_COUNT) -> Dict[str, Any]:
+    """
+    Luokkarajat jokaiselle valinnalle JSON-muodossa.
+
+    Returns:
+        {'method', 'count', 'years', 'building_types', 'metrics',
+         'levels': [vuosi][talotyyppi][mittari] -> rajat tai null,
+         'changes': [lähtövuosi][tavoitevuosi][talotyyppi][mittari] -> rajat tai null}
+    """
+    if not 1 <= k <= MAX_CLASSES:
+        raise ValueError(f"Luokkia voi olla 1-{MAX_CLASSES}, ei {k}")
+    levels = level_values(cube, rows)
+    changes = change_values(cube, rows)
+    n_years, n_types, n_metrics = levels.shape[1:]
+    return {
+        'method': method,
+        'count': k,
+        'years': list(cube.years),
+        'building_types': list(cube.building_types),
+        'metrics': list(cube.metrics),
+        'levels': [[[_rounded(breaks(levels[:, y, t, m], method, k), 0)
+                     for m in range(n_metrics)] for t in range(n_types)] for y in range(n_years)],
+        'changes': [[[[_rounded(breaks(changes[:, a, b, t, m], method, k), 1)
+                       for m in range(n_metrics)] for t in range(n_types)]
+                     for b in range(n_years)] for a in range(n_years)],
+    }
+
+
+def class_codes(classes: np.ndarray) -> str:
+    """
+    Luokkaindeksit merkkijonoksi, yksi merkki aluetta kohden: luokka c on
+    merkki chr(48 + c) ('0'-'9', sitten ':', ';' jne.) ja '-' = ei arvoa.
+    Sivu purkaa luokan merkin koodista (charCodeAt(i) - 48), joten jokainen
+    alue on aina yhden merkin levyinen luokkamäärästä riippumatta.
+    """
+    return ''.join('-' if c < 0 else chr(48 + c) for c in classes.tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hintakartan luokkarajat")
+    parser.add_argument('--hinnat', default='asuntohinnat.json')
+    parser.add_argument('--talotyyppi', default='1')
+    parser.add_argument('--mittari', default='keskihinta_aritm_nw')
+    parser.add_argument('--luokkia', type=int, default=CLASS_COUNT)
+    args = parser.parse_args()
+
+    with open(args.hinnat, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    cube = PriceCube.from_export(data['data'], sorted(data['metadata']['years']))
+    t, m = cube.type_index[args.talotyyppi], cube.metric_index[args.mittari]
+    levels = level_values(cube)
+
+    print(f"{'Vuosi':>6}  " + '  '.join(f"{method + ' GVF':>18}" for method in METHODS))
+    for y, year in enumerate(cube.years):
+        values = levels[:, y, t, m]
+        fits = [breaks(values, method, args.luokkia) for method in METHODS]
+        print(f"{year:>6}  " + '  '.join(f"{gvf(values, b):>18.3f}" if b is not None else f"{'-':>18}"
+                                         for b in fits))
+    values = levels[:, -1, t, m]
+    for method in METHODS:
+        print(f"{method}: {_rounded(breaks(values, method, args.luokkia), 0)}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Postinumeroluettelo
+===================
+Postinumeroiden nimet ja kaupungit indeksoituna kertaalleen:
+- postinumero -> (nimi, kaupunki) vakioajassa
+- kaupunki -> postinumerot
+- haku postinumeron alkuosalla
+
+Luettelo muodostetaan PxWeb-metatiedoista tai valmiista asuntohinnat.json-datasta.
+"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+# PxWeb-taulukon koko maan summarivi
+TOTAL_CODE = 'SSS'
+
+
+def parse_city(text: str) -> str:
+    """Poimi kaupunki nimen lopun suluista: '00100 Helsinki keskusta (Helsinki)' -> 'Helsinki'"""
+    if '(' in text:
+        return text.split('(')[-1].replace(')', '').strip()
+    return ''
+
+
+class PostcodeCatalog:
+    """Postinumeroiden nimi- ja kaupunkihakemisto"""
+
+    def __init__(self, entries: Iterable[Tuple[str, str, str]]):
+        """
+        Args:
+            entries: (postinumero, nimi, kaupunki) -kolmikot
+        """
+        self._entries: Dict[str, Tuple[str, str]] = {}
+        self._by_city: Dict[str, List[str]] = {}
+        for code, name, city in entries:
+            self._entries[code] = (name, city)
+            self._by_city.setdefault(city.lower(), []).append(code)
+        self._codes = sorted(self._entries)
+
+    @classmethod
+    def from_metadata(cls, meta: Dict, variable: str = 'Postinumero') -> 'PostcodeCatalog':
+        """Muodosta luettelo PxWeb-taulukon metatiedoista"""
+        for v in meta['variables']:
+            if v['code'] == variable:
+                texts = v.get('valueTexts', v['values'])
+                return cls((code, text, parse_city(text))
+                           for code, text in zip(v['values'], texts) if code != TOTAL_CODE)
+        return cls([])
+
+    @classmethod
+    def from_export(cls, data: Dict) -> 'PostcodeCatalog':
+        """Muodosta luettelo asuntohinnat.json-tiedoston data-osasta"""
+        return cls((code, info.get('name', code), info.get('city', ''))
+                   for code, info in data.items())
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._codes)
+
+    def lookup(self, code: str) -> Tuple[str, str]:
+        """Palauta (nimi, kaupunki); tuntemattomalle postinumerolle (postinumero, '')"""
+        return self._entries.get(code, (code, ''))
+
+    def name(self, code: str) -> str:
+        return self.lookup(code)[0]
+
+    def city(self, code: str) -> str:
+        return self.lookup(code)[1]
+
+    def cities(self) -> List[str]:
+        """Kaikki kaupungit aakkosjärjestyksessä"""
+        return sorted({city for _, city in self._entries.values() if city})
+
+    def postcodes_in_city(self, city: str) -> List[str]:
+        """Kaupungin postinumerot (kirjainkoolla ei väliä)"""
+        return list(self._by_city.get(city.lower(), []))
+
+    def search_prefix(self, prefix: str) -> List[str]:
+        """Postinumerot, jotka alkavat annetulla merkkijonolla"""
+        start = bisect_left(self._codes, prefix)
+        end = bisect_left(self._codes, prefix + '\uffff')
+        return self._codes[start:end]
+
+    def filter(self, codes: Iterable[str]) -> List[str]:
+        """Säilytä vain luettelossa olevat postinumerot (järjestys säilyy)"""
+        return [code for code in codes if code in self._entries]
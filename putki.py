@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Putki
+=====
+Ajaa kartan rakennusvaiheet riippuvuusverkkona (DAG):
+
+    hinnat ─────┐
+                ├─> aineisto ─> tasot ─> kartta
+    geometria ──┘
+
+(kartta lukee lisäksi hinnat ja aineiston suoraan)
+
+- Vaiheet määritellään syötteineen ja tuotoksineen; riippuvuudet
+  päätellään siitä, mikä vaihe tuottaa toisen syötteen
+- Toisistaan riippumattomat vaiheet (hintojen ja geometrian haku) ajetaan
+  rinnakkain
+- Vaihe ohitetaan, jos sen syötteiden ja koodin sisällön tiivisteet ovat
+  samat kuin edellisellä ajolla ja tuotokset ovat ennallaan. Verkosta
+  hakevat vaiheet ajetaan aina, mutta ne tarkistavat itse kevyellä
+  kyselyllä, onko lähde muuttunut, eivätkä kirjoita tuotoksiaan
+  uudelleen turhaan
+- Tila (tiivisteet) tallennetaan tiedostoon .cache/putki.json; tiedostojen
+  tiivisteet lasketaan uudelleen vain, jos koko tai muokkausaika muuttui
+
+Jokainen vaihe on tavallinen funktio (asuntohinnat.update_prices,
+lataa_postinumeroalueet.paivita_geometria / muodosta_aineisto,
+yksinkertaistus.main, kartta_polygon.build_map), joten ne voi ajaa myös
+erikseen.
+
+Käyttö:
+    python putki.py                          # kartta.html
+    python putki.py --erilliset public       # julkaisumuoto (ks. kartta_polygon.py)
+    python putki.py --pakota                 # aja kaikki vaiheet, myös hinnat ja geometria
+                                             # ladataan lähteen tunnisteesta riippumatta
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+STATE_FILE = os.path.join('.cache', 'putki.json')
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Rinnakkain ajettavien vaiheiden enimmäismäärä
+MAX_WORKERS = 2
+
+
+class Stage:
+    """
+    Putken vaihe.
+
+    Attributes:
+        name: Vaiheen nimi
+        run: Vaiheen funktio (ei argumentteja)
+        inputs: Luettavat tiedostot
+        outputs: Kirjoitettavat tiedostot tai hakemistot (hakemiston tiiviste
+            lasketaan sen kaikista tiedostoista)
+        code: Moduulit, joiden koodin muutos ajaa vaiheen uudelleen
+        remote: Hakee verkosta; ajetaan aina (vaihe tarkistaa lähteen itse)
+    """
+
+    def __init__(self, name: str, run: Callable[[], object], inputs: Sequence[str] = (),
+                 outputs: Sequence[str] = (), code: Sequence[str] = (), remote: bool = False):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = [os.path.join(REPO_DIR, f"{module}.py") for module in code]
+        self.remote = remote
+
+
+class Pipeline:
+    """Vaiheiden riippuvuusverkko ja sen ajo"""
+
+    def __init__(self, stages: Sequence[Stage], state_file: str = STATE_FILE):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = state_file
+        producers = {path: stage.name for stage in stages for path in stage.outputs}
+        self.dependencies = {stage.name: sorted({producers[path] for path in stage.inputs
+                                                 if path in producers and producers[path] != stage.name})
+                             for stage in stages}
+        self.order = self._topological_order()
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+
+    def _topological_order(self) -> List[str]:
+        order, done, visiting = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Putkessa on silmukka vaiheessa {name}")
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    # ------------------------------------------------------------------
+    # Tila ja tiivisteet
+    # ------------------------------------------------------------------
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault('stages', {})
+        state.setdefault('files', {})
+        return state
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.state_file)
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """Tiedoston sha256 (None, jos puuttuu); tallennettu tiiviste käytetään, jos koko ja aika täsmäävät"""
+        if os.path.isdir(path):
+            return self.directory_hash(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = os.path.abspath(path)
+        with self._lock:
+            cached = self.state['files'].get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        with self._lock:
+            self.state['files'][key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def directory_hash(self, path: str) -> str:
+        """Hakemiston tiedostojen nimien ja sisältöjen yhteinen tiiviste"""
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                relative = os.path.relpath(file_path, path)
+                digest.update(f"\0{relative}\0{self.file_hash(file_path)}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def input_digest(self, stage: Stage) -> str:
+        """Vaiheen syötteiden ja koodin yhteinen tiiviste"""
+        digest = hashlib.sha256(stage.name.encode('utf-8'))
+        for path in stage.inputs + stage.code:
+            digest.update(f"\0{path}\0{self.file_hash(path)}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def output_hashes(self, stage: Stage) -> Dict[str, Optional[str]]:
+        return {path: self.file_hash(path) for path in stage.outputs}
+
+    def is_current(self, stage: Stage, digest: str) -> bool:
+        """Syötteet ennallaan ja tuotokset olemassa ja koskemattomia"""
+        with self._lock:
+            previous = self.state['stages'].get(stage.name)
+        if stage.remote or previous is None or previous['inputs'] != digest:
+            return False
+        outputs = self.output_hashes(stage)
+        return None not in outputs.values() and outputs == previous['outputs']
+
+    # ------------------------------------------------------------------
+    # Ajo
+    # ------------------------------------------------------------------
+
+    def _execute(self, name: str, force: bool) -> str:
+        stage = self.stages[name]
+        digest = self.input_digest(stage)
+        if not force and self.is_current(stage, digest):
+            return 'ohitettu'
+
+        print(f"\n▶ {name}", flush=True)
+        stage.run()
+        record = {'inputs': digest, 'outputs': self.output_hashes(stage)}
+        with self._lock:
+            self.state['stages'][name] = record
+            self._save_state()
+        return 'ajettu'
+
+    def run(self, force: bool = False, workers: int = MAX_WORKERS) -> Dict[str, Dict]:
+        """
+        Aja putki: vaihe käynnistyy, kun sen riippuvuudet ovat valmiit.
+
+        Args:
+            force: Aja myös vaiheet, joiden syötteet eivät muuttuneet
+
+        Returns:
+            {vaihe: {'status': 'ajettu' | 'ohitettu' | 'virhe' | 'peruttu', 'seconds'}}
+        """
+        results = {}
+        remaining = list(self.order)
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while remaining or running:
+                for name in list(remaining):
+                    dependencies = self.dependencies[name]
+                    if any(results.get(d, {}).get('status') in ('virhe', 'peruttu') for d in dependencies):
+                        results[name] = {'status': 'peruttu', 'seconds': 0.0}
+                        remaining.remove(name)
+                    elif all(d in results for d in dependencies):
+                        running[executor.submit(self._timed, name, force)] = name
+                        remaining.remove(name)
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)] = future.result()
+        return results
+
+    def _timed(self, name: str, force: bool) -> Dict:
+        start = time.perf_counter()
+        try:
+            status = self._execute(name, force)
+        except Exception:
+            traceback.print_exc()
+            status = 'virhe'
+        return {'status': status, 'seconds': time.perf_counter() - start}
+
+
+def stages(asset_dir: Optional[str] = None, force: bool = False) -> List[Stage]:
+    """Kartan rakennusvaiheet"""
+    import asuntohinnat
+    import kartta_polygon
+    import lataa_postinumeroalueet
+    import yksinkertaistus
+    from aluehaku import index_file
+    from geometriavarasto import METADATA_FILE, STORE_DIR
+
+    store_files = [os.path.join(STORE_DIR, METADATA_FILE), os.path.join(STORE_DIR, 'hashes.npy')]
+    geojson = 'postinumerot_hinnat.geojson'
+    levels = [yksinkertaistus.MANIFEST_FILE] + [yksinkertaistus.level_file(level)
+                                                for level in range(len(yksinkertaistus.LEVELS))]
+    # Erillisten tiedostojen nimissä on sisällön tiiviste, joten tuotoksena on koko hakemisto
+    map_outputs = [os.path.join(asset_dir, 'index.html'), os.path.join(asset_dir, kartta_polygon.ASSET_SUBDIR)] \
+        if asset_dir else ['kartta.html']
+    return [
+        Stage('hinnat', lambda: asuntohinnat.update_prices(force=force),
+              outputs=['asuntohinnat.json'], remote=True),
+        Stage('geometria', lambda: lataa_postinumeroalueet.paivita_geometria(force=force),
+              outputs=store_files, remote=True),
+        Stage('aineisto', lataa_postinumeroalueet.muodosta_aineisto,
+              inputs=['asuntohinnat.json'] + store_files,
+              outputs=[geojson, 'postinumerokoordinaatit.json', index_file(geojson)],
+              code=['lataa_postinumeroalueet', 'geometriavarasto', 'geometria', 'hintakuutio',
+                    'aluehaku', 'json_kirjoitin']),
+        Stage('tasot', yksinkertaistus.main,
+              inputs=[geojson], outputs=levels,
+              code=['yksinkertaistus', 'topologia', 'geometriavarasto', 'json_kirjoitin']),
+        Stage('kartta', lambda: kartta_polygon.build_map(asset_dir),
+              inputs=['asuntohinnat.json', geojson] + (levels if asset_dir else []),
+              outputs=map_outputs,
+              code=['kartta_polygon', 'tilastot', 'luokittelu', 'topojson_muunnin', 'kvantisointi',
+                    'yksinkertaistus', 'topologia', 'hintakuutio', 'postinumerot', 'geometriavarasto']),
+    ]
+
+
+def main(argv=None):
+    """Pääohjelma"""
+    parser = argparse.ArgumentParser(description="Aja hintakartan rakennusputki")
+    parser.add_argument('--erilliset', metavar='HAKEMISTO',
+                        help="Kartta erillisinä tiedostoina hakemistoon (ks. kartta_polygon.py)")
+    parser.add_argument('--pakota', action='store_true',
+                        help="Aja kaikki vaiheet; hinnat ja geometria ladataan lähteestä joka tapauksessa")
+    parser.add_argument('--rinnakkain', type=int, default=MAX_WORKERS, help="Rinnakkaisten vaiheiden määrä")
+    args = parser.parse_args(argv)
+
+    pipeline = Pipeline(stages(args.erilliset, args.pakota))
+    start = time.perf_counter()
+    results = pipeline.run(force=args.pakota, workers=args.rinnakkain)
+
+    print("\n" + "=" * 60)
+    print(f"{'Vaihe':<12} {'Tila':<10} {'Aika':>8}")
+    for name in pipeline.order:
+        result = results[name]
+        print(f"{name:<12} {result['status']:<10} {result['seconds']:>7.1f}s")
+    print(f"Yhteensä {time.perf_counter() - start:.1f} s")
+    print("=" * 60)
+    return 1 if any(r['status'] in ('virhe', 'peruttu') for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Suorituskykytesti
+=================
+Ajaa putken vaiheet (asuntohinnat.py, lataa_postinumeroalueet.py,
+yksinkertaistus.py, kartta_polygon.py) paikallista synteettistä dataa vastaan eri skaaloilla ja
+mittaa jokaisesta vaiheesta:
+- seinäkelloajan
+- prosessoriajan (käyttäjä + järjestelmä)
+- muistin huippukäytön (peak RSS)
+- tuotettujen tiedostojen koon
+
+Kokoa kasvatetaan kahdella erillisellä akselilla:
+- postinumeroiden määrä (--skaalat; alueita on 1,75 kertaa postinumeroita,
+  myös alueita ilman hintadataa), 240 pistettä per alue
+- pisteiden määrä alueen reunalla (--pisteskaalat) nykyisellä
+  postinumeromäärällä
+
+Molempien kertominen samalla skaalalla kasvattaisi geometrian neliöllisesti
+(100× olisi ~7,2 miljardia pistettä), joten akselit mitataan erikseen ja
+kumpikin enintään 10×:een. Oletusajot:
+
+    ajo    postinumeroita  alueita  pisteitä per alue  pisteitä yhteensä
+    1            1723       3015          240               ~0,72 M
+    3            5169       9045          240               ~2,2 M
+    10          17230      30152          240               ~7,2 M
+    1x3          1723       3015          720               ~2,2 M
+    1x10         1723       3015         2400               ~7,2 M
+
+Ajo 1 vastaa nykyistä kokoa. Perustason avaimet ovat muotoa vaihe@ajo.
+Tuloksia verrataan tallennettuun perustasoon, ja liian suuri heikkeneminen
+palauttaa virhekoodin.
+
+Käyttö:
+    python suorituskykytesti.py --tallenna-perustaso      # mittaa ja tallenna perustaso
+    python suorituskykytesti.py                           # mittaa ja vertaa perustasoon
+    python suorituskykytesti.py --skaalat 1 10 --pisteskaalat   # vain postinumeroakseli
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Nykyinen koko (skaala 1)
+BASE_POSTCODES = 1723
+BASE_VERTICES = 240
+YEARS = [str(y) for y in range(2005, 2026)]
+BUILDING_TYPES = ['0', '1', '2', '3', '5']
+METRICS = ['keskihinta_aritm_nw', 'lkm_julk20', 'keskihinta_median']
+
+DEFAULT_SCALES = [1, 3, 10]
+DEFAULT_VERTEX_SCALES = [3, 10]
+BASELINE_FILE = 'suorituskyky_perustaso.json'
+
+# Sallittu heikkeneminen perustasoon nähden (suhteellinen)
+TOLERANCES = {
+    'wall_s': 0.25,
+    'cpu_s': 0.25,
+    'peak_rss_mb': 0.15,
+    'output_bytes': 0.05,
+}
+
+# Vaiheet: (nimi, skripti)
+STAGES = [
+    ('hinnat', 'asuntohinnat.py'),
+    ('geometria', 'lataa_postinumeroalueet.py'),
+    ('tasot', 'yksinkertaistus.py'),
+    ('kartta', 'kartta_polygon.py'),
+]
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ----------------------------------------------------------------------
+# Synteettinen PxWeb- ja WFS-lähde
+# ----------------------------------------------------------------------
+
+class SyntheticData:
+    """Deterministinen synteettinen taulukko ja postinumeroalueet annetulla skaalalla"""
+
+    def __init__(self, scale, vertex_scale=1):
+        self.n_postcodes = BASE_POSTCODES * scale
+        self.vertices = BASE_VERTICES * vertex_scale
+        self.postcodes = [f"{i:05d}" for i in range(100, 100 + self.n_postcodes)]
+        cities = ['Helsinki', 'Espoo', 'Vantaa', 'Tampere', 'Turku', 'Oulu']
+        self.meta = {
+            'title': 'Synteettinen ashi_13mu',
+            'variables': [
+                {'code': 'Vuosi', 'text': 'Vuosi', 'values': YEARS, 'valueTexts': YEARS, 'time': True},
+                {'code': 'Postinumero', 'text': 'Postinumero',
+                 'values': ['SSS'] + self.postcodes,
+                 'valueTexts': ['KOKO MAA'] + [f"{p} Alue {p} ({cities[i % len(cities)]})"
+                                               for i, p in enumerate(self.postcodes)]},
+                {'code': 'Talotyyppi', 'text': 'Talotyyppi', 'values': BUILDING_TYPES,
+                 'valueTexts': BUILDING_TYPES},
+                {'code': 'Tiedot', 'text': 'Tiedot', 'values': METRICS, 'valueTexts': METRICS},
+            ]
+        }
+        # Ruudukko, jossa naapurialueilla on yhteiset reunat
+        self.grid_width = int(math.ceil(math.sqrt(self.n_postcodes * 1.75)))
+        self.n_features = int(self.n_postcodes * 1.75)  # myös alueita ilman hintadataa
+
+    @staticmethod
+    def value(year, postcode, building_type, metric):
+        digest = hashlib.md5(f"{year}{postcode}{building_type}{metric}".encode()).digest()
+        h = int.from_bytes(digest[:4], 'little')
+        if h % 5 == 0:
+            return None
+        if metric == 'lkm_julk20':
+            return float(h % 120)
+        return float(1000 + h % 7000)
+
+    def jsonstat(self, selections):
+        dims = [[v for v in var['values'] if v in selections[var['code']]]
+                for var in self.meta['variables']]
+        values = [self.value(y, p, t, m)
+                  for y in dims[0] for p in dims[1] for t in dims[2] for m in dims[3]]
+        return {
+            'version': '2.0', 'class': 'dataset',
+            'id': [v['code'] for v in self.meta['variables']],
+            'size': [len(d) for d in dims],
+            'dimension': {var['code']: {'category': {'index': {c: i for i, c in enumerate(d)}}}
+                          for var, d in zip(self.meta['variables'], dims)},
+            'value': values,
+        }
+
+    def json(self, selections):
+        dims = [[v for v in var['values'] if v in selections[var['code']]]
+                for var in self.meta['variables']]
+        rows = []
+        for y in dims[0]:
+            for p in dims[1]:
+                for t in dims[2]:
+                    values = [self.value(y, p, t, m) for m in dims[3]]
+                    rows.append({'key': [y, p, t],
+                                 'values': ['..' if v is None else f"{v:.0f}" for v in values]})
+        columns = [{'code': 'Vuosi'}, {'code': 'Postinumero'}, {'code': 'Talotyyppi'}] + \
+                  [{'code': m} for m in dims[3]]
+        return {'columns': columns, 'data': rows}
+
+    def _edge(self, i, j, horizontal):
+        """
+        Ruudukon reunan pisteet alusta loppuun (loppupiste mukana). Sama reuna
+        tuotetaan aina samoilla pisteillä, joten naapurialueiden rajat ovat yhteiset.
+        """
+        d = 0.05
+        x0, y0 = 20.0 + i * d, 60.0 + j * d
+        n = max(1, self.vertices // 4)
+        seed = (i * 7919 + j * 104729 + (0 if horizontal else 1)) % 1000
+        points = []
+        for k in range(n + 1):
+            f = k / n
+            wobble = 0.004 * math.sin(math.pi * f) * math.sin(seed + 9 * f)
+            if horizontal:
+                points.append([round(x0 + d * f, 8), round(y0 + wobble, 8)])
+            else:
+                points.append([round(x0 + wobble, 8), round(y0 + d * f, 8)])
+        return points
+
+    def feature(self, index):
+        code = self.postcodes[index] if index < self.n_postcodes else f"9{index:07d}"
+        i, j = index % self.grid_width, index // self.grid_width
+        bottom = self._edge(i, j, True)
+        right = self._edge(i + 1, j, False)
+        top = self._edge(i, j + 1, True)[::-1]
+        left = self._edge(i, j, False)[::-1]
+        ring = bottom[:-1] + right[:-1] + top[:-1] + left
+        return {
+            'type': 'Feature',
+            'id': f"pno_tilasto.{index}",
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': {'postinumeroalue': code, 'nimi': f"Alue {code}", 'vuosi': 2025},
+        }
+
+    def features(self, start=0, count=None):
+        end = self.n_features if count is None else min(self.n_features, start + count)
+        return [self.feature(i) for i in range(start, end)]
+
+
+class SyntheticHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, obj):
+        self._send(json.dumps(obj).encode('utf-8'), 'application/json')
+
+    def _send(self, payload, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        data = self.server.data
+        parts = urlsplit(self.path)
+        if parts.path.startswith('/wfs'):
+            params = {k.lower(): v[0] for k, v in parse_qs(parts.query).items()}
+            if params.get('resulttype') == 'hits':
+                body = (f'<wfs:FeatureCollection numberMatched="{data.n_features}" '
+                        f'numberReturned="0"/>').encode()
+                self._send(body, 'text/xml')
+                return
+            start = int(params.get('startindex', 0))
+            count = int(params['count']) if 'count' in params else None
+            self._send_json({'type': 'FeatureCollection',
+                             'numberMatched': data.n_features,
+                             'features': data.features(start, count)})
+        elif parts.path.endswith('.px'):
+            self._send_json(data.meta)
+        else:
+            self._send_json([{'id': 'statfin_ashi_pxt_13mu.px', 'type': 't',
+                              'text': 'ashi_13mu', 'updated': '2025-01-01T08:00:00Z'}])
+
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        selections = {q['code']: set(q['selection']['values']) for q in query['query']}
+        if query['response']['format'] == 'json-stat2':
+            self._send_json(self.server.data.jsonstat(selections))
+        else:
+            self._send_json(self.server.data.json(selections))
+
+
+def start_source(scale, vertex_scale=1):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SyntheticHandler)
+    server.daemon_threads = True
+    server.data = SyntheticData(scale, vertex_scale)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ----------------------------------------------------------------------
+# Mittaus
+# ----------------------------------------------------------------------
+
+def _snapshot(directory):
+    sizes = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d != '.cache']
+        for name in files:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            sizes[path] = (stat.st_size, stat.st_mtime_ns)
+    return sizes
+
+
+def run_stage(script, workdir, env):
+    """Aja vaihe aliprosessina ja palauta mittarit"""
+    before = _snapshot(workdir)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, script)], cwd=workdir,
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4 palauttaa juuri tämän lapsiprosessin resurssit
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    stderr = process.stderr.read().decode('utf-8', 'replace')
+    process.stderr.close()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{script} epäonnistui ({process.returncode}):\n{stderr[-2000:]}")
+
+    after = _snapshot(workdir)
+    output_bytes = sum(size for path, (size, mtime) in after.items() if before.get(path) != (size, mtime))
+    return {
+        'wall_s': round(wall, 3),
+        'cpu_s': round(usage.ru_utime + usage.ru_stime, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),  # Linux: kilotavuina
+        'output_bytes': output_bytes,
+    }
+
+
+def benchmark_runs(scales, vertex_scales):
+    """Ajot (postinumerokerroin, pistekerroin): postinumeroakseli ja pisteakseli nykyisellä koolla"""
+    runs = [(scale, 1) for scale in scales]
+    runs += [(1, vertex_scale) for vertex_scale in vertex_scales if (1, vertex_scale) not in runs]
+    return runs
+
+
+def run_benchmark(runs):
+    results = {}
+    for scale, vertex_scale in runs:
+        # Perustason avaimessa pistekerroin vain, jos se poikkeaa oletuksesta
+        suffix = '' if vertex_scale == 1 else f"x{vertex_scale}"
+        server = start_source(scale, vertex_scale)
+        host, port = server.server_address[:2]
+        env = dict(os.environ,
+                   STATFIN_BASE_URL=f"http://{host}:{port}/statfin",
+                   WFS_URL=f"http://{host}:{port}/wfs",
+                   STATFIN_RATE_LIMIT='0',
+                   PYTHONPATH=REPO_DIR)
+        print(f"\nAjo {scale}{suffix} ({server.data.n_postcodes} postinumeroa, "
+              f"{server.data.n_features} aluetta, {server.data.vertices} pistettä per alue)")
+        try:
+            with tempfile.TemporaryDirectory(prefix='suorituskyky_') as workdir:
+                for stage, script in STAGES:
+                    metrics = run_stage(script, workdir, env)
+                    results[f"{stage}@{scale}{suffix}"] = metrics
+                    print(f"  {stage:10s} {metrics['wall_s']:8.2f} s  cpu {metrics['cpu_s']:8.2f} s  "
+                          f"rss {metrics['peak_rss_mb']:8.1f} MB  "
+                          f"tuotos {metrics['output_bytes'] / (1024 * 1024):8.1f} MB")
+        finally:
+            server.shutdown()
+            server.server_close()
+    return results
+
+
+def compare(results, baseline):
+    """Vertaa perustasoon. Palauttaa listan heikentyneistä mittareista."""
+    regressions = []
+    print("\nVertailu perustasoon:")
+    for key, metrics in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"  {key}: ei perustasoa")
+            continue
+        for name, tolerance in TOLERANCES.items():
+            old, new = base.get(name), metrics.get(name)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ''
+            if change > tolerance:
+                flag = '  ✗ HEIKENTYNYT'
+                regressions.append((key, name, old, new))
+            print(f"  {key:16s} {name:13s} {old:>12} -> {new:>12} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Putken vaiheiden suorituskykytesti")
+    parser.add_argument('--skaalat', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help="Postinumeroiden määrän kertoimet 240 pisteellä per alue (1 = 1723 "
+                             "postinumeroa ja 3015 aluetta; oletus 1 3 10 eli enintään 17230 "
+                             "postinumeroa ja 30152 aluetta)")
+    parser.add_argument('--pisteskaalat', type=int, nargs='*', default=DEFAULT_VERTEX_SCALES,
+                        help="Pisteiden määrän kertoimet alueen reunalla 1723 postinumerolla "
+                             "(1 = 240 pistettä per alue; oletus 3 10 eli enintään 2400 pistettä "
+                             "per alue; tyhjä = ei pisteakselia)")
+    parser.add_argument('--perustaso', default=os.path.join(REPO_DIR, BASELINE_FILE),
+                        help="Perustasotiedosto")
+    parser.add_argument('--tallenna-perustaso', action='store_true',
+                        help="Tallenna tulokset uudeksi perustasoksi")
+    parser.add_argument('--tulokset', help="Tallenna tulokset JSON-tiedostoon")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Suorituskykytesti")
+    print("=" * 60)
+    results = run_benchmark(benchmark_runs(args.skaalat, args.pisteskaalat))
+
+    if args.tulokset:
+        with open(args.tulokset, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.tallenna_perustaso:
+        baseline = {}
+        if os.path.exists(args.perustaso):
+            with open(args.perustaso, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.perustaso, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\n✓ Perustaso tallennettu: {args.perustaso}")
+        return 0
+
+    if not os.path.exists(args.perustaso):
+        print(f"\nPerustasoa ei löydy ({args.perustaso}), vertailu ohitetaan")
+        return 0
+
+    with open(args.perustaso, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline)
+    if regressions:
+        print(f"\n✗ {len(regressions)} mittaria heikentyi yli sallitun rajan")
+        return 1
+    print("\n✓ Ei heikentymiä")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
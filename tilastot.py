@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Tilastotaulukko
+===============
+Kartan tilastopaneelin luvut valmiiksi laskettuina jokaiselle valinnalle:
+
+- Tasot: alueiden lukumäärä, keskiarvo, minimi, maksimi ja persentiilit
+  jokaiselle (vuosi, talotyyppi, mittari) -yhdistelmälle
+- Muutokset: prosenttimuutosten jakauma samoilla tunnusluvuilla jokaiselle
+  (lähtövuosi, tavoitevuosi, talotyyppi, mittari) -yhdistelmälle
+
+Kaikki lasketaan kerralla taulukko-operaatioilla: arvot lajitellaan
+alueakselin yli, jolloin minimi, maksimi ja persentiilit ovat suoria
+indeksointeja lajiteltuun taulukkoon. Sivu vain hakee luvut taulukosta,
+ja samaa taulukkoa voi käyttää raporteissa.
+
+Kuten kartalla, puuttuvat ja nollat arvot jätetään pois, ja muutos
+lasketaan vain alueille, joilla on arvo molempina vuosina.
+
+Käyttö:
+    python tilastot.py                                  # kerrostalo yksiöt, neliöhinnat
+    python tilastot.py --talotyyppi 5 --mittari lkm_julk20
+    python tilastot.py --muutos 2015 2025 --kohde tilastot.json
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from hintakuutio import PriceCube
+
+# Persentiilit tunnuslukuina (p50 = mediaani)
+PERCENTILES = (10, 25, 50, 75, 90)
+FIELDS = ('count', 'mean', 'min', 'max') + tuple(f'p{q}' for q in PERCENTILES)
+
+
+def describe(values: np.ndarray) -> np.ndarray:
+    """
+    Tunnusluvut ensimmäisen akselin yli, NaN-arvot ohittaen.
+
+    Args:
+        values: Taulukko muotoa (N, ...)
+
+    Returns:
+        Taulukko muotoa (..., len(FIELDS)); tyhjillä sarjoilla count = 0,
+        muut NaN
+    """
+    ordered = np.sort(values, axis=0)  # NaN:t loppuun
+    count = (~np.isnan(values)).sum(axis=0)
+    last = np.maximum(count - 1, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(values, axis=0) / count
+
+    def at(position: np.ndarray) -> np.ndarray:
+        return np.take_along_axis(ordered, position[None], axis=0)[0]
+
+    columns = [count.astype(float), mean, at(np.zeros_like(last)), at(last)]
+    for q in PERCENTILES:
+        # Lineaarinen interpolointi kuten np.percentile
+        position = last * (q / 100.0)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, last)
+        fraction = position - low
+        columns.append(at(low) * (1 - fraction) + at(high) * fraction)
+    result = np.stack(columns, axis=-1)
+    result[count == 0, 1:] = np.nan
+    return result
+
+
+def level_values(cube: PriceCube, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Kartalla näytettävät arvot: puuttuvat ja nollat NaN:ksi.
+
+    Args:
+        cube: Hintakuutio
+        rows: Mukaan otettavat postinumerorivit (esim. kartan featuret); oletus kaikki
+
+    Returns:
+        Taulukko muotoa (P, Y, T, M)
+    """
+    values = cube.values if rows is None else cube.values[np.asarray(rows, dtype=np.int64)]
+    return np.where(values > 0, values, np.nan)
+
+
+def change_values(cube: PriceCube, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Prosenttimuutokset kaikille vuosipareille; NaN, jos arvo puuttuu jommaltakummalta vuodelta.
+
+    Returns:
+        Taulukko muotoa (P, Y lähtövuosi, Y tavoitevuosi, T, M)
+    """
+    values = level_values(cube, rows)
+    start, end = values[:, :, None], values[:, None, :]
+    with np.errstate(invalid='ignore'):
+        return (end - start) / start * 100
+
+
+def level_stats(cube: PriceCube, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Tasojen tunnusluvut.
+
+    Returns:
+        Taulukko muotoa (Y, T, M, len(FIELDS))
+    """
+    return describe(level_values(cube, rows))
+
+
+def change_stats(cube: PriceCube, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Prosenttimuutosten tunnusluvut kaikille vuosipareille.
+
+    Returns:
+        Taulukko muotoa (Y lähtövuosi, Y tavoitevuosi, T, M, len(FIELDS))
+    """
+    return describe(change_values(cube, rows))
+
+
+def _rounded(table: np.ndarray, decimals: int) -> list:
+    """Taulukko sisäkkäisiksi listoiksi: NaN -> null, kokonaisluvut ilman desimaaleja"""
+    values = np.round(table, decimals)
+    rounded = values.astype(object)
+    rounded[np.isnan(table)] = None
+    whole = ~np.isnan(table) & (values == np.round(values))
+    rounded[whole] = [int(v) for v in values[whole]]
+    return rounded.tolist()
+
+
+def stats_table(cube: PriceCube, rows: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+    """
+    Tilastotaulukko JSON-muodossa.
+
+    Returns:
+        {'fields', 'years', 'building_types', 'metrics',
+         'levels': [vuosi][talotyyppi][mittari][tunnusluku],
+         'changes': [lähtövuosi][tavoitevuosi][talotyyppi][mittari][tunnusluku]}
+    """
+    return {
+        'fields': list(FIELDS),
+        'years': list(cube.years),
+        'building_types': list(cube.building_types),
+        'metrics': list(cube.metrics),
+        'levels': _rounded(level_stats(cube, rows), 1),
+        'changes': _rounded(change_stats(cube, rows), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hintakartan tilastotaulukko")
+    parser.add_argument('--hinnat', default='asuntohinnat.json')
+    parser.add_argument('--talotyyppi', default='1')
+    parser.add_argument('--mittari', default='keskihinta_aritm_nw')
+    parser.add_argument('--muutos', nargs=2, metavar=('VUOSI', 'VUOSI'),
+                        help="Tulosta muutosjakauma vuosiparille")
+    parser.add_argument('--kohde', help="Tallenna koko taulukko JSONina")
+    args = parser.parse_args()
+
+    with open(args.hinnat, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    cube = PriceCube.from_export(data['data'], sorted(data['metadata']['years']))
+    t, m = cube.type_index[args.talotyyppi], cube.metric_index[args.mittari]
+
+    print(f"{'':>11}" + ''.join(f"{field:>10}" for field in FIELDS))
+    if args.muutos:
+        start, end = (cube.year_index[year] for year in args.muutos)
+        rows = {f"{args.muutos[0]}-{args.muutos[1]}": change_stats(cube)[start, end, t, m]}
+    else:
+        levels = level_stats(cube)
+        rows = {year: levels[cube.year_index[year], t, m] for year in cube.years}
+    for label, stats in rows.items():
+        print(f"{label:>11}" + ''.join(f"{value:>10.1f}" for value in stats))
+
+    if args.kohde:
+        with open(args.kohde, 'w', encoding='utf-8') as f:
+            json.dump(stats_table(cube), f, separators=(',', ':'))
+        print(f"✓ Tallennettu {args.kohde}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Tallentava ja toistava testipalvelin
+====================================
+Paikallinen HTTP-palvelin, joka korvaa StatFin PxWeb- ja geo.stat.fi WFS
+-rajapinnat, jotta putken voi ajaa toistettavasti ilman verkkoyhteyttä.
+
+Polut:
+- /statfin/...  -> StatFin PxWeb (metatietojen GET ja taulukkokyselyn POST)
+- /wfs          -> WFS GetFeature
+
+Tallennustilassa pyynnöt välitetään oikeille rajapinnoille ja onnistuneet
+(2xx) vastaukset tallennetaan hakemistoon; virhevastaukset välitetään
+tallentamatta, ja jos rajapintaan ei saada yhteyttä, vastataan 502.
+Toistotilassa vastaukset luetaan hakemistosta. Viivettä ja virheitä voi
+lisätä testausta varten.
+
+Käyttö:
+    # 1. Tallenna vastaukset kerran
+    python toistopalvelin.py tallenna --hakemisto fixtures
+    STATFIN_BASE_URL=http://127.0.0.1:8780/statfin WFS_URL=http://127.0.0.1:8780/wfs \\
+        python asuntohinnat.py
+
+    # 2. Toista tallennetut vastaukset
+    python toistopalvelin.py toista --hakemisto fixtures --viive 0.2 --virhetaso 0.1
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+
+from http_asiakas import HttpClient
+
+DEFAULT_PORT = 8780
+
+# Oikeat rajapinnat, joihin tallennustilassa välitetään
+UPSTREAMS = {
+    '/statfin': "https://statfin.stat.fi/PxWeb/api/v1/fi/StatFin",
+    '/wfs': "https://geo.stat.fi/geoserver/postialue/wfs",
+}
+
+
+def request_key(method, path, query, body):
+    """
+    Pyynnön tunniste: metodi, polku, kyselyparametrit järjestettynä ja runko.
+    JSON-runko normalisoidaan, joten avainten järjestys ei vaikuta.
+    """
+    params = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True).encode('utf-8')
+        except ValueError:
+            pass
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), params.encode(), body or b''):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class FixtureStore:
+    """Tallennetut vastaukset hakemistossa: <avain>.json (tiedot) ja <avain>.body (runko)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, key):
+        try:
+            with open(os.path.join(self.directory, f"{key}.json"), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            with open(os.path.join(self.directory, f"{key}.body"), 'rb') as f:
+                return info, f.read()
+        except OSError:
+            return None
+
+    def save(self, key, info, body):
+        with open(os.path.join(self.directory, f"{key}.body"), 'wb') as f:
+            f.write(body)
+        with open(os.path.join(self.directory, f"{key}.json"), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Käsittelee GET- ja POST-pyynnöt tallennuksesta tai välittää ne eteenpäin"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        server = self.server
+        parts = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        if server.latency:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(server.error_status, b'{"error": "injected"}', 'application/json')
+            return
+
+        key = request_key(method, parts.path, parts.query, body)
+        cached = server.store.load(key)
+        if cached is None and server.record:
+            try:
+                cached = self._forward(method, parts, body)
+            except requests.RequestException as e:
+                message = f"Välitys epäonnistui: {method} {self.path}: {e}"
+                self._send(502, json.dumps({'error': message}).encode('utf-8'), 'application/json')
+                return
+            # Vain onnistuneet vastaukset tallennetaan; virheet välitetään sellaisenaan
+            if cached is not None and 200 <= cached[0]['status'] < 300:
+                server.store.save(key, *cached)
+        if cached is None:
+            message = f"Ei tallennettua vastausta: {method} {self.path}"
+            self._send(404, json.dumps({'error': message}).encode('utf-8'), 'application/json')
+            return
+
+        info, payload = cached
+        self._send(info['status'], payload, info.get('content_type', 'application/json'))
+
+    def _forward(self, method, parts, body):
+        """Välitä pyyntö oikealle rajapinnalle (tallennustila)"""
+        for prefix, upstream in self.server.upstreams.items():
+            if parts.path == prefix or parts.path.startswith(prefix + '/'):
+                url = upstream + parts.path[len(prefix):]
+                if parts.query:
+                    url += '?' + parts.query
+                headers = {'Content-Type': self.headers.get('Content-Type', 'application/json')}
+                response = self.server.client.request(method, url, data=body or None,
+                                                      headers=headers, timeout=180)
+                info = {
+                    'method': method,
+                    'path': parts.path,
+                    'query': parts.query,
+                    'status': response.status_code,
+                    'content_type': response.headers.get('Content-Type', 'application/json'),
+                }
+                return info, response.content
+        return None
+
+    def _send(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Args:
+        directory: Tallennettujen vastausten hakemisto
+        port: Portti (0 = vapaa portti)
+        record: Tallennustila (välitä puuttuvat pyynnöt oikeille rajapinnoille)
+        latency: Keskimääräinen lisäviive sekunteina
+        error_rate: Todennäköisyys, jolla pyyntöön vastataan virheellä
+        error_status: Virhevastauksen HTTP-koodi
+        upstreams: Polkuetuliite -> oikea osoite
+    """
+
+    daemon_threads = True
+
+    def __init__(self, directory, port=DEFAULT_PORT, host='127.0.0.1', record=False,
+                 latency=0.0, error_rate=0.0, error_status=503, upstreams=None, verbose=False):
+        super().__init__((host, port), ReplayHandler)
+        self.store = FixtureStore(directory)
+        self.record = record
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.upstreams = upstreams or UPSTREAMS
+        self.verbose = verbose
+        self.client = HttpClient() if record else None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self):
+        """Ympäristömuuttujat, joilla skriptit ohjataan tähän palvelimeen"""
+        return {
+            'STATFIN_BASE_URL': f"{self.url}/statfin",
+            'WFS_URL': f"{self.url}/wfs",
+        }
+
+    def start(self):
+        """Käynnistä palvelin taustasäikeessä"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StatFin- ja WFS-rajapintojen tallentava/toistava testipalvelin")
+    parser.add_argument('tila', choices=['tallenna', 'toista'],
+                        help="tallenna = välitä ja tallenna vastaukset, toista = palvele tallennuksista")
+    parser.add_argument('--hakemisto', default='fixtures', help="Tallennettujen vastausten hakemisto")
+    parser.add_argument('--portti', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--viive', type=float, default=0.0, help="Keskimääräinen lisäviive (s)")
+    parser.add_argument('--virhetaso', type=float, default=0.0, help="Virhevastausten osuus (0-1)")
+    parser.add_argument('--virhekoodi', type=int, default=503, help="Virhevastauksen HTTP-koodi")
+    parser.add_argument('--loki', action='store_true', help="Tulosta jokainen pyyntö")
+    args = parser.parse_args()
+
+    server = ReplayServer(args.hakemisto, args.portti, record=(args.tila == 'tallenna'),
+                          latency=args.viive, error_rate=args.virhetaso,
+                          error_status=args.virhekoodi, verbose=args.loki)
+    print(f"Palvelin käynnissä: {server.url} ({args.tila}, hakemisto {args.hakemisto})")
+    for name, value in server.environment().items():
+        print(f"  {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nPysäytetty")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+TopoJSON-muunnin
+================
+GeoJSON-featuret TopoJSON-muotoon ja takaisin.
+
+- Naapurialueiden yhteiset rajat tallennetaan kerran kaarina (ks. topologia.py)
+- Koordinaatit kvantisoidaan kokonaisluvuiksi ja delta-koodataan
+  (jokainen piste on erotus edellisestä), joten luvut ovat lyhyitä
+- Dekooderi palauttaa featuret GeoJSON-muotoon (esim. tarkistuksia varten);
+  selaimessa sama tehdään topojson-client-kirjastolla
+
+Käyttö:
+    python topojson_muunnin.py                 # postinumerot_hinnat.geojson -> .topojson
+    python topojson_muunnin.py --kvantisointi 100000
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from geometriavarasto import read_geojson
+from json_kirjoitin import write_json
+from topologia import Topology
+
+# Kvantisointiruudukon koko (pisteitä per akseli koko alueen yli). Suomen
+# laajuudella 1e6 vastaa noin metrin tarkkuutta. 0 = ei kvantisointia.
+QUANTIZATION = 1_000_000
+
+# Objektin nimi TopoJSON:ssa (topojson.feature(topology, OBJECT_NAME))
+OBJECT_NAME = 'postinumerot'
+
+SOURCE_FILE = 'postinumerot_hinnat.geojson'
+OUTPUT_FILE = 'postinumerot_hinnat.topojson'
+
+
+def _quantize_arc(arc: np.ndarray, translate: np.ndarray, scale: np.ndarray) -> List[List[int]]:
+    """Kvantisoi ja delta-koodaa kaari. Kvantisoinnissa yhteen osuvat peräkkäiset pisteet poistetaan."""
+    q = np.round((arc - translate) / scale).astype(np.int64)
+    if len(q) > 2:
+        keep = np.ones(len(q), dtype=bool)
+        keep[1:] = (q[1:] != q[:-1]).any(axis=1)
+        keep[-1] = True
+        q = q[keep]
+    delta = np.diff(q, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    return delta.tolist()
+
+
+def encode(features: Iterable[Dict[str, Any]], quantization: int = QUANTIZATION,
+           object_name: str = OBJECT_NAME, topology: Optional[Topology] = None,
+           step: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Muunna featuret TopoJSON-topologiaksi.
+
+    Args:
+        features: GeoJSON-featuret (Polygon tai MultiPolygon)
+        quantization: Kvantisointiruudukon koko, 0 = koordinaatit sellaisenaan
+        object_name: Featurekokoelman nimi topologian objects-osassa
+        topology: Valmiiksi muodostettu topologia (muuten muodostetaan featureista)
+        step: Ruudukon väli asteina quantizationin sijaan. Kun koordinaatit on jo
+              pyöristetty samaan ruudukkoon (kvantisointi.py), muunnos on häviötön.
+
+    Returns:
+        TopoJSON-sanakirja
+    """
+    if topology is None:
+        topology = Topology.from_features(features)
+
+    output = {'type': 'Topology'}
+    if topology.arcs:
+        points = np.concatenate(topology.arcs)
+        low, high = points.min(axis=0), points.max(axis=0)
+        output['bbox'] = [float(low[0]), float(low[1]), float(high[0]), float(high[1])]
+    if step and topology.arcs:
+        low = np.round(low / step) * step
+        scale = np.array([step, step])
+        output['transform'] = {'scale': scale.tolist(), 'translate': low.tolist()}
+        arcs = [_quantize_arc(arc, low, scale) for arc in topology.arcs]
+    elif quantization and topology.arcs:
+        scale = np.where(high > low, (high - low) / (quantization - 1), 1.0)
+        output['transform'] = {'scale': scale.tolist(), 'translate': low.tolist()}
+        arcs = [_quantize_arc(arc, low, scale) for arc in topology.arcs]
+    else:
+        arcs = [arc.tolist() for arc in topology.arcs]
+
+    geometries = []
+    for feature, parts in zip(topology.features, topology.parts):
+        if parts is None:
+            geometry = {'type': None}
+        else:
+            polygons = [[topology.rings[r] for r in part] for part in parts]
+            if feature['geometry']['type'] == 'Polygon' and len(polygons) == 1:
+                geometry = {'type': 'Polygon', 'arcs': polygons[0]}
+            else:
+                geometry = {'type': 'MultiPolygon', 'arcs': polygons}
+        if 'id' in feature:
+            geometry['id'] = feature['id']
+        geometry['properties'] = feature.get('properties') or {}
+        geometries.append(geometry)
+
+    output['objects'] = {object_name: {'type': 'GeometryCollection', 'geometries': geometries}}
+    output['arcs'] = arcs
+    return output
+
+
+def _decode_arcs(topojson: Dict[str, Any]) -> List[np.ndarray]:
+    """Kaaret koordinaatteina (delta-koodauksen ja kvantisoinnin purku)"""
+    transform = topojson.get('transform')
+    arcs = []
+    for arc in topojson['arcs']:
+        a = np.array(arc, dtype=float).reshape(-1, 2)
+        if transform:
+            a = np.cumsum(a, axis=0) * transform['scale'] + transform['translate']
+        arcs.append(a)
+    return arcs
+
+
+def decode(topojson: Dict[str, Any], object_name: str = OBJECT_NAME) -> List[Dict[str, Any]]:
+    """Muunna TopoJSON-objekti takaisin GeoJSON-featureiksi"""
+    arcs = _decode_arcs(topojson)
+
+    def ring(refs):
+        pieces = [Topology.arc(arcs, ref) if k == 0 else Topology.arc(arcs, ref)[1:]
+                  for k, ref in enumerate(refs)]
+        return np.concatenate(pieces).tolist()
+
+    features = []
+    for geometry in topojson['objects'][object_name]['geometries']:
+        feature = {'type': 'Feature'}
+        if 'id' in geometry:
+            feature['id'] = geometry['id']
+        if geometry['type'] == 'Polygon':
+            feature['geometry'] = {'type': 'Polygon',
+                                   'coordinates': [ring(r) for r in geometry['arcs']]}
+        elif geometry['type'] == 'MultiPolygon':
+            feature['geometry'] = {'type': 'MultiPolygon',
+                                   'coordinates': [[ring(r) for r in p] for p in geometry['arcs']]}
+        else:
+            feature['geometry'] = None
+        feature['properties'] = geometry.get('properties', {})
+        features.append(feature)
+    return features
+
+
+def geometry_bytes(topojson: Dict[str, Any]) -> int:
+    """TopoJSON:n geometrian koko tiiviinä JSON:na (kaaret ja kaariviittaukset, ei ominaisuuksia)"""
+    size = len(json.dumps(topojson['arcs'], separators=(',', ':')))
+    for obj in topojson['objects'].values():
+        for geometry in obj['geometries']:
+            size += len(json.dumps(geometry.get('arcs', []), separators=(',', ':')))
+    return size + len(json.dumps(topojson.get('transform'), separators=(',', ':')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Muunna postinumeroalueet TopoJSON-muotoon")
+    parser.add_argument('--lahde', default=SOURCE_FILE, help="GeoJSON-lähdetiedosto")
+    parser.add_argument('--kohde', default=OUTPUT_FILE, help="TopoJSON-tiedosto")
+    parser.add_argument('--kvantisointi', type=int, default=QUANTIZATION,
+                        help="Kvantisointiruudukon koko (0 = ei kvantisointia)")
+    args = parser.parse_args()
+
+    print(f"Luetaan {args.lahde}...")
+    features = read_geojson(args.lahde)['features']
+
+    topology = Topology.from_features(features)
+    topojson = encode(features, args.kvantisointi, topology=topology)
+    print(f"✓ {len(features)} aluetta, {len(topology.arcs)} kaarta "
+          f"({topology.shared_arc_count()} yhteisiä naapurin kanssa)")
+
+    written = write_json(args.kohde, topojson, 'arcs', compact=True)
+
+    # Geometrian koko ennen ja jälkeen, sekä suurin paluumuunnoksen virhe
+    geojson_size = sum(len(json.dumps(f['geometry'], separators=(',', ':'))) for f in features)
+    topojson_size = geometry_bytes(topojson)
+    error = 0.0
+    for original, decoded in zip(topology.arcs, _decode_arcs(topojson)):
+        if len(original) == len(decoded):
+            error = max(error, float(np.abs(original - decoded).max()))
+    print(f"  Geometria: GeoJSON {geojson_size / (1024 * 1024):.2f} MB -> "
+          f"TopoJSON {topojson_size / (1024 * 1024):.2f} MB ({topojson_size / geojson_size:.1%})")
+    print(f"  Suurin koordinaattivirhe: {error:.2e} astetta")
+    print(f"✓ Tallennettu {args.kohde} ({written / (1024 * 1024):.2f} MB)")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
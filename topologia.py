@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Topologia
+=========
+Postinumeroalueiden yhteiset rajat kaarina (arcs), kuten TopoJSON:ssa.
+
+Naapurialueiden rajat ovat lähteessä kahtena kopiona. Tässä jokainen rengas
+pilkotaan liitoskohdista (pisteet, joissa naapurit vaihtuvat) kaariksi, ja
+sama kaari tallennetaan vain kerran. Renkaat viittaavat kaariin indeksillä,
+käännetty kaari merkitään ~indeksi (= -indeksi - 1).
+
+Kun kaaria muokataan (yksinkertaistus, kvantisointi), jokainen yhteinen raja
+muuttuu molemmille naapureille täsmälleen samoin, joten rakoja tai
+päällekkäisyyksiä ei synny.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+def _polygons(geometry: Optional[Dict[str, Any]]) -> Optional[List]:
+    """Geometrian polygonit listana (Polygon -> [coordinates]), None muille tyypeille"""
+    if not geometry:
+        return None
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    return None
+
+
+class Topology:
+    """
+    Featurejen polygonit kaarina.
+
+    Attributes:
+        features: Alkuperäiset featuret (ominaisuudet ja muut kentät säilyvät)
+        arcs: Kaaret koordinaattitaulukkoina muotoa (n, 2)
+        rings: Jokaisen renkaan kaariviittaukset
+        parts: Featurekohtaiset polygonit renkaiden indekseinä
+               ([[ulkorengas, reikä, ...], ...]), None jos geometria ei ole polygoni
+    """
+
+    def __init__(self, features: Sequence[Dict[str, Any]], arcs: List[np.ndarray],
+                 rings: List[List[int]], parts: List[Optional[List[List[int]]]]):
+        self.features = list(features)
+        self.arcs = arcs
+        self.rings = rings
+        self.parts = parts
+
+    @classmethod
+    def from_features(cls, features: Iterable[Dict[str, Any]]) -> 'Topology':
+        """Muodosta topologia GeoJSON-featureista (Polygon ja MultiPolygon)"""
+        features = list(features)
+        vertex_ids = {}
+        rings = []
+        parts = []
+        for feature in features:
+            polygons = _polygons(feature.get('geometry'))
+            if polygons is None:
+                parts.append(None)
+                continue
+            feature_parts = []
+            for polygon in polygons:
+                part = []
+                for ring in polygon:
+                    ids = []
+                    for c in ring:
+                        v = vertex_ids.setdefault((c[0], c[1]), len(vertex_ids))
+                        # Peräkkäiset samat pisteet pois
+                        if not ids or ids[-1] != v:
+                            ids.append(v)
+                    if len(ids) > 1 and ids[0] == ids[-1]:
+                        ids.pop()
+                    part.append(len(rings))
+                    rings.append(ids)
+                feature_parts.append(part)
+            parts.append(feature_parts)
+
+        points = np.array(list(vertex_ids), dtype=float).reshape(-1, 2)
+        junctions = cls._junctions(rings)
+
+        # Pilko renkaat liitoskohdista ja yhdistä samat kaaret
+        arc_index = {}
+        arc_ids = []
+        ring_refs = []
+        for ids in rings:
+            refs = []
+            for piece in cls._cut(ids, junctions):
+                key = tuple(piece)
+                ref = arc_index.get(key)
+                if ref is None:
+                    reverse = arc_index.get(key[::-1])
+                    if reverse is not None:
+                        ref = ~reverse
+                    else:
+                        ref = arc_index[key] = len(arc_ids)
+                        arc_ids.append(key)
+                refs.append(ref)
+            ring_refs.append(refs)
+
+        arcs = [points[list(key)] for key in arc_ids]
+        return cls(features, arcs, ring_refs, parts)
+
+    @staticmethod
+    def _junctions(rings: List[List[int]]) -> set:
+        """
+        Liitoskohdat: pisteet, joiden naapuripisteet eroavat eri renkaissa.
+        Yhteisen rajan sisäpisteillä on joka renkaassa samat naapurit.
+        """
+        neighbours = {}
+        junctions = set()
+        for ids in rings:
+            n = len(ids)
+            for i, v in enumerate(ids):
+                a, b = ids[i - 1], ids[(i + 1) % n]
+                pair = (a, b) if a < b else (b, a)
+                seen = neighbours.setdefault(v, pair)
+                if seen != pair:
+                    junctions.add(v)
+        return junctions
+
+    @staticmethod
+    def _cut(ids: List[int], junctions: set) -> List[List[int]]:
+        """Pilko (avoin) rengas liitoskohdista suljetuiksi kaariketjuiksi"""
+        if not ids:
+            return []
+        cuts = [i for i, v in enumerate(ids) if v in junctions]
+        if not cuts:
+            # Ei liitoskohtia: koko rengas on yksi suljettu kaari. Aloitetaan
+            # pienimmästä pisteestä, jotta saman renkaan kopiot tunnistetaan.
+            start = ids.index(min(ids))
+            seq = ids[start:] + ids[:start]
+            return [seq + [seq[0]]]
+        first = cuts[0]
+        seq = ids[first:] + ids[:first]
+        seq.append(seq[0])
+        offsets = [c - first for c in cuts] + [len(ids)]
+        return [seq[offsets[k]:offsets[k + 1] + 1] for k in range(len(cuts))]
+
+    # ------------------------------------------------------------------
+    # Renkaiden kokoaminen
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def arc(arcs: Sequence[np.ndarray], ref: int) -> np.ndarray:
+        """Kaari viittauksella (käännetty, jos ref < 0)"""
+        return arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+
+    def ring(self, index: int, arcs: Optional[Sequence[np.ndarray]] = None) -> np.ndarray:
+        """Suljettu rengas muotoa (n, 2) kaarista (oletuksena alkuperäiset kaaret)"""
+        arcs = self.arcs if arcs is None else arcs
+        pieces = [self.arc(arcs, ref) if k == 0 else self.arc(arcs, ref)[1:]
+                  for k, ref in enumerate(self.rings[index])]
+        if not pieces:
+            return np.empty((0, 2))
+        return np.concatenate(pieces)
+
+    def geometry(self, index: int, arcs: Optional[Sequence[np.ndarray]] = None,
+                 parts: Optional[List[List[int]]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Featuren geometria GeoJSON-muodossa.
+
+        Args:
+            index: Featuren indeksi
+            arcs: Korvaavat kaaret (esim. yksinkertaistetut)
+            parts: Korvaavat polygonit renkaiden indekseinä (esim. ilman
+                   surkastuneita renkaita)
+        """
+        feature_parts = self.parts[index] if parts is None else parts
+        if feature_parts is None:
+            return self.features[index].get('geometry')
+        polygons = [[self.ring(r, arcs).tolist() for r in part] for part in feature_parts]
+        original = self.features[index]['geometry']['type']
+        if original == 'Polygon' and len(polygons) == 1:
+            return {'type': 'Polygon', 'coordinates': polygons[0]}
+        return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+    def to_features(self, arcs: Optional[Sequence[np.ndarray]] = None) -> List[Dict[str, Any]]:
+        """Featuret uudelleen koottuina (oletuksena alkuperäisillä kaarilla)"""
+        return [dict(feature, geometry=self.geometry(i, arcs))
+                for i, feature in enumerate(self.features)]
+
+    # ------------------------------------------------------------------
+    # Tunnusluvut
+    # ------------------------------------------------------------------
+
+    def vertex_count(self, arcs: Optional[Sequence[np.ndarray]] = None) -> int:
+        """Featurejen koordinaattipisteet yhteensä (yhteiset rajat moneen kertaan)"""
+        arcs = self.arcs if arcs is None else arcs
+        lengths = np.array([len(a) for a in arcs])
+        total = 0
+        for refs in self.rings:
+            if refs:
+                total += sum(lengths[r if r >= 0 else ~r] - 1 for r in refs) + 1
+        return int(total)
+
+    def arc_vertex_count(self, arcs: Optional[Sequence[np.ndarray]] = None) -> int:
+        """Kaarien koordinaattipisteet yhteensä (jokainen raja kerran)"""
+        arcs = self.arcs if arcs is None else arcs
+        return int(sum(len(a) for a in arcs))
+
+    def shared_arc_count(self) -> int:
+        """Kaaret, joihin viittaa useampi kuin yksi rengas"""
+        counts = np.zeros(len(self.arcs), dtype=int)
+        for refs in self.rings:
+            for ref in refs:
+                counts[ref if ref >= 0 else ~ref] += 1
+        return int((counts > 1).sum())
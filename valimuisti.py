@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+StatFin-välimuisti
+==================
+Levylle tallennettava välimuisti PxWeb-taulukon metatiedoille ja
+eräkohtaisille kyselyvastauksille.
+
+Avaimena käytetään taulukon `updated`-aikaleimaa sekä kyselyn tiivistettä,
+joten uusi julkaisu mitätöi vanhat vastaukset automaattisesti.
+Lisäksi tallennetaan edellisen haun tila (aikaleima, vuodet ja postinumerot),
+jonka perusteella seuraava ajo hakee vain muuttuneet osat.
+"""
+
+import os
+import json
+import hashlib
+
+CACHE_DIR = os.path.join('.cache', 'statfin')
+
+
+def query_hash(updated, query):
+    """Laske kyselyn tiiviste (aikaleima + kysely)"""
+    payload = json.dumps({'updated': updated, 'query': query},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class StatFinCache:
+    """Metatietojen ja eräkohtaisten vastausten välimuisti hakemistossa"""
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.batch_dir = os.path.join(directory, 'batches')
+        os.makedirs(self.batch_dir, exist_ok=True)
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, obj):
+        # Kirjoita ensin väliaikaistiedostoon, jotta keskeytynyt ajo ei jätä
+        # rikkinäistä tiedostoa välimuistiin
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load_metadata(self, updated):
+        """Palauta välimuistissa oleva metatieto, jos aikaleima täsmää"""
+        cached = self._read(os.path.join(self.directory, 'metadata.json'))
+        if cached and cached.get('updated') == updated:
+            return cached['meta']
+        return None
+
+    def save_metadata(self, updated, meta):
+        self._write(os.path.join(self.directory, 'metadata.json'),
+                    {'updated': updated, 'meta': meta})
+
+    def load_batch(self, updated, query):
+        """Palauta erän vastaus välimuistista tai None"""
+        cached = self._read(os.path.join(self.batch_dir, f"{query_hash(updated, query)}.json"))
+        if cached and cached.get('updated') == updated:
+            return cached['data']
+        return None
+
+    def save_batch(self, updated, query, data):
+        self._write(os.path.join(self.batch_dir, f"{query_hash(updated, query)}.json"),
+                    {'updated': updated, 'data': data})
+
+    def load_state(self):
+        """Edellisen onnistuneen haun tila: {updated, years, postcodes}"""
+        return self._read(os.path.join(self.directory, 'state.json'))
+
+    def save_state(self, updated, years, postcodes):
+        self._write(os.path.join(self.directory, 'state.json'),
+                    {'updated': updated, 'years': list(years), 'postcodes': list(postcodes)})
+
+    def prune(self, updated):
+        """Poista erät, jotka on tallennettu jollain muulla aikaleimalla"""
+        for name in os.listdir(self.batch_dir):
+            path = os.path.join(self.batch_dir, name)
+            cached = self._read(path)
+            if cached is None or cached.get('updated') != updated:
+                os.remove(path)
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Vektoritiilet
+=============
+Pilkkoo postinumeroalueet z/x/y-tiilipyramidiksi Mapbox Vector Tile -muodossa
+(MVT 2.1, protobuf), jotta kartta voi ladata vain näkyvän alueen.
+
+- Jokaiselle zoomaustasolle geometria yksinkertaistetaan tiilen tarkkuuteen
+  yhteisinä kaarina (ks. yksinkertaistus.py), joten naapurien rajat pysyvät yhteisinä
+- Polygonit leikataan tiilen reunoihin (Sutherland–Hodgman, pieni puskurivyöhyke)
+- Tiilissä ovat postinumeron skalaariominaisuudet (postinumero, nimi, kaupunki, ...)
+- Tiilet tuotetaan rinnakkain useassa prosessissa
+- Uudelleenajossa tuotetaan vain tiilet, joiden sisältö muuttui: jokaisen tiilen
+  sisällön tiiviste tallennetaan luetteloon (manifest.json)
+
+Protobuf-koodaus on kirjoitettu käsin (ei riippuvuuksia).
+
+Käyttö:
+    python vektoritiilet.py
+    python vektoritiilet.py --zoom 4 12 --prosessit 8 --hakemisto tiilet
+"""
+
+import os
+import sys
+import json
+import math
+import struct
+import hashlib
+import argparse
+from multiprocessing import Pool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometriavarasto import read_geojson
+from topologia import Topology
+from yksinkertaistus import Simplifier
+
+SOURCE_FILE = 'postinumerot_hinnat.geojson'
+OUTPUT_DIR = 'tiilet'
+MANIFEST_FILE = 'manifest.json'
+
+MIN_ZOOM = 0
+MAX_ZOOM = 10
+
+# Tiilen koordinaatisto ja leikkauksen puskurivyöhyke (tiiliyksiköissä)
+EXTENT = 4096
+BUFFER = 64
+
+# Yksinkertaistuksen toleranssi tiiliyksiköissä
+TOLERANCE_UNITS = 4.0
+
+LAYER_NAME = 'postinumerot'
+
+# Muuttuu, jos tiilen sisältö muuttuu samalla datalla (pakottaa kaikki tiilet uusiksi)
+ENCODER_VERSION = 1
+
+# Maapallon ympärysmitta päiväntasaajalla (Web Mercator)
+EARTH_CIRCUMFERENCE = 40075016.686
+
+
+# ----------------------------------------------------------------------
+# Protobuf
+# ----------------------------------------------------------------------
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _message(number: int, payload: bytes) -> bytes:
+    """Pituusprefiksoitu kenttä (wire type 2): merkkijono, viesti tai pakattu lista"""
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number: int, values: Sequence[int]) -> bytes:
+    return _message(number, b''.join(_varint(v) for v in values))
+
+
+def _value(value: Any) -> bytes:
+    """Tile.Value-viesti"""
+    if isinstance(value, bool):
+        return _field(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _field(5, 0) + _varint(value)
+        return _field(6, 0) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _field(3, 1) + struct.pack('<d', value)
+    return _message(1, str(value).encode('utf-8'))
+
+
+# ----------------------------------------------------------------------
+# Geometria
+# ----------------------------------------------------------------------
+
+def project(lonlat: np.ndarray, zoom: int) -> np.ndarray:
+    """WGS84 -> Web Mercator -maailmankoordinaatit tiiliyksiköissä (y kasvaa etelään)"""
+    world = EXTENT * (1 << zoom)
+    x = (lonlat[:, 0] + 180.0) / 360.0
+    lat = np.radians(np.clip(lonlat[:, 1], -85.0511, 85.0511))
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return np.column_stack([x * world, y * world])
+
+
+def clip_ring(ring: np.ndarray, low: float, high: float) -> np.ndarray:
+    """
+    Leikkaa suljettu rengas neliöön [low, high]² (Sutherland–Hodgman).
+    Palauttaa avoimen renkaan (ilman toistettua alkupistettä), voi olla tyhjä.
+    """
+    points = ring[:-1]
+    for axis in (0, 1):
+        for bound, sign in ((low, 1.0), (high, -1.0)):
+            if not len(points):
+                return points
+            inside = sign * (points[:, axis] - bound) >= 0
+            if inside.all():
+                continue
+            previous = np.roll(points, 1, axis=0)
+            cross = inside != np.roll(inside, 1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                t = (bound - previous[:, axis]) / (points[:, axis] - previous[:, axis])
+                intersection = previous + t[:, None] * (points - previous)
+            # Jokaisesta särmästä: leikkauspiste (jos särmä ylittää rajan) ja loppupiste (jos sisällä)
+            counts = cross.astype(int) + inside.astype(int)
+            position = np.cumsum(counts) - counts
+            output = np.empty((counts.sum(), 2))
+            output[position[cross]] = intersection[cross]
+            output[(position + cross)[inside]] = points[inside]
+            points = output
+    return points
+
+
+def _signed_area(ring: np.ndarray) -> float:
+    """Pinta-ala maanmittarin kaavalla avoimelle renkaalle (tiilikoordinaateissa ulkorengas > 0)"""
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _tile_ring(ring: np.ndarray, origin: np.ndarray, exterior: bool) -> Optional[np.ndarray]:
+    """Leikkaa, pyöristä kokonaisluvuiksi ja suuntaa rengas. None, jos rengas surkastuu."""
+    local = ring - origin
+    low, high = -BUFFER, EXTENT + BUFFER
+    if (local.min(axis=0) >= low).all() and (local.max(axis=0) <= high).all():
+        local = local[:-1]
+    else:
+        local = clip_ring(local, low, high)
+    if len(local) < 3:
+        return None
+    q = np.round(local).astype(np.int64)
+    keep = (q != np.roll(q, 1, axis=0)).any(axis=1)
+    q = q[keep]
+    if len(q) < 3:
+        return None
+    area = _signed_area(q)
+    if area == 0:
+        return None
+    if (area > 0) != exterior:
+        q = q[::-1]
+    return q
+
+
+def encode_geometry(polygons: List[List[np.ndarray]]) -> List[int]:
+    """Renkaat MVT-geometriakomennoiksi (MoveTo, LineTo, ClosePath, zigzag-delta)"""
+    commands = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for rings in polygons:
+        for ring in rings:
+            deltas = np.diff(ring, axis=0, prepend=cursor[None, :])
+            cursor = ring[-1]
+            zz = ((deltas << 1) ^ (deltas >> 63)).tolist()
+            commands.append((1 << 3) | 1)                      # MoveTo, 1 piste
+            commands.extend(zz[0])
+            commands.append(((len(ring) - 1) << 3) | 2)        # LineTo, n-1 pistettä
+            for pair in zz[1:]:
+                commands.extend(pair)
+            commands.append((1 << 3) | 7)                      # ClosePath
+    return commands
+
+
+# ----------------------------------------------------------------------
+# Tiilet
+# ----------------------------------------------------------------------
+
+# Työprosessien data (asetetaan Pool-alustuksessa)
+_ZOOMS = None
+_FEATURES = None
+_OUTPUT_DIR = None
+
+
+def _init_worker(zooms, features, output_dir):
+    global _ZOOMS, _FEATURES, _OUTPUT_DIR
+    _ZOOMS, _FEATURES, _OUTPUT_DIR = zooms, features, output_dir
+
+
+def build_tile(z: int, x: int, y: int, indices: Sequence[int],
+               zooms: Dict[int, List], features: List[Tuple[int, Dict[str, Any]]]) -> Optional[bytes]:
+    """
+    Tiilen protobuf-sisältö, None jos tiilessä ei ole yhtään featurea.
+
+    Args:
+        indices: Featuret, joiden rajaava suorakulmio osuu tiileen
+        zooms: {zoom: [featuren polygonit maailmankoordinaatteina tai None]}
+        features: [(id, ominaisuudet)] featurejärjestyksessä
+    """
+    origin = np.array([x * EXTENT, y * EXTENT], dtype=float)
+    keys, values = {}, {}
+    encoded = []
+    for index in indices:
+        polygons = []
+        for rings in zooms[z][index] or ():
+            exterior = _tile_ring(rings[0], origin, True)
+            if exterior is None:
+                continue
+            holes = [_tile_ring(ring, origin, False) for ring in rings[1:]]
+            polygons.append([exterior] + [h for h in holes if h is not None])
+        if not polygons:
+            continue
+        feature_id, properties = features[index]
+        tags = []
+        for key, value in properties.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        encoded.append(_field(1, 0) + _varint(feature_id) + _packed(2, tags) +
+                       _field(3, 0) + _varint(3) +                 # POLYGON
+                       _packed(4, encode_geometry(polygons)))
+    if not encoded:
+        return None
+
+    layer = (_field(15, 0) + _varint(2) + _message(1, LAYER_NAME.encode('utf-8')) +
+             b''.join(_message(2, f) for f in encoded) +
+             b''.join(_message(3, k.encode('utf-8')) for k in keys) +
+             b''.join(_message(4, _value(v)) for _, v in values) +
+             _field(5, 0) + _varint(EXTENT))
+    return _message(3, layer)
+
+
+def tile_path(output_dir: str, key: str) -> str:
+    return os.path.join(output_dir, *key.split('/')) + '.pbf'
+
+
+def _write_tile(task):
+    """Työprosessi: tuota ja kirjoita yksi tiili. Palauttaa (avain, tavut)."""
+    key, indices = task
+    z, x, y = (int(v) for v in key.split('/'))
+    data = build_tile(z, x, y, indices, _ZOOMS, _FEATURES)
+    path = tile_path(_OUTPUT_DIR, key)
+    if data is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return key, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return key, len(data)
+
+
+def _is_scalar(value: Any) -> bool:
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, (str, int, bool))
+
+
+def _feature_attributes(feature: Dict[str, Any], index: int) -> Tuple[int, Dict[str, Any]]:
+    """MVT-featuren id ja skalaariominaisuudet (sisäkkäinen data ja None jätetään pois)"""
+    properties = {k: v for k, v in (feature.get('properties') or {}).items() if _is_scalar(v)}
+    postcode = str(properties.get('postinumer', ''))
+    return (int(postcode) if postcode.isdigit() else index), properties
+
+
+def prepare(features: List[Dict[str, Any]], min_zoom: int, max_zoom: int):
+    """
+    Yksinkertaista ja projisoi geometria jokaiselle zoomaustasolle ja jaa featuret tiiliin.
+
+    Returns:
+        (zooms, attributes, tiles): tiles = {'z/x/y': (tiiviste, [featureindeksit])}
+    """
+    topology = Topology.from_features(features)
+    simplifier = Simplifier(topology)
+    attributes = [_feature_attributes(f, i) for i, f in enumerate(features)]
+    attribute_hashes = [hashlib.sha1(json.dumps(a, sort_keys=True).encode('utf-8')).digest()
+                        for a in attributes]
+    latitude = float(np.concatenate(topology.arcs)[:, 1].mean()) if topology.arcs else 0.0
+    params = json.dumps([ENCODER_VERSION, EXTENT, BUFFER, TOLERANCE_UNITS, LAYER_NAME]).encode()
+
+    zooms = {}
+    tiles = {}
+    for z in range(min_zoom, max_zoom + 1):
+        # Toleranssi metreinä: TOLERANCE_UNITS tiiliyksikköä tällä zoomaustasolla
+        unit = EARTH_CIRCUMFERENCE * math.cos(math.radians(latitude)) / (EXTENT * (1 << z))
+        arcs, feature_parts = simplifier.level_parts(TOLERANCE_UNITS * unit)
+        lengths = np.cumsum([len(arc) for arc in arcs])[:-1]
+        projected_arcs = np.split(project(np.concatenate(arcs), z), lengths) if arcs else []
+
+        zoom_features = []
+        contents = {}
+        for index, parts in enumerate(feature_parts):
+            if not parts:
+                zoom_features.append(None)
+                continue
+            polygons = [[topology.ring(r, projected_arcs) for r in part] for part in parts]
+            zoom_features.append(polygons)
+
+            digest = hashlib.sha1(attribute_hashes[index])
+            for rings in polygons:
+                for ring in rings:
+                    digest.update(ring.tobytes())
+            points = np.concatenate([rings[0] for rings in polygons])
+            low = np.floor((points.min(axis=0) - BUFFER) / EXTENT).astype(int)
+            high = np.floor((points.max(axis=0) + BUFFER) / EXTENT).astype(int)
+            n = (1 << z) - 1
+            for x in range(max(low[0], 0), min(high[0], n) + 1):
+                for y in range(max(low[1], 0), min(high[1], n) + 1):
+                    contents.setdefault(f"{z}/{x}/{y}", []).append((index, digest.digest()))
+        zooms[z] = zoom_features
+
+        for key, items in contents.items():
+            digest = hashlib.sha1(params)
+            for index, feature_digest in items:
+                digest.update(feature_digest)
+            tiles[key] = (digest.hexdigest(), [index for index, _ in items])
+    return zooms, attributes, tiles
+
+
+def generate(source: str = SOURCE_FILE, output_dir: str = OUTPUT_DIR,
+             min_zoom: int = MIN_ZOOM, max_zoom: int = MAX_ZOOM,
+             processes: Optional[int] = None, force: bool = False) -> Dict[str, Any]:
+    """
+    Tuota tiilipyramidi. Tiilet, joiden sisällön tiiviste on sama kuin
+    edellisellä ajolla, jätetään koskematta; poistuneet tiilet poistetaan.
+
+    Returns:
+        Yhteenveto: {'tiles', 'written', 'unchanged', 'removed', 'bytes'}
+    """
+    print(f"Luetaan {source}...")
+    features = read_geojson(source)['features']
+
+    print(f"Yksinkertaistetaan ja jaetaan tiiliin (zoom {min_zoom}-{max_zoom})...")
+    zooms, attributes, tiles = prepare(features, min_zoom, max_zoom)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    previous = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f).get('tiles', {})
+
+    tasks = [(key, indices) for key, (digest, indices) in tiles.items()
+             if previous.get(key) != digest or not os.path.exists(tile_path(output_dir, key))]
+    removed = [key for key in previous if key not in tiles]
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+    if tasks:
+        print(f"Tuotetaan {len(tasks)}/{len(tiles)} tiiltä...")
+        with Pool(processes, initializer=_init_worker,
+                  initargs=(zooms, attributes, output_dir)) as pool:
+            for key, size in pool.imap_unordered(_write_tile, tasks, chunksize=16):
+                written[key] = size
+    for key in removed:
+        path = tile_path(output_dir, key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    manifest = {
+        'layer': LAYER_NAME,
+        'minzoom': min_zoom,
+        'maxzoom': max_zoom,
+        'extent': EXTENT,
+        'tiles': {key: digest for key, (digest, _) in sorted(tiles.items())},
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    return {
+        'tiles': len(tiles),
+        'written': sum(1 for size in written.values() if size),
+        'unchanged': len(tiles) - len(tasks),
+        'removed': len(removed),
+        'bytes': sum(written.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tuota postinumeroalueista vektoritiilet (MVT)")
+    parser.add_argument('--lahde', default=SOURCE_FILE, help="GeoJSON-lähdetiedosto")
+    parser.add_argument('--hakemisto', default=OUTPUT_DIR, help="Tiilihakemisto")
+    parser.add_argument('--zoom', type=int, nargs=2, default=[MIN_ZOOM, MAX_ZOOM],
+                        metavar=('MIN', 'MAX'), help="Zoomaustasot")
+    parser.add_argument('--prosessit', type=int, default=None, help="Prosessien määrä (oletus: CPU-ytimet)")
+    parser.add_argument('--kaikki', action='store_true', help="Tuota kaikki tiilet uudelleen")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Vektoritiilet")
+    print("=" * 60)
+    summary = generate(args.lahde, args.hakemisto, args.zoom[0], args.zoom[1],
+                       args.prosessit, args.kaikki)
+    print(f"✓ Tiiliä {summary['tiles']}: tuotettiin {summary['written']} "
+          f"({summary['bytes'] / (1024 * 1024):.2f} MB), ennallaan {summary['unchanged']}, "
+          f"poistettiin {summary['removed']}")
+    print(f"  Hakemisto: {args.hakemisto}/{{z}}/{{x}}/{{y}}.pbf")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Geometrian yksinkertaistus
+==========================
+Tuottaa postinumeroalueista useita tarkkuustasoja (level of detail) eri
+zoomaustasoille. Lähteen geometria on tarkka (~240 pistettä per alue), mutta
+koko maan näkymässä riittää murto-osa pisteistä.
+
+Yksinkertaistus tehdään Douglas–Peucker-algoritmilla yhteisille kaarille
+(ks. topologia.py), joten naapurialueiden raja yksinkertaistuu molemmille
+samoin eikä rakoja tai päällekkäisyyksiä synny. Jokaisen pisteen
+DP-merkitsevyys lasketaan kerran, ja jokainen taso on pelkkä kynnystys.
+Lisäksi jokaisen tason koordinaatit pyöristetään tason maastoresoluutiota
+vastaavaan desimaaliruudukkoon (ks. kvantisointi.py).
+
+Käyttö (lataa_postinumeroalueet.py:n jälkeen):
+    python yksinkertaistus.py
+
+Tuottaa:
+- postinumerot_hinnat_lod<taso>.geojson  (yksinkertaistetut tasot)
+- postinumerot_hinnat_lod.json           (tasojen zoomaukset, pisteet ja tavut)
+"""
+
+import sys
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geometria import METERS_PER_DEGREE
+from geometriavarasto import read_geojson
+from json_kirjoitin import write_json
+from topologia import Topology
+
+# Tasot: (pienin zoomaustaso, toleranssi metreinä, koordinaattiresoluutio metreinä).
+# Toleranssi 0 = ei yksinkertaistusta, resoluutio 0 = ei pyöristystä.
+LEVELS = [
+    (0, 500.0, 10.0),
+    (7, 150.0, 10.0),
+    (9, 40.0, 1.0),
+    (11, 10.0, 1.0),
+    (13, 0.0, 1.0),
+]
+
+SOURCE_FILE = 'postinumerot_hinnat.geojson'
+MANIFEST_FILE = 'postinumerot_hinnat_lod.json'
+
+# Tasotiedostot ovat tiiviitä (ilman sisennystä)
+COMPACT_OUTPUT = True
+
+
+def level_file(level: int) -> str:
+    return f"postinumerot_hinnat_lod{level}.geojson"
+
+
+def grid_decimals(resolution_m: float) -> int:
+    """
+    Desimaalien määrä, jonka ruudukko on lähimpänä annettua maastoresoluutiota
+    (leveyssuunnassa; 1 m -> 5 desimaalia ≈ 1.1 m, 10 m -> 4 ≈ 11 m)
+    """
+    return max(0, round(math.log10(METERS_PER_DEGREE / resolution_m)))
+
+
+def snap(arc: np.ndarray, decimals: int) -> np.ndarray:
+    """
+    Pyöristä kaaren pisteet desimaaliruudukkoon ja poista peräkkäiset
+    samat pisteet. Päätepisteiden arvo säilyy, joten kaaret liittyvät yhä
+    toisiinsa; kokonaan surkastunut kaari on yksi piste.
+    """
+    q = np.round(arc, decimals)
+    if len(q) < 2:
+        return q
+    return q[np.r_[True, (q[1:] != q[:-1]).any(axis=1)]]
+
+
+def importance(arcs: Sequence[np.ndarray]) -> List[np.ndarray]:
+    """
+    Douglas–Peucker-merkitsevyys jokaiselle kaaren pisteelle: suurin toleranssi,
+    jolla piste vielä säilyy. Piste säilyy toleranssilla t, jos sen etäisyys
+    jakosegmentistä ylittää t:n ja sama pätee kaikkiin sen yläpuolisiin jakoihin,
+    joten merkitsevyys on min(oma etäisyys, ylemmän jaon merkitsevyys).
+    Päätepisteet säilyvät aina.
+
+    Kaikkien kaarten jaot käsitellään kerralla: jokainen kierros jakaa kaikki
+    avoimet segmentit taulukko-operaatioilla, joten kierroksia on rekursion
+    syvyyden verran eikä pisteiden määrän verran.
+    """
+    lengths = np.array([len(arc) for arc in arcs], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    xy = np.concatenate(arcs) if arcs else np.empty((0, 2))
+    weights = np.zeros(len(xy))
+    weights[offsets[:-1][lengths > 0]] = np.inf
+    weights[offsets[1:][lengths > 0] - 1] = np.inf
+
+    start = offsets[:-1][lengths > 2]
+    end = offsets[1:][lengths > 2] - 1
+    parent = np.full(len(start), np.inf)
+    while len(start):
+        # Segmenttien sisäpisteet yhtenä taulukkona
+        counts = end - start - 1
+        first = np.cumsum(counts) - counts
+        segment = np.repeat(np.arange(len(start)), counts)
+        index = start[segment] + 1 + (np.arange(counts.sum()) - first[segment])
+        a, b, p = xy[start][segment], xy[end][segment], xy[index]
+        ab = b - a
+        length2 = (ab * ab).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Kohtisuora etäisyys janasta (projektio rajataan janalle);
+            # suljetulla kaarella (a == b) etäisyys alkupisteestä
+            t = np.where(length2 > 0, ((p - a) * ab).sum(axis=1) / length2, 0.0)
+        nearest = a + np.clip(t, 0.0, 1.0)[:, None] * ab
+        dist = np.hypot(*(p - nearest).T)
+
+        # Kaukaisin piste per segmentti (ensimmäinen, kuten np.argmax)
+        farthest = np.maximum.reduceat(dist, first)
+        candidates = np.flatnonzero(dist == farthest[segment])
+        _, pick = np.unique(segment[candidates], return_index=True)
+        split = index[candidates[pick]]
+        weight = np.minimum(farthest, parent)
+        weights[split] = weight
+
+        start, end = np.concatenate([start, split]), np.concatenate([split, end])
+        parent = np.concatenate([weight, weight])
+        open_ = end - start >= 2
+        start, end, parent = start[open_], end[open_], parent[open_]
+    return np.split(weights, offsets[1:-1])
+
+
+def _ring_area(ring: np.ndarray) -> float:
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+
+class Simplifier:
+    """Topologian kaarien DP-merkitsevyydet ja tasojen muodostus"""
+
+    def __init__(self, topology: Topology):
+        self.topology = topology
+        self.areas = [abs(_ring_area(topology.ring(r))) for r in range(len(topology.rings))]
+        self._weights = None
+
+    @property
+    def weights(self) -> List[np.ndarray]:
+        """DP-merkitsevyydet (lasketaan ensimmäisellä käytöllä; pelkkä pyöristys ei tarvitse niitä)"""
+        if self._weights is None:
+            # Paikallinen metrinen taso: asteet metreiksi keskileveysasteella
+            arcs = self.topology.arcs
+            all_points = np.concatenate(arcs) if arcs else np.empty((0, 2))
+            latitude = float(all_points[:, 1].mean()) if len(all_points) else 0.0
+            scale = np.array([METERS_PER_DEGREE * math.cos(math.radians(latitude)), METERS_PER_DEGREE])
+            self._weights = importance([arc * scale for arc in arcs])
+        return self._weights
+
+    def arcs(self, tolerance: float, keep: Sequence[bool] = (),
+             decimals: Optional[int] = None) -> List[np.ndarray]:
+        """
+        Kaaret, joista on poistettu toleranssin alittavat pisteet ja jotka on
+        pyöristetty `decimals` desimaaliin (keep = täysi tarkkuus)
+        """
+        arcs = []
+        for i, arc in enumerate(self.topology.arcs):
+            if keep and keep[i]:
+                arcs.append(arc)
+                continue
+            if tolerance > 0:
+                arc = arc[self.weights[i] > tolerance]
+            if decimals is not None:
+                arc = snap(arc, decimals)
+            arcs.append(arc)
+        return arcs
+
+    def level(self, tolerance: float,
+              decimals: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[np.ndarray]]:
+        """Yksinkertaistetut featuret ja kaaret (ks. level_parts)"""
+        arcs, feature_parts = self.level_parts(tolerance, decimals)
+        features = [dict(feature, geometry=self.topology.geometry(i, arcs, feature_parts[i]))
+                    for i, feature in enumerate(self.topology.features)]
+        return features, arcs
+
+    def level_parts(self, tolerance: float, decimals: Optional[int] = None
+                    ) -> Tuple[List[np.ndarray], List[Optional[List[List[int]]]]]:
+        """
+        Yksinkertaistetut (ja pyöristetyt) kaaret ja featurejen polygonit
+        renkaiden indekseinä. Surkastuneet renkaat (alle 3 eri pistettä tai
+        nollapinta-ala) jätetään pois. Jos featurelta katoaisi kaikki polygonit,
+        sen suurimman polygonin ulkorenkaan kaaret pidetään täydellä
+        tarkkuudella; koska kaaret ovat yhteisiä, naapurit käyttävät samaa tarkkuutta.
+        """
+        topology = self.topology
+        arcs = self.arcs(tolerance, decimals=decimals)
+        keep = [False] * len(arcs)
+        for i, parts in enumerate(topology.parts):
+            if parts and not self._valid_parts(parts, arcs):
+                largest = max(parts, key=lambda part: self.areas[part[0]])
+                for ref in topology.rings[largest[0]]:
+                    keep[ref if ref >= 0 else ~ref] = True
+        if any(keep):
+            arcs = self.arcs(tolerance, keep, decimals)
+
+        feature_parts = [None if parts is None else self._valid_parts(parts, arcs)
+                         for parts in topology.parts]
+        return arcs, feature_parts
+
+    def _valid_parts(self, parts: List[List[int]], arcs: List[np.ndarray]) -> List[List[int]]:
+        """Polygonit ilman surkastuneita renkaita (polygoni putoaa, jos ulkorengas surkastuu)"""
+        valid = []
+        for part in parts:
+            rings = [r for r in part if self._ring_valid(r, arcs)]
+            if rings and rings[0] == part[0]:
+                valid.append(rings)
+        return valid
+
+    def _ring_valid(self, index: int, arcs: List[np.ndarray]) -> bool:
+        ring = self.topology.ring(index, arcs)
+        return len(ring) >= 4 and _ring_area(ring) != 0.0
+
+
+def build_levels(source: str = SOURCE_FILE, levels: Sequence = LEVELS,
+                 compact: bool = COMPACT_OUTPUT) -> Dict[str, Any]:
+    """
+    Muodosta tasotiedostot ja niiden luettelo.
+
+    Returns:
+        Luettelo: {'source', 'levels': [{level, min_zoom, tolerance_m, resolution_m, file, vertices, bytes}]}
+    """
+    print(f"Luetaan {source}...")
+    geojson = read_geojson(source)
+
+    topology = Topology.from_features(geojson['features'])
+    print(f"✓ {len(topology.features)} aluetta, {topology.vertex_count()} pistettä")
+    print(f"  {len(topology.arcs)} kaarta, joista {topology.shared_arc_count()} yhteisiä naapurin kanssa "
+          f"({topology.arc_vertex_count()} pistettä)")
+
+    print("Lasketaan Douglas–Peucker-merkitsevyydet...")
+    simplifier = Simplifier(topology)
+
+    manifest = {'source': source, 'levels': []}
+    for level, (min_zoom, tolerance, resolution) in enumerate(levels):
+        features, arcs = simplifier.level(tolerance, grid_decimals(resolution) if resolution > 0 else None)
+        vertices = topology.vertex_count(arcs)
+        filename = level_file(level)
+        size = write_json(filename, dict(geojson, features=features), 'features', compact=compact)
+        manifest['levels'].append({
+            'level': level,
+            'min_zoom': min_zoom,
+            'tolerance_m': tolerance,
+            'resolution_m': resolution,
+            'file': filename,
+            'vertices': vertices,
+            'bytes': size,
+        })
+
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def print_report(manifest: Dict[str, Any]):
+    """Tulosta tasojen pistemäärät ja tiedostokoot suhteessa lähteeseen"""
+    full = manifest['levels'][-1]
+    print(f"\n{'Taso':>4} {'Zoom':>5} {'Toleranssi':>11} {'Ruudukko':>9} {'Pisteet':>10} {'%':>6} "
+          f"{'Koko (MB)':>10} {'%':>6}")
+    for item in manifest['levels']:
+        print(f"{item['level']:>4} {item['min_zoom']:>4}+ {item['tolerance_m']:>9.0f} m "
+              f"{item['resolution_m']:>7.0f} m "
+              f"{item['vertices']:>10} {item['vertices'] / full['vertices']:>6.1%} "
+              f"{item['bytes'] / (1024 * 1024):>10.2f} {item['bytes'] / full['bytes']:>6.1%}")
+
+
+def main():
+    """Pääohjelma"""
+    print("=" * 60)
+    print("Postinumeroalueiden tarkkuustasot")
+    print("=" * 60)
+
+    manifest = build_levels()
+    print_report(manifest)
+    print(f"\n✓ Tasot tallennettu, luettelo: {MANIFEST_FILE}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())